@@ -0,0 +1,136 @@
+"""Benchmark checkpoint bytes and write latency with and without payload offloading.
+
+Runs a graph with the same state shape and reducers as the research agent
+(fan-out of web_research branches joined by reflection, repeated for several
+loops) against an in-memory checkpointer whose serializer records the size
+and latency of every checkpoint write. No LLM or search calls are made, but
+importing the agent package still needs the usual .env (GEMINI_API_KEY).
+
+Usage:
+    python benchmarks/checkpoint_offload.py --queries 5 --loops 10 --result-kb 40
+"""
+
+import argparse
+import operator
+import os
+import random
+import string
+import tempfile
+import time
+from typing import Annotated, TypedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Send
+
+from agent.blobstore import get_blob_store, hydrate_texts, offload_sources, offload_texts
+
+
+class MeasuringSerializer(JsonPlusSerializer):
+    """Serializer recording the bytes and time spent on each serialized value."""
+
+    def __init__(self):
+        super().__init__()
+        self.bytes = 0
+        self.seconds = 0.0
+        self.writes = 0
+
+    def dumps_typed(self, obj):
+        start = time.perf_counter()
+        result = super().dumps_typed(obj)
+        self.seconds += time.perf_counter() - start
+        self.bytes += len(result[1])
+        self.writes += 1
+        return result
+
+
+class BenchState(TypedDict):
+    search_query: Annotated[list, operator.add]
+    web_research_result: Annotated[list, operator.add]
+    sources_gathered: Annotated[list, operator.add]
+    research_loop_count: int
+
+
+def fake_markdown(size: int, rng: random.Random) -> str:
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(size // 6)]
+    return " ".join(words)[:size]
+
+
+def build_graph(args, offload: bool, checkpointer):
+    rng = random.Random(0)
+    min_bytes = 2048
+
+    def dispatch(state: BenchState):
+        return [Send("web_research", {"query": f"q{len(state['search_query']) + i}"}) for i in range(args.queries)]
+
+    def web_research(payload: dict):
+        texts = [fake_markdown(args.result_kb * 1024, rng)]
+        sources = [
+            {"label": f"Source {i}", "short_url": f"https://example.com/{payload['query']}/{i}", "value": f"https://example.com/{payload['query']}/{i}"}
+            for i in range(10)
+        ]
+        if offload:
+            texts = offload_texts(texts, min_bytes)
+            sources = offload_sources(sources, min_bytes)
+        return {"search_query": [payload["query"]], "web_research_result": texts, "sources_gathered": sources}
+
+    def reflection(state: BenchState):
+        # 与真实节点一样读取全部结果
+        "".join(hydrate_texts(state["web_research_result"]))
+        return {"research_loop_count": state.get("research_loop_count", 0) + 1}
+
+    def route(state: BenchState):
+        return "done" if state["research_loop_count"] >= args.loops else dispatch(state)
+
+    builder = StateGraph(BenchState)
+    builder.add_node("web_research", web_research)
+    builder.add_node("reflection", reflection)
+    builder.add_node("done", lambda state: {})
+    builder.add_conditional_edges(START, dispatch, ["web_research"])
+    builder.add_edge("web_research", "reflection")
+    builder.add_conditional_edges("reflection", route, ["web_research", "done"])
+    builder.add_edge("done", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def run(args, offload: bool) -> dict:
+    serde = MeasuringSerializer()
+    graph = build_graph(args, offload, InMemorySaver(serde=serde))
+    start = time.perf_counter()
+    graph.invoke(
+        {"search_query": [], "web_research_result": [], "sources_gathered": [], "research_loop_count": 0},
+        {"configurable": {"thread_id": f"bench-{offload}"}, "recursion_limit": 10 * args.loops + 10},
+    )
+    return {
+        "checkpoint_mb": serde.bytes / 1024 / 1024,
+        "serialize_ms": serde.seconds * 1000,
+        "writes": serde.writes,
+        "run_s": time.perf_counter() - start,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=5, help="Branches per research loop")
+    parser.add_argument("--loops", type=int, default=10, help="Research loops")
+    parser.add_argument("--result-kb", type=int, default=40, help="Size of each web_research result in KB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as blob_dir:
+        os.environ["BLOB_STORE_URL"] = f"file://{blob_dir}"
+        get_blob_store.cache_clear()
+        baseline = run(args, offload=False)
+        offloaded = run(args, offload=True)
+
+    print(f"{'mode':<10}{'checkpoint MB':>15}{'serialize ms':>15}{'writes':>8}{'run s':>8}")
+    for name, result in (("inline", baseline), ("offload", offloaded)):
+        print(
+            f"{name:<10}{result['checkpoint_mb']:>15.2f}{result['serialize_ms']:>15.1f}"
+            f"{result['writes']:>8}{result['run_s']:>8.2f}"
+        )
+    print(f"checkpoint bytes reduced {baseline['checkpoint_mb'] / max(offloaded['checkpoint_mb'], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark citation marker insertion on long grounded answers.
+
+Compares the previous per-citation string rebuilding with the single-pass
+assembly in ``agent.utils.assemble_citations`` on a synthetic answer with
+hundreds of grounding supports, using UTF-8 byte offsets as Gemini reports
+them. Importing the agent package needs the usual .env (GEMINI_API_KEY).
+
+Usage:
+    python benchmarks/citation_insertion.py --kb 200 --supports 500
+"""
+
+import argparse
+import random
+import time
+
+from agent.utils import assemble_citations
+
+
+def rebuild_per_citation(text, citations_list):
+    """The previous implementation: one full string copy per citation, indices used as characters."""
+    sorted_citations = sorted(
+        citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
+    )
+    modified_text = text
+    for citation_info in sorted_citations:
+        end_idx = citation_info["end_index"]
+        marker_to_insert = ""
+        for segment in citation_info["segments"]:
+            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
+        modified_text = modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+    return modified_text
+
+
+def fake_answer(size: int, rng: random.Random) -> str:
+    sentences = [
+        "PD-1 抑制剂在非小细胞肺癌中的总生存期显著延长。",
+        "Nivolumab showed a durable response in the CheckMate trials.",
+        "免疫相关不良事件的发生率在联合治疗组更高。",
+        "Pembrolizumab is approved as first-line therapy for PD-L1 high tumors.",
+    ]
+    parts, length = [], 0
+    while length < size:
+        sentence = rng.choice(sentences)
+        parts.append(sentence)
+        length += len(sentence.encode("utf-8"))
+    return "".join(parts)
+
+
+def fake_citations(text: str, count: int, rng: random.Random) -> list:
+    size = len(text.encode("utf-8"))
+    citations = []
+    for i in range(count):
+        end = rng.randint(1, size)
+        citations.append(
+            {
+                "start_index": max(0, end - rng.randint(10, 200)),
+                "end_index": end,
+                "segments": [
+                    {"label": f"source{i}-{j}", "short_url": f"https://vertexaisearch.cloud.google.com/id/0-{i}{j}"}
+                    for j in range(rng.randint(1, 3))
+                ],
+            }
+        )
+    return citations
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kb", type=int, default=200, help="Answer size in KB (UTF-8)")
+    parser.add_argument("--supports", type=int, default=500, help="Number of grounding supports")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    text = fake_answer(args.kb * 1024, rng)
+    citations = fake_citations(text, args.supports, rng)
+
+    # ASCII 文本中字节偏移等于字符下标，两种实现的结果必须一致
+    ascii_text = text.encode("ascii", "replace").decode("ascii")
+    ascii_citations = fake_citations(ascii_text, args.supports, rng)
+    assert rebuild_per_citation(ascii_text, ascii_citations) == assemble_citations(
+        ascii_text, ascii_citations, byte_offsets=True
+    )
+
+    old = best_of(lambda: rebuild_per_citation(text, citations), args.repeat)
+    new = best_of(lambda: assemble_citations(text, citations, byte_offsets=True), args.repeat)
+    print(f"answer: {len(text)} chars / {len(text.encode('utf-8'))} bytes, {args.supports} supports")
+    print(f"{'per-citation rebuild':<24}{old * 1000:>10.2f} ms")
+    print(f"{'single-pass assembly':<24}{new * 1000:>10.2f} ms")
+    print(f"speedup {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark event-loop lag under concurrent runs with and without the CPU process pool.
+
+Simulates many concurrent research runs sharing one event loop, as in the
+LangGraph API server. Each run alternates awaited I/O (model and search
+latency) with the CPU-heavy post-processing steps of the agent: search hit
+reranking and formatting, extractive compression and citation assembly.
+A monitor task sleeps in short ticks and records how late each tick fires.
+
+Modes:
+    inline   post-processing runs on the event loop (async nodes)
+    thread   post-processing runs in worker threads (sync nodes; holds the GIL)
+    process  post-processing goes through agent.cpu_offload.arun_cpu_task
+
+Importing the agent package needs the usual .env (GEMINI_API_KEY).
+
+Usage:
+    python benchmarks/cpu_offload.py --runs 50 --steps 3 --modes inline thread process
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("CPU_OFFLOAD_MIN_CHARS", "0")
+
+from agent import cpu_offload  # noqa: E402
+from agent.ranking import compress_results  # noqa: E402
+from agent.tools_and_schemas import format_search_results  # noqa: E402
+from agent.utils import assemble_citations  # noqa: E402
+
+WORDS = (
+    "PD-1 inhibitor nivolumab pembrolizumab overall survival phase III trial "
+    "免疫 治疗 总生存期 不良事件 联合 用药 肺癌 response rate safety"
+).split()
+
+
+def synthetic_payload(rng: random.Random, hits: int, answer_kb: int, supports: int) -> dict:
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))) + "."
+
+    results = [
+        {
+            "title": f"Result {i} {sentence()[:40]}",
+            "url": f"https://site{i % 7}.example.com/{i}",
+            "content": " ".join(sentence() for _ in range(30)),
+        }
+        for i in range(hits)
+    ]
+    answer = " ".join(sentence() for _ in range(answer_kb * 1024 // 100))
+    citations = [
+        {
+            "start_index": 0,
+            "end_index": rng.randint(1, len(answer)),
+            "segments": [{"label": f"s{i}", "short_url": f"https://s/{i}", "value": f"https://s/{i}"}],
+        }
+        for i in range(supports)
+    ]
+    return {"query": "PD-1 overall survival", "results": results, "answer": answer, "citations": citations}
+
+
+async def post_process(mode: str, payload: dict) -> None:
+    steps = [
+        (format_search_results, (payload["query"], payload["results"], "", {"top_k": 5})),
+        (compress_results, ([r["content"] for r in payload["results"]], payload["query"], 1500)),
+        (assemble_citations, (payload["answer"], payload["citations"])),
+    ]
+    for fn, args in steps:
+        if mode == "inline":
+            fn(*args)
+        elif mode == "thread":
+            await asyncio.to_thread(fn, *args)
+        else:
+            await cpu_offload.arun_cpu_task(fn, *args, size=cpu_offload.payload_size(*args))
+
+
+async def research_run(mode: str, payload: dict, steps: int, latency_s: float, rng: random.Random) -> None:
+    for _ in range(steps):
+        await asyncio.sleep(rng.expovariate(1 / latency_s))
+        await post_process(mode, payload)
+
+
+async def measure(mode: str, runs: int, steps: int, latency_s: float, payload: dict, tick_s: float) -> dict:
+    lags = []
+    done = asyncio.Event()
+
+    async def monitor():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(tick_s)
+            lags.append(time.perf_counter() - start - tick_s)
+
+    rng = random.Random(0)
+    monitor_task = asyncio.create_task(monitor())
+    start = time.perf_counter()
+    await asyncio.gather(*(research_run(mode, payload, steps, latency_s, rng) for _ in range(runs)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await monitor_task
+    lags.sort()
+    return {
+        "mode": mode,
+        "elapsed_s": elapsed,
+        "lag_p50_ms": statistics.median(lags) * 1000,
+        "lag_p99_ms": lags[int(len(lags) * 0.99)] * 1000,
+        "lag_max_ms": lags[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--hits", type=int, default=20)
+    parser.add_argument("--answer-kb", type=int, default=100)
+    parser.add_argument("--supports", type=int, default=300)
+    parser.add_argument("--tick-ms", type=float, default=5)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+
+    payload = synthetic_payload(random.Random(1), args.hits, args.answer_kb, args.supports)
+    if "process" in args.modes:
+        # 先预热进程池，避免把进程启动时间算进延迟
+        asyncio.run(post_process("process", payload))
+
+    print(f"{'mode':>8} {'elapsed_s':>10} {'lag_p50_ms':>11} {'lag_p99_ms':>11} {'lag_max_ms':>11}")
+    for mode in args.modes:
+        result = asyncio.run(
+            measure(mode, args.runs, args.steps, args.latency_ms / 1000, payload, args.tick_ms / 1000)
+        )
+        print(
+            f"{mode:>8} {result['elapsed_s']:>10.2f} {result['lag_p50_ms']:>11.1f} "
+            f"{result['lag_p99_ms']:>11.1f} {result['lag_max_ms']:>11.1f}"
+        )
+    print(cpu_offload.cpu_offload_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Local fakes of DeepSeek, Tavily and the clinical API for load tests.
+
+One FastAPI app serves all three upstreams with lognormal latency:
+
+    /deepseek/v1/chat/completions   OpenAI-compatible chat completions (JSON or SSE streaming)
+    /tavily/search                  Tavily search
+    /clinical/api/...               clinical data endpoints
+
+The fake model recognizes the agent's prompts: query generation and
+speculative prediction get query JSON, reflection gets a verdict that asks
+for follow-ups, web_research gets one web_search tool call and then a
+summary, and everything else (answer, synthesis) gets a markdown report.
+
+Point the LangGraph API container at it (see docker-compose.loadtest.yml):
+
+    DEEPSEEK_BASE_URL=http://<host>:8900/deepseek/v1
+    TAVILY_BASE_URL=http://<host>:8900/tavily
+    CLINICAL_API_BASE_URL=http://<host>:8900/clinical
+
+Usage:
+    python benchmarks/fake_services.py --port 8900 --llm-median-ms 1500 --tavily-median-ms 800
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "PD-1 inhibitor nivolumab pembrolizumab overall survival progression-free phase III "
+    "randomized trial safety 免疫 治疗 总生存期 不良事件 联合 用药 肺癌 客观缓解率"
+).split()
+
+
+class Latency:
+    """Lognormal latency with a given median and spread, in seconds."""
+
+    def __init__(self, median_ms: float, sigma: float):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+
+    async def wait(self, scale: float = 1.0) -> None:
+        await asyncio.sleep(self.median * scale * random.lognormvariate(0, self.sigma))
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))) + "."
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def fake_reply(body: dict, rng: random.Random) -> dict:
+    """Return ``{"content", "tool_calls"}`` for a chat completion request."""
+    messages = body.get("messages", [])
+    system = " ".join(message_text(m) for m in messages if m.get("role") == "system")
+    last = message_text(messages[-1]) if messages else ""
+
+    if body.get("tools"):
+        if len(messages) <= 2:
+            topic = re.search(r"研究主题：\s*(.+)", last)
+            query = (topic.group(1).strip() if topic else last[-80:]) or "PD-1"
+            arguments = json.dumps({"query": query}, ensure_ascii=False)
+            call = {"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function", "function": {"name": "web_search", "arguments": arguments}}
+            return {"content": "", "tool_calls": [call]}
+        return {"content": " ".join(sentence(rng) for _ in range(6)), "tool_calls": []}
+    if "is_sufficient" in system:
+        follow_up = f"{rng.choice(WORDS)} {rng.choice(WORDS)} follow-up {rng.randint(1, 999)}"
+        verdict = {"is_sufficient": False, "knowledge_gap": sentence(rng), "follow_up_queries": [follow_up]}
+        return {"content": f"```json\n{json.dumps(verdict, ensure_ascii=False)}\n```", "tool_calls": []}
+    if '"rationale"' in system:
+        limit = re.search(r"(\d+)", last.split("查询数量上限：")[-1]) if "查询数量上限：" in last else None
+        count = int(limit.group(1)) if limit else 1
+        queries = [f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 999)}" for _ in range(count)]
+        return {"content": json.dumps({"rationale": sentence(rng), "query": queries}, ensure_ascii=False), "tool_calls": []}
+    report = "\n\n".join(f"## {rng.choice(WORDS)}\n\n" + " ".join(sentence(rng) for _ in range(5)) for _ in range(4))
+    return {"content": report, "tool_calls": []}
+
+
+def usage(body: dict, content: str) -> dict:
+    prompt_tokens = sum(len(message_text(m)) for m in body.get("messages", [])) // 3
+    completion_tokens = max(1, len(content) // 3)
+    cached = prompt_tokens // 2
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_cache_hit_tokens": cached,
+        "prompt_cache_miss_tokens": prompt_tokens - cached,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+def create_app(llm: Latency, tavily: Latency, clinical: Latency) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random()
+    counters = {"llm": 0, "tavily": 0, "clinical": 0}
+
+    @app.post("/deepseek/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["llm"] += 1
+        reply = fake_reply(body, rng)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "deepseek-chat")
+        finish_reason = "tool_calls" if reply["tool_calls"] else "stop"
+
+        if not body.get("stream"):
+            await llm.wait()
+            message = {"role": "assistant", "content": reply["content"]}
+            if reply["tool_calls"]:
+                message["tool_calls"] = reply["tool_calls"]
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage(body, reply["content"]),
+            }
+
+        async def events():
+            # 首个 token 前等待约三分之一的延迟，其余时间均匀分布在各个分块之间
+            await llm.wait(scale=0.3)
+            chunks = [reply["content"][i : i + 40] for i in range(0, len(reply["content"]), 40)] or [""]
+            for i, text in enumerate(chunks):
+                delta = {"role": "assistant", "content": text} if i == 0 else {"content": text}
+                if i == 0 and reply["tool_calls"]:
+                    delta["tool_calls"] = [{**call, "index": n} for n, call in enumerate(reply["tool_calls"])]
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await llm.wait(scale=0.7 / len(chunks))
+            final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+                     "usage": usage(body, reply["content"])}
+            yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/tavily/search")
+    async def tavily_search(request: Request):
+        body = await request.json()
+        counters["tavily"] += 1
+        await tavily.wait()
+        query = body.get("query", "")
+        results = [
+            {
+                "title": f"{query} — {sentence(rng)[:50]}",
+                "url": f"https://site{rng.randint(1, 40)}.example.com/{uuid.uuid4().hex[:8]}",
+                "content": " ".join(sentence(rng) for _ in range(rng.randint(4, 12))),
+                "score": rng.random(),
+            }
+            for _ in range(body.get("max_results") or 5)
+        ]
+        return {"query": query, "results": results, "response_time": tavily.median}
+
+    @app.api_route("/clinical/api/{path:path}", methods=["GET", "POST"])
+    async def clinical_api(path: str, request: Request):
+        counters["clinical"] += 1
+        await clinical.wait()
+        rows = [
+            {"临床登记号": f"NCT{rng.randint(10000000, 99999999)}", "试验药通用名": rng.choice(WORDS),
+             "试验分期": rng.choice(["I期", "II期", "III期"]), "试验状态": rng.choice(["进行中", "已完成"])}
+            for _ in range(20)
+        ]
+        return JSONResponse({"code": 200, "data": {"list": rows, "total": len(rows)}})
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--llm-median-ms", type=float, default=1500)
+    parser.add_argument("--llm-sigma", type=float, default=0.5)
+    parser.add_argument("--tavily-median-ms", type=float, default=800)
+    parser.add_argument("--tavily-sigma", type=float, default=0.4)
+    parser.add_argument("--clinical-median-ms", type=float, default=300)
+    parser.add_argument("--clinical-sigma", type=float, default=0.3)
+    args = parser.parse_args()
+
+    app = create_app(
+        Latency(args.llm_median_ms, args.llm_sigma),
+        Latency(args.tavily_median_ms, args.tavily_sigma),
+        Latency(args.clinical_median_ms, args.clinical_sigma),
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
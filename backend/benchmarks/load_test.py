@@ -0,0 +1,291 @@
+"""Load-test a LangGraph API deployment of the research agent with concurrent users.
+
+Starts research runs on the ``agent`` assistant through the LangGraph HTTP
+API with Poisson arrivals and a mix of the frontend's effort presets:
+
+    low     1 initial query,  1 research loop
+    medium  2 initial queries, 2 research loops
+    high    5 initial queries, 10 research loops
+
+Each run streams the ``custom`` progress events. The harness reports:
+- throughput (completed runs per minute)
+- p50/p95/p99 run latency
+- time to first event (the first progress event shown in the frontend timeline)
+- queue wait (time from submission to the start of the first research node)
+- error count
+- container memory (peak and final), sampled with ``docker stats`` or from /proc.
+
+Upstreams should be the local fakes from benchmarks/fake_services.py, so a
+load test costs nothing and measures the deployment rather than the providers:
+
+    python benchmarks/fake_services.py --port 8900 &
+    docker compose -f docker-compose.yml -f docker-compose.loadtest.yml up -d
+    python benchmarks/load_test.py --url http://localhost:8123 --rate 30 --duration 300 \\
+        --mix low=0.5,medium=0.4,high=0.1 --container langgraph-api
+
+Compare run configurations with ``--configurable``, e.g. the straggler cutoff
+against the default on the same seed:
+
+    python benchmarks/load_test.py --mix high=1 --seed 1 --output base.json
+    python benchmarks/load_test.py --mix high=1 --seed 1 --output cutoff.json \\
+        --configurable straggler_fraction=0.75 --configurable straggler_grace_seconds=1
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from langgraph_sdk import get_client
+
+EFFORTS = {
+    "low": {"initial_search_query_count": 1, "max_research_loops": 1},
+    "medium": {"initial_search_query_count": 2, "max_research_loops": 2},
+    "high": {"initial_search_query_count": 5, "max_research_loops": 10},
+}
+
+QUESTIONS = [
+    "PD-1 抑制剂在非小细胞肺癌中的最新三期结果",
+    "What are the latest phase III results for PD-1 inhibitors?",
+    "Compare nivolumab and pembrolizumab safety in melanoma",
+    "CAR-T 疗法在实体瘤中的研究进展",
+    "Which ADCs targeting HER2 were approved in 2025?",
+]
+
+_UNITS = {"b": 1, "kib": 1024, "kb": 1000, "mib": 1024**2, "mb": 1000**2, "gib": 1024**3, "gb": 1000**3}
+
+
+def parse_mix(value: str) -> dict:
+    """Parse ``low=0.5,medium=0.4,high=0.1`` into normalized weights."""
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in EFFORTS:
+            raise argparse.ArgumentTypeError(f"unknown effort {name!r}; choose from {sorted(EFFORTS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class MemorySampler:
+    """Sample the memory of a docker container or a local process in the background."""
+
+    def __init__(self, container: Optional[str], pid: Optional[int], interval: float):
+        self.container = container
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+
+    def read_bytes(self) -> Optional[float]:
+        if self.pid:
+            status = Path(f"/proc/{self.pid}/status").read_text()
+            match = re.search(r"VmRSS:\s+(\d+) kB", status)
+            return float(match.group(1)) * 1024 if match else None
+        if self.container:
+            output = subprocess.run(
+                ["docker", "stats", "--no-stream", "--format", "{{.MemUsage}}", self.container],
+                capture_output=True,
+                text=True,
+                timeout=30,
+            ).stdout
+            match = re.match(r"\s*([\d.]+)\s*([A-Za-z]+)", output)
+            if match:
+                return float(match.group(1)) * _UNITS.get(match.group(2).lower(), 1)
+        return None
+
+    async def run(self, stop: asyncio.Event) -> None:
+        if not (self.container or self.pid):
+            return
+        while not stop.is_set():
+            try:
+                value = await asyncio.to_thread(self.read_bytes)
+            except (OSError, subprocess.SubprocessError):
+                value = None
+            if value is not None:
+                self.samples.append(value)
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+def parse_configurable(value: str) -> tuple:
+    """Parse ``key=value`` into a configurable entry; values are JSON when possible."""
+    key, sep, raw = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected key=value, got {value!r}")
+    try:
+        return key, json.loads(raw)
+    except ValueError:
+        return key, raw
+
+
+async def research_run(client, effort: str, rng: random.Random, timeout: float, configurable: dict) -> dict:
+    record = {"effort": effort, "error": None, "latency_s": None, "ttfe_s": None, "queue_wait_s": None}
+    submitted = time.perf_counter()
+    try:
+        thread = await client.threads.create()
+        payload = {
+            "messages": [{"type": "human", "content": rng.choice(QUESTIONS)}],
+            **EFFORTS[effort],
+            "reasoning_model": "deepseek-chat",
+        }
+
+        async def consume():
+            async for chunk in client.runs.stream(
+                thread["thread_id"],
+                "agent",
+                input=payload,
+                config={"configurable": configurable} if configurable else None,
+                stream_mode=["custom"],
+            ):
+                now = time.perf_counter()
+                if chunk.event == "error":
+                    record["error"] = json.dumps(chunk.data, ensure_ascii=False)[:300]
+                if chunk.event != "custom" or not isinstance(chunk.data, dict):
+                    continue
+                if chunk.data.get("type") != "progress":
+                    continue
+                node = chunk.data.get("node")
+                if record["queue_wait_s"] is None and node in ("answer_cache", "generate_query"):
+                    # 节点结束时间减去节点耗时 ≈ 运行开始执行的时间
+                    record["queue_wait_s"] = max(0.0, now - submitted - chunk.data.get("elapsed_ms", 0) / 1000)
+                # 答案缓存未命中的事件不会显示在前端时间线上
+                if record["ttfe_s"] is None and (node != "answer_cache" or chunk.data.get("hit")):
+                    record["ttfe_s"] = now - submitted
+
+        await asyncio.wait_for(consume(), timeout)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"[:300]
+    record["latency_s"] = time.perf_counter() - submitted
+    return record
+
+
+def summarize(records: List[dict], elapsed: float, memory: List[float]) -> dict:
+    ok = [r for r in records if not r["error"]]
+
+    def stats(key: str, rows: List[dict]) -> dict:
+        values = [r[key] for r in rows if r[key] is not None]
+        return {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": statistics.fmean(values) if values else None,
+        }
+
+    summary = {
+        "runs": len(records),
+        "completed": len(ok),
+        "errors": len(records) - len(ok),
+        "elapsed_s": elapsed,
+        "throughput_runs_per_min": len(ok) / elapsed * 60 if elapsed else 0.0,
+        "latency_s": stats("latency_s", ok),
+        "ttfe_s": stats("ttfe_s", ok),
+        "queue_wait_s": stats("queue_wait_s", ok),
+        "by_effort": {
+            effort: {"completed": len(rows), "latency_s": stats("latency_s", rows)}
+            for effort in EFFORTS
+            if (rows := [r for r in ok if r["effort"] == effort])
+        },
+        "memory_mb": {
+            "peak": max(memory) / 1024**2 if memory else None,
+            "final": memory[-1] / 1024**2 if memory else None,
+            "samples": len(memory),
+        },
+        "sample_errors": sorted({r["error"] for r in records if r["error"]})[:5],
+    }
+    return summary
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}s"
+
+
+async def run_load(args) -> dict:
+    client = get_client(url=args.url)
+    rng = random.Random(args.seed)
+    efforts, weights = zip(*args.mix.items())
+    stop = asyncio.Event()
+    sampler = MemorySampler(args.container, args.pid, args.memory_interval)
+    sampler_task = asyncio.create_task(sampler.run(stop))
+    semaphore = asyncio.Semaphore(args.max_in_flight) if args.max_in_flight else None
+    configurable = dict(args.configurable)
+
+    async def one(effort: str) -> dict:
+        if semaphore is None:
+            return await research_run(client, effort, rng, args.run_timeout, configurable)
+        async with semaphore:
+            return await research_run(client, effort, rng, args.run_timeout, configurable)
+
+    tasks = []
+    start = time.perf_counter()
+    # 泊松到达：相邻两次提交的间隔服从指数分布
+    while time.perf_counter() - start < args.duration:
+        effort = rng.choices(efforts, weights)[0]
+        tasks.append(asyncio.create_task(one(effort)))
+        await asyncio.sleep(rng.expovariate(args.rate / 60))
+    print(f"submitted {len(tasks)} runs in {args.duration:.0f}s; waiting for them to finish")
+    records = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler_task
+    return summarize(records, elapsed, sampler.samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8123", help="LangGraph API base URL")
+    parser.add_argument("--rate", type=float, default=10, help="Run arrivals per minute (Poisson)")
+    parser.add_argument("--duration", type=float, default=120, help="Seconds during which runs are submitted")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("low=0.5,medium=0.4,high=0.1"))
+    parser.add_argument("--max-in-flight", type=int, default=0, help="Cap on concurrent runs (0 = open loop)")
+    parser.add_argument("--run-timeout", type=float, default=1800)
+    parser.add_argument("--container", default=None, help="Docker container whose memory is sampled")
+    parser.add_argument("--pid", type=int, default=None, help="Local server process whose RSS is sampled")
+    parser.add_argument("--memory-interval", type=float, default=5.0)
+    parser.add_argument(
+        "--configurable",
+        type=parse_configurable,
+        action="append",
+        default=[],
+        help="Run configuration as key=value, repeatable (e.g. straggler_fraction=0.75)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the JSON summary to this file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args))
+    print(
+        f"runs={summary['runs']} completed={summary['completed']} errors={summary['errors']} "
+        f"throughput={summary['throughput_runs_per_min']:.1f} runs/min"
+    )
+    for key in ("latency_s", "ttfe_s", "queue_wait_s"):
+        values = summary[key]
+        print(
+            f"{key:>13}: p50={format_seconds(values['p50'])} p95={format_seconds(values['p95'])} "
+            f"p99={format_seconds(values['p99'])}"
+        )
+    memory = summary["memory_mb"]
+    if memory["samples"]:
+        print(f"   memory_mb: peak={memory['peak']:.0f} final={memory['final']:.0f}")
+    for error in summary["sample_errors"]:
+        print(f"error: {error}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
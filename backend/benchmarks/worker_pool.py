@@ -0,0 +1,106 @@
+"""Benchmark web_research branch throughput on the worker pool with 1..N workers.
+
+Each job stands in for one web_research branch: it sleeps for a sampled
+latency (LLM and search round trips) and burns a little CPU (result
+parsing and compression). Jobs go through the real queue, lease, retry
+and idempotency code of agent.worker_pool, using a temporary SQLite queue.
+With ``--crash-rate`` a worker process exits mid-job with that probability;
+its job is retried after the lease expires and the process is restarted.
+
+Usage:
+    python benchmarks/worker_pool.py --jobs 64 --workers 1 2 4 8 --latency-ms 200
+    python benchmarks/worker_pool.py --jobs 32 --workers 4 --crash-rate 0.1
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from agent import worker_pool
+
+
+def synthetic_branch(payload: dict) -> dict:
+    """Simulate one web_research branch."""
+    if random.random() < payload["crash_rate"]:
+        os._exit(1)
+    time.sleep(random.expovariate(1 / payload["latency_s"]))
+    checksum = 0
+    for i in range(payload["cpu_loops"]):
+        checksum = (checksum * 31 + i) % 1_000_003
+    return {"update": {"search_query": [payload["query"]]}, "progress": {"checksum": checksum}}
+
+
+def run_once(workers: int, jobs: int, latency_s: float, cpu_loops: int, crash_rate: float, lease_s: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["WEB_RESEARCH_QUEUE_URL"] = f"file://{tmp}/queue.sqlite3"
+        os.environ["WEB_RESEARCH_LEASE_SECONDS"] = str(lease_s)
+        os.environ["WEB_RESEARCH_MAX_ATTEMPTS"] = "10"
+        worker_pool.get_branch_queue.cache_clear()
+        queue = worker_pool.get_branch_queue()
+
+        stop_event = multiprocessing.Event()
+        processes = worker_pool.start_workers(workers, handler=synthetic_branch, stop_event=stop_event)
+        start = time.perf_counter()
+        ids = []
+        for i in range(jobs):
+            job_id = f"job-{i}"
+            payload = {"query": f"q{i}", "latency_s": latency_s, "cpu_loops": cpu_loops, "crash_rate": crash_rate}
+            queue.submit(job_id, payload)
+            # 重复投递同一个分支不会产生第二个任务
+            assert not queue.submit(job_id, payload)
+            ids.append(job_id)
+
+        restarted = 0
+        pending = set(ids)
+        while pending:
+            for job_id in list(pending):
+                job = queue.status(job_id)
+                if job["status"] == "done":
+                    pending.discard(job_id)
+                elif job["status"] == "failed":
+                    raise RuntimeError(f"{job_id} failed: {job['error']}")
+            restarted += worker_pool.restart_dead_workers(processes, handler=synthetic_branch, stop_event=stop_event)
+            time.sleep(0.02)
+        elapsed = time.perf_counter() - start
+
+        attempts = sum(queue.status(job_id)["attempts"] for job_id in ids)
+        stop_event.set()
+        for process in processes:
+            process.join(timeout=5)
+        return {
+            "workers": workers,
+            "elapsed_s": elapsed,
+            "jobs_per_s": jobs / elapsed,
+            "retries": attempts - jobs,
+            "restarted": restarted,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--cpu-loops", type=int, default=200_000)
+    parser.add_argument("--crash-rate", type=float, default=0.0)
+    parser.add_argument("--lease-s", type=float, default=1.0)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'elapsed_s':>10} {'jobs/s':>8} {'speedup':>8} {'retries':>8} {'restarted':>10}")
+    for workers in args.workers:
+        result = run_once(
+            workers, args.jobs, args.latency_ms / 1000, args.cpu_loops, args.crash_rate, args.lease_s
+        )
+        baseline = baseline or result["jobs_per_s"]
+        print(
+            f"{workers:>8} {result['elapsed_s']:>10.2f} {result['jobs_per_s']:>8.1f} "
+            f"{result['jobs_per_s'] / baseline:>7.2f}x {result['retries']:>8} {result['restarted']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import json
+
+from agent.batch import load_questions, run_batch
+
+
+def main() -> None:
+    """Run a batch of research questions from a JSONL file."""
+    parser = argparse.ArgumentParser(description="Run many research questions through the LangGraph agent")
+
+    #输入文件：每行一个JSON对象，包含 question 和可选的 id
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"question\"} object per line")
+    #输出文件：逐条追加写入，重跑时跳过已完成的id
+    parser.add_argument("output", help="JSONL file receiving the results")
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of questions running at once",
+    )
+    parser.add_argument(
+        "--initial-queries",
+        type=int,
+        default=3,
+        help="Number of initial search queries",
+    )
+    parser.add_argument(
+        "--max-loops",
+        type=int,
+        default=2,
+        help="Maximum number of research loops",
+    )
+    parser.add_argument(
+        "--reasoning-model",
+        default=None,
+        help="Model for the final answer",
+    )
+
+    args = parser.parse_args()
+
+    summary = run_batch(
+        load_questions(args.input),
+        args.output,
+        concurrency=args.concurrency,
+        initial_search_query_count=args.initial_queries,
+        max_research_loops=args.max_loops,
+        reasoning_model=args.reasoning_model,
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import multiprocessing
+import time
+
+from agent.worker_pool import restart_dead_workers, start_workers
+
+
+def main() -> None:
+    """Run a pool of web_research worker processes."""
+    parser = argparse.ArgumentParser(
+        description="Run web_research branches submitted by graphs with distributed_web_research enabled"
+    )
+
+    #工作进程数量；队列位置由 WEB_RESEARCH_QUEUE_URL 指定，可以在多台机器上各启动一组
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of worker processes",
+    )
+    parser.add_argument(
+        "--check-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between checks for crashed workers",
+    )
+    args = parser.parse_args()
+
+    stop_event = multiprocessing.Event()
+    processes = start_workers(args.workers, stop_event=stop_event)
+    try:
+        while True:
+            time.sleep(args.check_interval)
+            #崩溃的工作进程自动重启，它未完成的分支在租约过期后由其他进程重试
+            restart_dead_workers(processes, stop_event=stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for process in processes:
+            process.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from agent.logger import get_logger
+from agent.paths import data_path
+
+logger = get_logger(__name__)
+
+'''
+   整次运行级别的答案缓存
+   很多用户会问相同的问题（如“最新的 PD-1 三期结果”），每次都要完整跑一遍
+   generate→research→reflect→finalize。
+   👇主要逻辑：
+      1.键 = 规范化的研究主题 + 强度参数（initial_search_query_count、max_research_loops、模型）；
+      2.值 = 最终回答文本 + 去重后的 sources_gathered + 写入时间；
+      3.新鲜期（TTL）内直接返回；过期但仍在最长保留期内时，stale-while-revalidate 模式
+        立即返回旧报告，并在后台重新跑一遍图刷新缓存（同一个键同时只刷新一次）；
+      4.存储后端由 ANSWER_CACHE_URL 指定：file:///path.sqlite3（默认数据目录下的 answer_cache.sqlite3，见 agent.paths）
+        或 redis://...（与部署栈共用的 Redis）；
+      5.记录命中、过期命中、未命中、后台刷新次数。
+'''
+
+_TRAILING_PUNCT_RE = re.compile(r"[\s?？。.!！]+$")
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a research topic for cache lookups: case, whitespace and trailing punctuation."""
+    return _TRAILING_PUNCT_RE.sub("", " ".join(str(topic).lower().split()))
+
+
+def answer_cache_key(topic: str, query_count: int, max_loops: int, model: str) -> str:
+    """Return the cache key of a research topic and its effort parameters."""
+    raw = json.dumps([normalize_topic(topic), query_count, max_loops, model], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LocalAnswerStore:
+    """Answer cache storage in a local SQLite file.
+
+    Args:
+        path: SQLite database file.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else data_path("answer_cache.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, value TEXT, created_at REAL)"
+            )
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM answers WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, entry: dict, max_age_seconds: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(entry, ensure_ascii=False), entry["created_at"]),
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE created_at < ?", (time.time() - max_age_seconds,)
+            )
+
+
+class RedisAnswerStore:
+    """Answer cache storage in Redis; entries expire after their maximum age.
+
+    Args:
+        url: Redis connection URL.
+        prefix: Key prefix.
+    """
+
+    def __init__(self, url: str, prefix: str = "answer-cache:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisAnswerStore requires redis: pip install redis") from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self._client.get(self.prefix + key)
+        return json.loads(value) if value else None
+
+    def set(self, key: str, entry: dict, max_age_seconds: float) -> None:
+        self._client.set(
+            self.prefix + key, json.dumps(entry, ensure_ascii=False), ex=max(1, int(max_age_seconds))
+        )
+
+
+class AnswerCache:
+    """Run-level answer cache with a freshness TTL and stale-while-revalidate refreshes.
+
+    Args:
+        store: Storage backend with ``get(key)`` and ``set(key, entry, max_age_seconds)``.
+        max_refresh_workers: Number of background refreshes run concurrently.
+    """
+
+    def __init__(self, store, max_refresh_workers: int = 2):
+        self.store = store
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_refresh_workers, thread_name_prefix="answer-cache-refresh"
+        )
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, key: str, ttl_seconds: float, max_stale_seconds: float) -> Optional[dict]:
+        """Return ``{"content", "sources", "age", "stale"}`` for a usable entry, or None.
+
+        Entries older than ``ttl_seconds`` are stale; entries older than
+        ``max_stale_seconds`` (or stale ones when that is not above the TTL) are misses.
+        """
+        try:
+            entry = self.store.get(key)
+        except Exception as e:
+            logger.info(f"📦答案缓存|读取失败:{e}")
+            entry = None
+        if entry is not None:
+            age = time.time() - entry["created_at"]
+            if age <= ttl_seconds:
+                self._count("hits")
+                return {**entry, "age": age, "stale": False}
+            if age <= max_stale_seconds:
+                self._count("stale_hits")
+                return {**entry, "age": age, "stale": True}
+        self._count("misses")
+        return None
+
+    def store_answer(self, key: str, content: str, sources: List[dict], max_age_seconds: float) -> None:
+        """Store the final answer and its deduplicated sources."""
+        entry = {"content": content, "sources": sources, "created_at": time.time()}
+        try:
+            self.store.set(key, entry, max_age_seconds)
+        except Exception as e:
+            logger.info(f"📦答案缓存|写入失败:{e}")
+
+    def revalidate(self, key: str, refresh: Callable[[], None]) -> bool:
+        """Run ``refresh`` in the background unless ``key`` is already being refreshed."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self._stats["refreshes"] += 1
+
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                self._count("refresh_failures")
+                logger.info(f"📦答案缓存|后台刷新失败:{e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(run)
+        return True
+
+    def stats(self) -> dict:
+        """Return hit/miss/refresh counters and the hit rate (stale hits included)."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+@lru_cache(maxsize=1)
+def get_answer_cache() -> AnswerCache:
+    """Return the shared answer cache configured by ``ANSWER_CACHE_URL``."""
+    url = os.getenv("ANSWER_CACHE_URL")
+    if not url:
+        return AnswerCache(LocalAnswerStore())
+    if url.startswith(("redis://", "rediss://")):
+        return AnswerCache(RedisAnswerStore(url))
+    if url.startswith("file://"):
+        return AnswerCache(LocalAnswerStore(url[len("file://") :]))
+    raise ValueError(f"Unsupported ANSWER_CACHE_URL scheme: {url}")
@@ -1,12 +1,43 @@
 # mypy: disable - error - code = "no-untyped-def,misc"
 import pathlib
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
+from agent.profiling import get_profile_dir, profile_paths
+
 # Define the FastAPI app
 app = FastAPI()
 
 
+@app.get("/profiles/{thread_id}")
+def list_profiles(thread_id: str):
+    """List the run ids with a stored profile in a thread."""
+    try:
+        thread_dir = profile_paths(thread_id, "_")["collapsed"].parent
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not thread_dir.is_dir():
+        return {"thread_id": thread_id, "runs": []}
+    runs = sorted(path.name[: -len(".collapsed")] for path in thread_dir.glob("*.collapsed"))
+    return {"thread_id": thread_id, "runs": runs}
+
+
+@app.get("/profiles/{thread_id}/{run_id}")
+def get_profile(thread_id: str, run_id: str, format: str = "speedscope"):
+    """Return the stored profile of a run as speedscope JSON or collapsed stacks."""
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be 'speedscope' or 'collapsed'")
+    try:
+        path = profile_paths(thread_id, run_id)[format]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not path.is_file() or get_profile_dir().resolve() not in path.resolve().parents:
+        raise HTTPException(status_code=404, detail="profile not found")
+    media_type = "application/json" if format == "speedscope" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+
 def create_frontend_router(build_dir="../frontend/dist"):
     """Creates a router to serve the React frontend.
 
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+from langchain_core.messages import HumanMessage
+
+from agent.graph import graph
+from agent.logger import get_logger
+from agent.tools_and_schemas import search_cache, tavily_flight
+
+logger = get_logger(__name__)
+
+'''
+   批量研究入口
+   一次把成百上千个问题（例如每个药物靶点一个问题）跑过编译好的 graph。
+   👇主要逻辑：
+      1.从JSONL文件或问题列表读取问题，每个问题有稳定的id；
+      2.全局并发上限内并行调用 graph.invoke；
+      3.同一进程内共享模型客户端连接池、搜索缓存和限流器（见 agent.clients）；
+      4.每完成一个问题就追加写入结果JSONL，崩溃后重跑时跳过已完成的id；
+      5.统计吞吐量（问题/分钟）。
+'''
+
+
+def question_id(question: str) -> str:
+    """Return a stable id for a question without an explicit one."""
+    return hashlib.sha1(question.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_questions(questions: Iterable[Union[str, dict]]) -> List[dict]:
+    """Normalize plain strings or ``{"id", "question"}`` dicts into dicts with ids."""
+    items = []
+    for item in questions:
+        if isinstance(item, str):
+            item = {"question": item}
+        question = item["question"]
+        items.append({**item, "id": str(item.get("id") or question_id(question))})
+    return items
+
+
+def load_questions(path: Union[str, Path]) -> List[dict]:
+    """Load questions from a JSONL file (objects with ``question`` and optional ``id``)."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                items.append(json.loads(line))
+    return normalize_questions(items)
+
+
+def load_finished_ids(output_path: Union[str, Path]) -> set:
+    """Return the ids already written successfully to ``output_path``."""
+    finished = set()
+    path = Path(output_path)
+    if not path.exists():
+        return finished
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 崩溃时可能写了半行，忽略
+                continue
+            if not record.get("error"):
+                finished.add(record["id"])
+    return finished
+
+
+def run_question(
+    item: dict,
+    initial_search_query_count: int,
+    max_research_loops: int,
+    reasoning_model: Optional[str],
+    configurable: Optional[dict] = None,
+) -> dict:
+    """Run one question through the graph and return its JSONL record."""
+    state = {
+        "messages": [HumanMessage(content=item["question"])],
+        "initial_search_query_count": initial_search_query_count,
+        "max_research_loops": max_research_loops,
+    }
+    if reasoning_model:
+        state["reasoning_model"] = reasoning_model
+    config = {"configurable": {**(configurable or {}), "thread_id": f"batch-{item['id']}"}}
+
+    start = time.perf_counter()
+    record = {"id": item["id"], "question": item["question"]}
+    try:
+        result = graph.invoke(state, config)
+        messages = result.get("messages", [])
+        record["answer"] = messages[-1].content if messages else ""
+        record["sources"] = result.get("sources_gathered", [])
+        record["error"] = None
+    except Exception as e:
+        logger.exception(f"📦批量任务{item['id']}失败")
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(
+    questions: Iterable[Union[str, dict]],
+    output_path: Union[str, Path],
+    concurrency: int = 4,
+    initial_search_query_count: int = 3,
+    max_research_loops: int = 2,
+    reasoning_model: Optional[str] = None,
+    configurable: Optional[dict] = None,
+) -> dict:
+    """Run many questions through the graph with a global concurrency limit.
+
+    Results are appended to ``output_path`` as they finish, so an interrupted
+    batch can be resumed by calling this again with the same output file.
+
+    Args:
+        questions: Question strings or dicts with ``question`` and optional ``id``.
+        output_path: JSONL file receiving one record per finished question.
+        concurrency: Maximum number of questions running at once.
+        initial_search_query_count: Initial search queries per question.
+        max_research_loops: Maximum research loops per question.
+        reasoning_model: Optional model override for the final answer.
+        configurable: Extra ``Configuration`` values applied to every run.
+
+    Returns:
+        Summary with completed/failed/skipped counts and throughput.
+    """
+    items = normalize_questions(questions)
+    finished = load_finished_ids(output_path)
+    pending = [item for item in items if item["id"] not in finished]
+    skipped = len(items) - len(pending)
+    logger.info(
+        f"📦批量研究|共{len(items)}个问题，跳过已完成{skipped}个，待运行{len(pending)}个，并发={concurrency}"
+    )
+
+    write_lock = threading.Lock()
+    completed = failed = 0
+    start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="batch"
+    ) as executor:
+        futures = [
+            executor.submit(
+                run_question,
+                item,
+                initial_search_query_count,
+                max_research_loops,
+                reasoning_model,
+                configurable,
+            )
+            for item in pending
+        ]
+        for future in as_completed(futures):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            if record["error"]:
+                failed += 1
+            else:
+                completed += 1
+            elapsed = time.perf_counter() - start
+            done = completed + failed
+            logger.info(
+                f"📦批量研究|进度{done}/{len(pending)}，吞吐量={done / elapsed * 60:.2f}问题/分钟"
+            )
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "total": len(items),
+        "skipped": skipped,
+        "completed": completed,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_minute": (completed + failed) / elapsed * 60 if elapsed else 0.0,
+        "search_cache": search_cache.stats(),
+        "search_singleflight": tavily_flight.stats(),
+    }
+    logger.info(f"📦批量研究|完成:{summary}")
+    return summary
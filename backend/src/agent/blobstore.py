@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, List, Optional
+from urllib.parse import urlparse
+
+from agent.logger import get_logger
+from agent.paths import data_path
+
+logger = get_logger(__name__)
+
+'''
+   状态大字段卸载到内容寻址的 blob 存储
+   使用 Postgres checkpointer 时每个 super-step 都会持久化完整的 OverallState，
+   web_research_result 里的 Tavily markdown 和 sources_gathered 会被反复写入。
+   👇主要逻辑：
+      1.web_research 返回前把大文本和本分支的来源列表压缩（zlib）后写入 blob 存储，
+        以 sha256 为键，相同内容只存一份；
+      2.状态里只保留引用：文本为 "blob://sha256/<hex>" 字符串，来源为 {"blob_ref", "count", "labels"}；
+      3.节点读取时再按需还原（带进程内 LRU 缓存）；
+      4.存储后端由 BLOB_STORE_URL 指定：file:///path（默认数据目录下的 blobs/，见 agent.paths）或 s3://bucket/prefix。
+'''
+
+BLOB_PREFIX = "blob://sha256/"
+
+
+class LocalBlobStore:
+    """Content-addressed blob store on the local filesystem.
+
+    Args:
+        root: Directory holding the blobs, sharded by the first two hex digits.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else data_path("blobs")
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, digest: str, data: bytes) -> None:
+        """Store compressed ``data`` under ``digest`` unless it already exists."""
+        path = self._path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写每次调用独有的临时文件再原子重命名，避免并发分支读到半个文件或互相移走临时文件；
+        # 内容寻址，别的线程/进程先写入同一个 blob 也算成功
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{digest}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if not path.exists():
+                raise
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def get(self, digest: str) -> bytes:
+        """Return the compressed bytes stored under ``digest``."""
+        return self._path(digest).read_bytes()
+
+
+class S3BlobStore:
+    """Content-addressed blob store on S3 or an S3-compatible service (e.g. MinIO).
+
+    Args:
+        bucket: Bucket name.
+        prefix: Key prefix inside the bucket.
+        endpoint_url: Optional endpoint of an S3-compatible service.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError as e:
+            raise ImportError("S3BlobStore requires boto3: pip install boto3") from e
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}/{digest}" if self.prefix else digest
+
+    def put(self, digest: str, data: bytes) -> None:
+        """Store compressed ``data`` under ``digest``."""
+        self._client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=data)
+
+    def get(self, digest: str) -> bytes:
+        """Return the compressed bytes stored under ``digest``."""
+        return self._client.get_object(Bucket=self.bucket, Key=self._key(digest))["Body"].read()
+
+
+@lru_cache(maxsize=1)
+def get_blob_store():
+    """Return the blob store configured by ``BLOB_STORE_URL``."""
+    url = os.getenv("BLOB_STORE_URL")
+    if not url:
+        return LocalBlobStore()
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3BlobStore(parsed.netloc, parsed.path, endpoint_url=os.getenv("S3_ENDPOINT_URL"))
+    if parsed.scheme == "file":
+        return LocalBlobStore(parsed.path)
+    raise ValueError(f"Unsupported BLOB_STORE_URL scheme: {url}")
+
+
+def put_blob(value: Any, store=None) -> str:
+    """Compress and store a JSON-serializable value; return its blob reference."""
+    data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    (store or get_blob_store()).put(digest, zlib.compress(data, 6))
+    return f"{BLOB_PREFIX}{digest}"
+
+
+@lru_cache(maxsize=512)
+def _load_blob(ref: str) -> Any:
+    digest = ref[len(BLOB_PREFIX) :]
+    return json.loads(zlib.decompress(get_blob_store().get(digest)))
+
+
+def is_blob_ref(value: Any) -> bool:
+    """Return whether ``value`` is a blob reference string."""
+    return isinstance(value, str) and value.startswith(BLOB_PREFIX)
+
+
+def offload_texts(texts: List[str], min_bytes: int) -> List[str]:
+    """Replace texts larger than ``min_bytes`` with blob references."""
+    return [
+        put_blob(text) if len(text.encode("utf-8")) >= min_bytes else text
+        for text in texts
+    ]
+
+
+def offload_sources(sources: List[dict], min_bytes: int) -> List[dict]:
+    """Replace a branch's source list with a single reference entry when it is large enough.
+
+    The entry keeps the source count and a few labels for progress display.
+    """
+    if len(json.dumps(sources, ensure_ascii=False).encode("utf-8")) < min_bytes:
+        return sources
+    labels = list(dict.fromkeys(s.get("label") for s in sources if s.get("label")))[:3]
+    return [{"blob_ref": put_blob(sources), "count": len(sources), "labels": labels}]
+
+
+def hydrate_texts(texts: List[str]) -> List[str]:
+    """Resolve blob references in a list of texts."""
+    return [_load_blob(text) if is_blob_ref(text) else text for text in texts]
+
+
+def hydrate_sources(sources: List[dict]) -> List[dict]:
+    """Expand blob reference entries in a list of sources."""
+    hydrated = []
+    for source in sources:
+        if "blob_ref" in source:
+            hydrated.extend(_load_blob(source["blob_ref"]))
+        else:
+            hydrated.append(source)
+    return hydrated
@@ -0,0 +1,119 @@
+import math
+import time
+from typing import List, Optional
+
+from agent.logger import get_logger
+from agent.prompt_layout import cached_prompt_tokens
+
+logger = get_logger(__name__)
+
+'''
+   按运行计的预算管理（时间、token、费用）
+   high 档位最多 5个查询 × 10轮，evaluate_research 只限制轮数，尾延迟不可控。
+   👇主要逻辑：
+      1.OverallState["budget"] 记录本次运行的开始时间和累计 token/费用，
+        每个节点把自己的模型用量通过 reducer 累加进去；
+      2.剩余比例 = 时间/token/费用三者中最紧张的那一项；
+      3.剩余不足一半时逐级降级：减少 follow-up 的 Send 数量、压缩上下文、
+        reflection 改用更便宜的模型、web_research 只做一轮工具调用；
+      4.剩余比例过低或距离截止时间不足以完成 finalize_answer 时，提前进入 finalize_answer。
+'''
+
+# 每百万 token 的价格（美元）：(输入未命中缓存, 输入命中缓存, 输出)
+MODEL_PRICES = {
+    "deepseek-chat": (0.27, 0.07, 1.10),
+    "deepseek-reasoner": (0.55, 0.14, 2.19),
+}
+
+DEGRADE_FRACTION = 0.5
+FINALIZE_FRACTION = 0.1
+
+
+def usage_from_message(message, model: str) -> dict:
+    """Return the ``budget`` charge (tokens and cost) of one model response."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    cached_tokens = min(cached_prompt_tokens(message), input_tokens)
+    miss_price, hit_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0, 0.0))
+    cost = (
+        (input_tokens - cached_tokens) * miss_price
+        + cached_tokens * hit_price
+        + output_tokens * output_price
+    )
+    return {"tokens": input_tokens + output_tokens, "cost": cost / 1_000_000}
+
+
+def sum_usage(*charges: dict) -> dict:
+    """Add several charges together."""
+    return {
+        "tokens": sum(c.get("tokens", 0) for c in charges),
+        "cost": sum(c.get("cost", 0.0) for c in charges),
+    }
+
+
+class RunBudget:
+    """View over a run's ``budget`` state with the configured limits.
+
+    A limit of ``0`` means unlimited. ``remaining_fraction`` is the tightest of
+    the time, token and cost budgets.
+    """
+
+    def __init__(self, configurable, budget: Optional[dict]):
+        budget = budget or {}
+        self.max_seconds = configurable.max_run_seconds
+        self.max_tokens = configurable.max_run_tokens
+        self.max_cost = configurable.max_run_cost
+        self.finalize_reserve_seconds = configurable.budget_finalize_reserve_seconds
+        self.started_at = budget.get("run_started_at", time.time())
+        self.tokens = budget.get("tokens", 0)
+        self.cost = budget.get("cost", 0.0)
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    @property
+    def time_left(self) -> float:
+        return self.max_seconds - self.elapsed if self.max_seconds else math.inf
+
+    def remaining_fraction(self) -> float:
+        """Return the remaining share (0-1) of the tightest configured budget."""
+        fractions = []
+        if self.max_seconds:
+            fractions.append(1 - self.elapsed / self.max_seconds)
+        if self.max_tokens:
+            fractions.append(1 - self.tokens / self.max_tokens)
+        if self.max_cost:
+            fractions.append(1 - self.cost / self.max_cost)
+        return max(0.0, min(fractions, default=1.0))
+
+    @property
+    def degraded(self) -> bool:
+        return self.remaining_fraction() < DEGRADE_FRACTION
+
+    def should_finalize(self) -> bool:
+        """Return whether the run must skip further research to finish in budget."""
+        return (
+            self.remaining_fraction() <= FINALIZE_FRACTION
+            or self.time_left <= self.finalize_reserve_seconds
+        )
+
+    def follow_up_limit(self, count: int) -> int:
+        """Scale the number of follow-up branches down with the remaining budget."""
+        if not self.degraded:
+            return count
+        return max(1, math.ceil(count * self.remaining_fraction() / DEGRADE_FRACTION))
+
+    def pack_summaries(self, summaries: List[str], base_chars: int = 8000) -> List[str]:
+        """Truncate each summary proportionally to the remaining budget once degraded."""
+        if not self.degraded:
+            return summaries
+        limit = max(1000, int(base_chars * self.remaining_fraction() / DEGRADE_FRACTION))
+        return [s if len(s) <= limit else s[:limit] + "\n[...truncated for budget...]" for s in summaries]
+
+    def describe(self) -> str:
+        return (
+            f"elapsed={self.elapsed:.1f}s,tokens={self.tokens},cost=${self.cost:.4f},"
+            f"remaining={self.remaining_fraction():.0%}"
+        )
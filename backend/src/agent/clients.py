@@ -0,0 +1,93 @@
+import asyncio
+import os
+import weakref
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+from google.genai import Client
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_deepseek import ChatDeepSeek
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+load_dotenv()
+
+'''
+   进程级共享的模型客户端与限流器
+   每个节点每次调用都新建 ChatDeepSeek 会重复创建 HTTP 连接池；
+   这里按 (model, temperature, max_retries) 缓存客户端实例，
+   同一进程内的所有运行（包括批量运行）共享连接池与限流器。
+   Gemini 同理共享 genai Client 与 ChatGoogleGenerativeAI，并用每个事件循环一个的信号量
+   限制进程内同时进行的 Gemini 请求数（GEMINI_MAX_CONCURRENCY）。
+'''
+
+deepseek_baseurl = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
+
+
+def rate_limiter_from_env(name: str) -> Optional[InMemoryRateLimiter]:
+    """Create a shared token-bucket rate limiter if the env var ``name`` is set.
+
+    The env var holds the allowed requests per second, e.g.
+    ``DEEPSEEK_REQUESTS_PER_SECOND=5``.
+    """
+    value = os.getenv(name)
+    if not value:
+        return None
+    requests_per_second = float(value)
+    return InMemoryRateLimiter(
+        requests_per_second=requests_per_second,
+        check_every_n_seconds=0.05,
+        max_bucket_size=max(1.0, requests_per_second),
+    )
+
+
+deepseek_rate_limiter = rate_limiter_from_env("DEEPSEEK_REQUESTS_PER_SECOND")
+tavily_rate_limiter = rate_limiter_from_env("TAVILY_REQUESTS_PER_SECOND")
+
+
+@lru_cache(maxsize=None)
+def get_deepseek_llm(
+    model: str = "deepseek-chat", temperature: float = 0, max_retries: int = 2
+) -> ChatDeepSeek:
+    """Return the shared DeepSeek chat client for the given settings."""
+    return ChatDeepSeek(
+        model=model,
+        temperature=temperature,
+        max_retries=max_retries,
+        api_key=os.getenv("DEEP_SEEK_KEY"),
+        base_url=deepseek_baseurl,
+        rate_limiter=deepseek_rate_limiter,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_genai_client() -> Client:
+    """Return the shared google-genai client (use ``.aio`` for async calls)."""
+    return Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_gemini_llm(model: str, temperature: float = 0, max_retries: int = 2) -> ChatGoogleGenerativeAI:
+    """Return the shared Gemini chat client for the given settings."""
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        max_retries=max_retries,
+        api_key=os.getenv("GEMINI_API_KEY"),
+    )
+
+
+_gemini_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_gemini_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore limiting concurrent Gemini requests on the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _gemini_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _gemini_semaphores[loop] = asyncio.Semaphore(
+            int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+        )
+    return semaphore
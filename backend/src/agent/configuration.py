@@ -46,6 +46,265 @@ class Configuration(BaseModel):
         metadata={"description": "The maximum number of research loops to perform."},
     )
 
+    context_token_budget: int = Field(
+        default=4000,
+        metadata={
+            "description": "The approximate token budget of the conversation context passed to each prompt in multi-turn threads."
+        },
+    )
+
+    speculative_prefetch: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to predict and prefetch follow-up web searches while reflection runs."
+        },
+    )
+
+    speculative_prefetch_count: int = Field(
+        default=3,
+        metadata={"description": "The maximum number of follow-up queries to prefetch per research loop."},
+    )
+
+    speculative_match_threshold: float = Field(
+        default=0.6,
+        metadata={
+            "description": "The minimum query similarity (0-1) for a prefetched search result to be reused."
+        },
+    )
+
+    research_memory: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to reuse fresh research chunks from earlier runs and persist this run's results."
+        },
+    )
+
+    research_memory_ttl_hours: float = Field(
+        default=72,
+        metadata={"description": "How long (in hours) remembered research chunks count as fresh."},
+    )
+
+    research_memory_min_score: float = Field(
+        default=0.5,
+        metadata={"description": "The minimum cosine similarity (0-1) for a remembered chunk to match a query."},
+    )
+
+    research_memory_min_chunks: int = Field(
+        default=2,
+        metadata={"description": "The number of matching fresh chunks needed to skip a query's web search."},
+    )
+
+    offload_state_payloads: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to offload large web research texts and source lists to the blob store so checkpoints only carry references."
+        },
+    )
+
+    offload_min_bytes: int = Field(
+        default=2048,
+        metadata={"description": "The minimum payload size in bytes that gets offloaded to the blob store."},
+    )
+
+    max_run_seconds: float = Field(
+        default=0,
+        metadata={"description": "The wall-clock budget of one run in seconds (0 for unlimited)."},
+    )
+
+    max_run_tokens: int = Field(
+        default=0,
+        metadata={"description": "The LLM token budget of one run (0 for unlimited)."},
+    )
+
+    max_run_cost: float = Field(
+        default=0,
+        metadata={"description": "The LLM cost budget of one run in USD (0 for unlimited)."},
+    )
+
+    budget_finalize_reserve_seconds: float = Field(
+        default=30,
+        metadata={
+            "description": "The time kept in reserve for finalize_answer; research stops once less is left before the deadline."
+        },
+    )
+
+    budget_reflection_model: str = Field(
+        default="deepseek-chat",
+        metadata={"description": "The cheaper model used for reflection once the run budget runs low."},
+    )
+
+    rerank_top_k: int = Field(
+        default=0,
+        metadata={
+            "description": "The number of Tavily hits web_search keeps after local BM25 reranking and near-duplicate removal (0 = no reranking, keep every hit in order). Reranking is hit-level only: it reorders and drops whole hits, while the passages inside each hit, including those kept by compress_branch_results, stay in their original order."
+        },
+    )
+
+    rerank_min_score: float = Field(
+        default=0.2,
+        metadata={"description": "The minimum reranking score, relative to the best hit (0-1), for a hit to be kept."},
+    )
+
+    rerank_duplicate_threshold: float = Field(
+        default=0.85,
+        metadata={"description": "The term cosine similarity above which a hit from an already kept domain is dropped as a near duplicate."},
+    )
+
+    compress_branch_results: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether web_research compresses each search result to its most query-relevant sentences before returning it."
+        },
+    )
+
+    compress_target_chars: int = Field(
+        default=2000,
+        metadata={"description": "The target size in characters of each compressed web_research result."},
+    )
+
+    synthesis_token_threshold: int = Field(
+        default=24000,
+        metadata={
+            "description": "The summary size (approximate tokens) above which finalize_answer drafts sections in parallel before merging (0 to disable)."
+        },
+    )
+
+    synthesis_group_tokens: int = Field(
+        default=6000,
+        metadata={"description": "The approximate token size of each summary group drafted into one section."},
+    )
+
+    synthesis_draft_model: str = Field(
+        default="deepseek-chat",
+        metadata={"description": "The fast model used to draft partial sections in map-reduce synthesis."},
+    )
+
+    synthesis_max_workers: int = Field(
+        default=4,
+        metadata={"description": "The number of sections drafted concurrently in map-reduce synthesis."},
+    )
+
+    answer_cache: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to answer repeated questions with the same effort settings from the run-level answer cache."
+        },
+    )
+
+    answer_cache_ttl_hours: float = Field(
+        default=24,
+        metadata={"description": "How long (in hours) a cached answer is returned as fresh."},
+    )
+
+    answer_cache_stale_while_revalidate: bool = Field(
+        default=True,
+        metadata={
+            "description": "Whether to return an expired cached answer immediately and refresh it in the background."
+        },
+    )
+
+    answer_cache_max_stale_hours: float = Field(
+        default=168,
+        metadata={"description": "The maximum age (in hours) of a cached answer served while revalidating."},
+    )
+
+    answer_cache_refresh: bool = Field(
+        default=False,
+        metadata={"description": "Internal: set on background refresh runs to bypass the cache lookup."},
+    )
+
+    distributed_web_research: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether web_research branches run on the worker process pool (see agent.worker_pool) instead of in the graph process."
+        },
+    )
+
+    web_research_queue_timeout: float = Field(
+        default=600,
+        metadata={"description": "How long (in seconds) web_research waits for a worker to finish its branch."},
+    )
+
+    profile_run: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to sample this run's node call stacks and save them as collapsed-stack and speedscope files (see agent.profiling)."
+        },
+    )
+
+    web_research_max_rounds: int = Field(
+        default=2,
+        metadata={"description": "The maximum number of tool-calling rounds (LLM turns) in one web_research branch."},
+    )
+
+    web_research_planning: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether the web_research model plans all of a branch's tool calls in one turn, so the branch ends as soon as those tools finish instead of asking the model again."
+        },
+    )
+
+    deterministic_tool_routing: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether web_research maps obvious queries to tool calls locally (see agent.tool_router) and only asks the LLM to choose tools when unsure."
+        },
+    )
+
+    straggler_quorum: int = Field(
+        default=0,
+        metadata={
+            "description": "Number of finished web_research branches in a loop after which the remaining ones get straggler_grace_seconds before reflection proceeds without them. 0 disables."
+        },
+    )
+
+    straggler_fraction: float = Field(
+        default=0,
+        metadata={
+            "description": "Fraction (0-1) of a loop's web_research branches that must finish before the remaining ones get straggler_grace_seconds. 0 disables."
+        },
+    )
+
+    straggler_timeout_seconds: float = Field(
+        default=0,
+        metadata={
+            "description": "Seconds after a loop was dispatched when its unfinished web_research branches are cut off. 0 disables."
+        },
+    )
+
+    straggler_grace_seconds: float = Field(
+        default=2.0,
+        metadata={"description": "Seconds the remaining branches of a loop get once the straggler quorum is reached."},
+    )
+
+    straggler_action: str = Field(
+        default="fold",
+        metadata={
+            "description": "What happens to a cut-off branch: 'fold' merges its result into the next reflection or finalize_answer, 'cancel' stops it and discards the result."
+        },
+    )
+
+    memory_tracking: bool = Field(
+        default=False,
+        metadata={
+            "description": "Whether to record this run's state field sizes and per-node tracemalloc peaks (see agent.memory_guard)."
+        },
+    )
+
+    memory_soft_limit_mb: float = Field(
+        default=0,
+        metadata={
+            "description": "Run state size (in MB) above which the largest result fields are offloaded, compressed or truncated before reflection. 0 disables the soft limit."
+        },
+    )
+
+    memory_hard_limit_mb: float = Field(
+        default=0,
+        metadata={
+            "description": "Size (in MB) of the run state plus the node's working data (tool messages and results, checked via check_node_memory) above which the run fails with MemoryLimitExceeded. tracemalloc growth is only reported, never enforced. 0 disables the hard limit."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
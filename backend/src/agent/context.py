@@ -0,0 +1,140 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   增量式对话上下文构建器
+   get_research_topic 以前每次调用都遍历整个 messages 并用 += 拼接字符串，
+   多轮对话中早期的完整报告会让每个提示词都膨胀。
+   👇主要逻辑：
+      1.每条消息只渲染一次（完整版 + 压缩版），按线程缓存，后续轮次只处理新消息；
+      2.最近一条助手回答保留全文，更早的助手报告只保留标题和每段首句；
+      3.超过 token 预算时从最早的轮次开始丢弃，始终保留最新的用户问题；
+      4.同一份消息列表的结果整体缓存，一次运行内多个节点调用只计算一次。
+'''
+
+_CJK_RE = re.compile(r"[一-鿿　-〿＀-￯]")
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？.!?])\s*")
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the token count: one per CJK character, one per four other characters."""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4
+
+
+def compress_report(text: str, max_chars: int = 600) -> str:
+    """Compress an earlier assistant report to its headings and the first sentence of each paragraph."""
+    if len(text) <= max_chars:
+        return text
+    kept, size = [], 0
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if paragraph.startswith("#"):
+            line = paragraph.splitlines()[0]
+        elif paragraph.startswith("|"):
+            # 表格只保留表头
+            line = paragraph.splitlines()[0] + " ..."
+        else:
+            line = _SENTENCE_END_RE.split(paragraph, maxsplit=1)[0]
+        if size + len(line) > max_chars:
+            break
+        kept.append(line)
+        size += len(line)
+    return "\n".join(kept) + "\n[...earlier report compressed...]"
+
+
+class _ThreadContext:
+    def __init__(self):
+        self.message_ids: List[str] = []
+        self.full: List[str] = []
+        self.compressed: List[str] = []
+        self.is_assistant: List[bool] = []
+        self.signature: Optional[tuple] = None
+        self.topic: str = ""
+
+
+class ConversationContextBuilder:
+    """Build the research-topic context of a conversation incrementally, memoized per thread.
+
+    Args:
+        max_threads: Number of threads whose rendered messages are kept in memory.
+    """
+
+    def __init__(self, max_threads: int = 1024):
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, _ThreadContext]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_thread(self, thread_key: str) -> _ThreadContext:
+        ctx = self._threads.get(thread_key)
+        if ctx is None:
+            ctx = self._threads[thread_key] = _ThreadContext()
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        self._threads.move_to_end(thread_key)
+        return ctx
+
+    def build(self, messages: List[AnyMessage], thread_key: str, token_budget: int) -> tuple:
+        """Return ``(research_topic, computed)``; ``computed`` is False on a cache hit."""
+        ids = [message.id or str(i) for i, message in enumerate(messages)]
+        signature = (tuple(ids), token_budget)
+        with self._lock:
+            ctx = self._get_thread(thread_key)
+            if ctx.signature == signature:
+                return ctx.topic, False
+
+            # 只有已处理的前缀不变时才增量处理，否则（如消息被编辑）重新渲染
+            if ids[: len(ctx.message_ids)] != ctx.message_ids:
+                ctx.__init__()
+            for message, message_id in zip(messages[len(ctx.message_ids) :], ids[len(ctx.message_ids) :]):
+                ctx.message_ids.append(message_id)
+                if isinstance(message, HumanMessage):
+                    rendered = f"User: {message.content}\n"
+                    ctx.full.append(rendered)
+                    ctx.compressed.append(rendered)
+                    ctx.is_assistant.append(False)
+                elif isinstance(message, AIMessage):
+                    ctx.full.append(f"Assistant: {message.content}\n")
+                    ctx.compressed.append(f"Assistant: {compress_report(str(message.content))}\n")
+                    ctx.is_assistant.append(True)
+                else:
+                    ctx.full.append("")
+                    ctx.compressed.append("")
+                    ctx.is_assistant.append(False)
+
+            ctx.topic = self._assemble(ctx, token_budget)
+            ctx.signature = signature
+            return ctx.topic, True
+
+    @staticmethod
+    def _assemble(ctx: _ThreadContext, token_budget: int) -> str:
+        last_assistant = max(
+            (i for i, is_assistant in enumerate(ctx.is_assistant) if is_assistant), default=-1
+        )
+        # 从最新的消息往前累加，超出预算即停止；最新一条消息始终保留。
+        # 最近一条助手回答优先用全文，放不下时退回压缩版。
+        kept, used = [], 0
+        for i in reversed(range(len(ctx.full))):
+            part = ctx.full[i] if i >= last_assistant else ctx.compressed[i]
+            if kept and used + estimate_tokens(part) > token_budget:
+                part = ctx.compressed[i]
+            cost = estimate_tokens(part)
+            if kept and used + cost > token_budget:
+                kept.append("[...earlier conversation omitted...]\n")
+                break
+            kept.append(part)
+            used += cost
+        return "".join(reversed(kept))
+
+
+conversation_context = ConversationContextBuilder()
@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   CPU 密集后处理卸载到进程池
+   引用拼装、搜索结果格式化与重排、结果压缩、短链接替换都在驱动图的进程里同步执行，
+   并发运行多时这些步骤持有 GIL，拖慢事件循环（流式推送、其他运行的 I/O）。
+   👇主要逻辑：
+      1.调用方估算载荷大小（字符数），小于 CPU_OFFLOAD_MIN_CHARS 时直接在当前线程执行，没有额外开销；
+      2.超过阈值时提交到共享的进程池：只传纯 str/list/dict 参数和模块级函数，避免传模型对象以减少 pickle 开销；
+        唯一例外是 Gemini grounding 解析（utils.parse_grounding），它直接传 google-genai 的 pydantic 响应；
+      3.同步节点在线程里阻塞等待结果（等待期间释放 GIL），异步节点 await run_in_executor；
+      4.进程池用 forkserver 启动并预加载 agent 模块，避免从多线程的服务进程里 fork；
+        进程池崩溃时重建，并退回当前线程执行；
+      5.统计卸载次数、本地执行次数与卸载耗时。
+   相关环境变量：CPU_OFFLOAD_WORKERS（进程数，0 关闭卸载，默认 min(4, CPU 核数)）、CPU_OFFLOAD_MIN_CHARS（默认65536）、
+   CPU_OFFLOAD_START_METHOD（默认 forkserver）。
+'''
+
+CPU_OFFLOAD_MIN_CHARS = int(os.getenv("CPU_OFFLOAD_MIN_CHARS", "65536"))
+CPU_OFFLOAD_WORKERS = int(os.getenv("CPU_OFFLOAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_PRELOAD_MODULES = ["agent.utils", "agent.ranking", "agent.rerank", "agent.tools_and_schemas"]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"inline": 0, "offloaded": 0, "fallbacks": 0, "offload_seconds": 0.0}
+
+
+def payload_size(*values: Any) -> int:
+    """Estimate the size of plain str/list/dict arguments in characters."""
+    size = 0
+    stack = list(values)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        else:
+            size += 8
+    return size
+
+
+def get_cpu_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the shared process pool, or None when offloading is disabled."""
+    global _pool
+    if CPU_OFFLOAD_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            method = os.getenv("CPU_OFFLOAD_START_METHOD", "forkserver")
+            context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                context.set_forkserver_preload(_PRELOAD_MODULES)
+            _pool = ProcessPoolExecutor(max_workers=CPU_OFFLOAD_WORKERS, mp_context=context)
+            logger.info(f"🧮CPU卸载|进程池已启动,workers={CPU_OFFLOAD_WORKERS},start_method={method}")
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _count(name: str, seconds: float = 0.0) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+        _stats["offload_seconds"] += seconds
+
+
+def _should_offload(size: int, min_chars: Optional[int]) -> Optional[ProcessPoolExecutor]:
+    threshold = CPU_OFFLOAD_MIN_CHARS if min_chars is None else min_chars
+    if size < threshold:
+        return None
+    return get_cpu_pool()
+
+
+def run_cpu_task(fn: Callable, *args, size: int, min_chars: Optional[int] = None) -> Any:
+    """Run ``fn(*args)``, in the process pool when ``size`` reaches the threshold.
+
+    ``fn`` must be a module-level function and ``args`` plain picklable data.
+    """
+    pool = _should_offload(size, min_chars)
+    if pool is None:
+        _count("inline")
+        return fn(*args)
+    start = time.perf_counter()
+    try:
+        result = pool.submit(fn, *args).result()
+    except BrokenProcessPool as e:
+        logger.info(f"🧮CPU卸载|进程池异常，改为本地执行:{e}")
+        _reset_pool(pool)
+        _count("fallbacks")
+        return fn(*args)
+    _count("offloaded", time.perf_counter() - start)
+    return result
+
+
+async def arun_cpu_task(fn: Callable, *args, size: int, min_chars: Optional[int] = None) -> Any:
+    """Async variant of :func:`run_cpu_task`; awaits the process pool without blocking the loop."""
+    pool = _should_offload(size, min_chars)
+    if pool is None:
+        _count("inline")
+        return fn(*args)
+    start = time.perf_counter()
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool as e:
+        logger.info(f"🧮CPU卸载|进程池异常，改为本地执行:{e}")
+        _reset_pool(pool)
+        _count("fallbacks")
+        return fn(*args)
+    _count("offloaded", time.perf_counter() - start)
+    return result
+
+
+def cpu_offload_stats() -> dict:
+    """Return process-wide counters of inline and offloaded CPU tasks."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_offload_ms"] = stats["offload_seconds"] / stats["offloaded"] * 1000 if stats["offloaded"] else 0.0
+    return stats
@@ -0,0 +1,200 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   药物/靶点/企业/疾病实体归一化索引
+   临床工具的 target、drug、company、disease 直接取自模型输出，"PD-1"、"PD1"、"PDCD1"、"programmed death-1"
+   会变成不同的接口请求和不同的缓存键。
+   👇主要逻辑：
+      1.从同义词词典（默认 agent/data/entity_synonyms.json，ENTITY_SYNONYMS_PATH 可覆盖）加载
+        {类别: {规范名: [别名...]}}；
+      2.归一化：NFKC（全角转半角）、小写、统一各种连字符，再去掉空格/连字符/点等分隔符得到紧凑键，
+        "PD-1"、"pd 1"、"PD1" 的紧凑键相同；
+      3.精确查找用哈希表（类别, 紧凑键）→规范名，canonicalize 在工具参数分派前把已知别名替换为规范名，
+        未知取值原样保留；
+      4.自由文本用字符前缀树做最长匹配（匹配时跳过分隔符，英文别名要求词边界），
+        供 get_clinical_results 的 keywords 和工具路由识别实体；
+      5.统计查找次数与改写次数，便于观察归一化带来的缓存命中提升。
+'''
+
+DEFAULT_SYNONYMS_PATH = Path(__file__).resolve().parent / "data" / "entity_synonyms.json"
+ENTITY_CATEGORIES = ("target", "drug", "company", "disease")
+# 过短的英文别名（如 "MM"、"AZ"）只用于字段精确查找，不在自由文本里匹配
+MIN_TEXT_ALIAS_CHARS = 3
+
+_SEPARATORS = set(" -_.,'’/·")
+_DASHES_RE = re.compile(r"[‐-―−－]")
+
+
+def normalize_entity(value: str) -> str:
+    """Return the lowercase NFKC form of ``value`` with unified dashes and collapsed spaces."""
+    value = unicodedata.normalize("NFKC", str(value))
+    value = _DASHES_RE.sub("-", value).lower()
+    return " ".join(value.split())
+
+
+def compact_key(value: str) -> str:
+    """Return the lookup key of ``value``: its normalized form without separators."""
+    return "".join(ch for ch in normalize_entity(value) if ch not in _SEPARATORS)
+
+
+def _normalize_chars(text: str) -> str:
+    # 逐字符归一化，长度与原文一致，文本匹配的偏移可以直接用于原文
+    chars = []
+    for ch in text:
+        folded = _DASHES_RE.sub("-", unicodedata.normalize("NFKC", ch)).lower()
+        chars.append(folded if len(folded) == 1 else ch)
+    return "".join(chars)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class EntityIndex:
+    """Synonym index of clinical entities with hash lookup and trie text matching.
+
+    Args:
+        synonyms: ``{category: {canonical name: [aliases...]}}``.
+    """
+
+    def __init__(self, synonyms: Dict[str, Dict[str, List[str]]]):
+        self._exact: Dict[Tuple[str, str], str] = {}
+        self._trie: dict = {}
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "rewrites": 0}
+        for category, entries in synonyms.items():
+            for canonical, aliases in entries.items():
+                for alias in [canonical, *aliases]:
+                    key = compact_key(alias)
+                    if not key:
+                        continue
+                    self._exact.setdefault((category, key), canonical)
+                    if len(key) >= MIN_TEXT_ALIAS_CHARS or not key.isascii():
+                        node = self._trie
+                        for ch in key:
+                            node = node.setdefault(ch, {})
+                        node.setdefault("", (category, canonical))
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def _count(self, rewritten: bool) -> None:
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats["rewrites"] += int(rewritten)
+
+    def lookup(self, category: str, value: str) -> Optional[str]:
+        """Return the canonical name of ``value`` in ``category``, or None when unknown."""
+        return self._exact.get((category, compact_key(value)))
+
+    def canonicalize(self, category: str, value: Optional[str]) -> Optional[str]:
+        """Return the canonical name of ``value``, or ``value`` unchanged when it is not in the index."""
+        if not value or not isinstance(value, str):
+            return value
+        canonical = self.lookup(category, value)
+        self._count(canonical is not None and canonical != value)
+        return canonical or value
+
+    def canonicalize_args(self, args: dict) -> dict:
+        """Canonicalize the ``target``/``drug``/``company``/``disease`` values of tool arguments."""
+        return {
+            key: self.canonicalize(key, value) if key in ENTITY_CATEGORIES else value
+            for key, value in args.items()
+        }
+
+    def find(self, text: str) -> List[Tuple[str, str, int, int]]:
+        """Return ``(category, canonical, start, end)`` of the longest entity mentions in ``text``."""
+        text = _normalize_chars(text)
+        matches = []
+        i = 0
+        while i < len(text):
+            starts_inside_word = i > 0 and _is_word_char(text[i]) and _is_word_char(text[i - 1])
+            if text[i] in _SEPARATORS or text[i].isspace() or starts_inside_word:
+                i += 1
+                continue
+            node, j, best = self._trie, i, None
+            while j < len(text) and node:
+                ch = text[j]
+                if ch in _SEPARATORS or ch.isspace():
+                    j += 1
+                    continue
+                node = node.get(ch)
+                if node is None:
+                    break
+                j += 1
+                ends_inside_word = j < len(text) and _is_word_char(text[j]) and _is_word_char(text[j - 1])
+                if "" in node and not ends_inside_word:
+                    best = (*node[""], i, j)
+            if best is None:
+                i += 1
+                continue
+            matches.append(best)
+            i = best[3]
+        return matches
+
+    def canonicalize_text(self, text: str) -> str:
+        """Replace the entity mentions in free text with their canonical names."""
+        if not text or not isinstance(text, str):
+            return text
+        matches = self.find(text)
+        if not matches:
+            self._count(False)
+            return text
+        parts, last = [], 0
+        for _, canonical, start, end in matches:
+            parts.append(text[last:start])
+            # 中文里的别名换成英文规范名时补空格，避免和前后文字粘连
+            pad = canonical.isascii()
+            before = " " if pad and parts[-1][-1:].isalnum() else ""
+            after = " " if pad and text[end : end + 1].isalnum() else ""
+            parts.append(f"{before}{canonical}{after}")
+            last = end
+        parts.append(text[last:])
+        result = "".join(parts)
+        self._count(result != text)
+        return result
+
+    def stats(self) -> dict:
+        """Return process-wide lookup and rewrite counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["rewrite_rate"] = stats["rewrites"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+@lru_cache(maxsize=1)
+def get_entity_index() -> EntityIndex:
+    """Return the shared entity index loaded from ``ENTITY_SYNONYMS_PATH``."""
+    path = Path(os.getenv("ENTITY_SYNONYMS_PATH", str(DEFAULT_SYNONYMS_PATH)))
+    try:
+        synonyms = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.info(f"🏷️实体归一化|同义词词典加载失败，不做归一化:{path}:{e}")
+        synonyms = {}
+    index = EntityIndex(synonyms)
+    logger.info(f"🏷️实体归一化|已加载{len(index)}个别名:{path}")
+    return index
+
+
+def canonicalize_tool_args(tool_name: str, tool_args):
+    """Canonicalize the entity arguments of a clinical tool call before dispatch."""
+    index = get_entity_index()
+    if isinstance(tool_args, dict):
+        args = index.canonicalize_args(tool_args)
+        if tool_name == "get_clinical_results" and isinstance(args.get("keywords"), str):
+            args["keywords"] = index.canonicalize_text(args["keywords"])
+        return args
+    if tool_name == "get_clinical_results" and isinstance(tool_args, str):
+        return index.canonicalize_text(tool_args)
+    return tool_args
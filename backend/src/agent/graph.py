@@ -6,14 +6,18 @@ from langgraph.types import Send
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
 from langchain_core.runnables import RunnableConfig
-from langchain_deepseek import ChatDeepSeek
 from google import genai
+import functools
+from concurrent.futures import Future
 import re
+from typing import Optional
 import json
+import time
 #原生的googlesdk，支持直接调用"tools"例如google搜索。
 from google.genai import Client
 from agent.state import (
     OverallState,
+    add_counts,
     QueryGenerationState,
     ReflectionState,
     WebSearchState,
@@ -25,19 +29,55 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from agent.logger import get_logger
 from agent.prompts import (
     get_current_date,
-    query_writer_instructions_deepseek,
-    web_searcher_instructions_hybrid_deepseek,
-    reflection_instructions_deepseek,
-    answer_instructions_deepseek
+    query_writer_prefix_deepseek,
+    query_writer_suffix_deepseek,
+    web_searcher_prefix_hybrid_deepseek,
+    web_searcher_planning_prefix_deepseek,
+    web_searcher_suffix_hybrid_deepseek,
+    reflection_prefix_deepseek,
+    reflection_suffix_deepseek,
+    answer_prefix_deepseek,
+    answer_suffix_deepseek,
+    speculative_query_prefix_deepseek,
+    speculative_query_suffix_deepseek,
 )
+from agent.prompt_layout import build_prompt, prompt_cache_stats
 
 from langchain_openai import ChatOpenAI
 from agent.utils import (
     get_citations,
+    get_latest_question,
     get_research_topic,
+    get_run_key,
     insert_citation_markers,
+    link_sources,
+    new_run_id,
     resolve_urls,
 )
+from agent.speculative import get_prefetcher, release_prefetcher
+from agent.clients import get_deepseek_llm
+from agent.blobstore import hydrate_sources, hydrate_texts, offload_sources, offload_texts
+from agent.budget import RunBudget, sum_usage, usage_from_message
+from agent.progress import count_sources, emit_progress, top_labels
+from agent.synthesis import reduce_summaries
+from agent.answer_cache import answer_cache_key, get_answer_cache
+from agent.json_repair import invoke_structured, repair_stats
+from agent.ranking import compress_results
+from agent.rerank import rerank_settings
+from agent.cpu_offload import cpu_offload_stats, payload_size, run_cpu_task
+from agent.research_memory import get_research_memory, recall_for_queries, remember_research
+from agent.worker_pool import dispatch_branch
+from agent.profiling import profile_node
+from agent.memory_guard import check_node_memory, track_memory
+from agent.entities import canonicalize_tool_args, get_entity_index
+from agent.tool_router import route_branch, router_stats
+from agent.stragglers import (
+    branch_cancelled,
+    fold_late_branches,
+    release_loop_cutoffs,
+    run_with_cutoff,
+    straggler_cutoff_enabled,
+)
 
 logger=get_logger(__name__)
 
@@ -50,14 +90,7 @@ if os.getenv("GEMINI_API_KEY") is None:
 genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
 gemini_baseurl="https://generativelanguage.googleapis.com/v1beta/openai/"
 
-deepseek_baseurl="https://api.deepseek.com/v1"
-
 
-def extract_json(text):
-    if '```json' not in text:
-        return text
-    text = text.split('```json')[1].split('```')[0].strip()
-    return text
 
 def extract_answer(text):
     if '</think>' in text:
@@ -102,69 +135,231 @@ def get_tools(response):
             tools = []  
     return tools
 
+def charge_responses(node: str, responses: list, model: str) -> tuple:
+    """Return the budget charge and prompt-cache counts of a node's raw model responses."""
+    usage = sum_usage(*(usage_from_message(response, model) for response in responses))
+    prompt_cache = {"cached_tokens": 0, "uncached_tokens": 0}
+    for response in responses:
+        for key, value in prompt_cache_stats.record(node, response).items():
+            prompt_cache[key] += value
+    return usage, prompt_cache
+
+
+def run_answer_cache_key(state: OverallState, config: RunnableConfig, configurable: Configuration) -> str:
+    """Return the answer cache key of this run: research topic plus effort settings."""
+    query_count = state.get("initial_search_query_count") or configurable.number_of_initial_queries
+    max_loops = state.get("max_research_loops") or configurable.max_research_loops
+    research_topic = get_research_topic(state["messages"], "answer_cache", config)
+    return answer_cache_key(research_topic, query_count, max_loops, "deepseek-chat")
+
+
+def refresh_cached_answer(state: OverallState, config: RunnableConfig) -> None:
+    """Re-run the whole graph for a stale cached answer; finalize_answer stores the new one."""
+    configurable = {
+        key: value
+        for key, value in (config or {}).get("configurable", {}).items()
+        if not key.startswith("__") and key not in ("thread_id", "checkpoint_id", "checkpoint_ns", "run_id")
+    }
+    graph.invoke(
+        {
+            "messages": state["messages"],
+            "initial_search_query_count": state.get("initial_search_query_count"),
+            "max_research_loops": state.get("max_research_loops"),
+        },
+        {"configurable": {**configurable, "answer_cache_refresh": True}},
+    )
+
+
+def check_answer_cache(state: OverallState, config: RunnableConfig) -> OverallState:
+    started_at = time.perf_counter()
+    configurable = Configuration.from_runnable_config(config)
+    if not configurable.answer_cache or configurable.answer_cache_refresh:
+        return {"answer_cache_hit": False}
+
+    cache = get_answer_cache()
+    key = run_answer_cache_key(state, config, configurable)
+    ttl_seconds = configurable.answer_cache_ttl_hours * 3600
+    max_stale_seconds = (
+        configurable.answer_cache_max_stale_hours * 3600
+        if configurable.answer_cache_stale_while_revalidate
+        else ttl_seconds
+    )
+    entry = cache.lookup(key, ttl_seconds, max_stale_seconds)
+    stats = cache.stats()
+    if entry is None:
+        logger.info(f"📦答案缓存|未命中,hit_rate={stats['hit_rate']:.2%}")
+        emit_progress("answer_cache", started_at, loop=0, hit=False)
+        return {"answer_cache_hit": False}
+
+    if entry["stale"]:
+        # 先返回旧报告，后台重新研究并刷新缓存
+        cache.revalidate(key, lambda: refresh_cached_answer(state, config))
+    logger.info(
+        f"📦答案缓存|{'过期命中，后台刷新' if entry['stale'] else '命中'},"
+        f"age={entry['age'] / 3600:.1f}h,hit_rate={stats['hit_rate']:.2%}"
+    )
+    emit_progress(
+        "answer_cache",
+        started_at,
+        loop=0,
+        hit=True,
+        stale=entry["stale"],
+        age_seconds=int(entry["age"]),
+        source_count=len(entry["sources"]),
+    )
+    return {
+        "messages": [AIMessage(content=entry["content"])],
+        "sources_gathered": entry["sources"],
+        "answer_cache_hit": True,
+    }
+
+
+def route_answer_cache(state: OverallState):
+    return END if state.get("answer_cache_hit") else "generate_query"
+
+
 def generate_query(state: OverallState, config: RunnableConfig) -> OverallState:
+    started_at = time.perf_counter()
+    run_started_at = time.time()
     configurable = Configuration.from_runnable_config(config)
     if state.get("initial_search_query_count") is None:
         state["initial_search_query_count"] = configurable.number_of_initial_queries
 
-    formatted_prompt = query_writer_instructions_deepseek.format(
+    formatted_prompt = build_prompt(
+        query_writer_prefix_deepseek,
+        query_writer_suffix_deepseek,
         current_date=get_current_date(),
-        research_topic=get_research_topic(state["messages"],"generate_query"),
+        research_topic=get_research_topic(state["messages"], "generate_query", config),
         number_queries=state["initial_search_query_count"],
     )
-    llm=ChatDeepSeek(model="deepseek-chat",
-                   temperature=1,
-                   max_retries=2,
-                   api_key=os.getenv("DEEP_SEEK_KEY"),
-                   base_url=deepseek_baseurl
-                   )
-    structured_llm = llm.with_structured_output(SearchQueryList)
-    result=structured_llm.invoke(formatted_prompt)
-    return {"generated_query":result.query}
+    llm=get_deepseek_llm("deepseek-chat", temperature=1, max_retries=2)
+    # 本地修复JSON，失败时才用structured output重试
+    result, responses = invoke_structured(llm, formatted_prompt, SearchQueryList, "generate_query")
+    usage, prompt_cache = charge_responses("generate_query", responses, "deepseek-chat")
+    budget = {"run_started_at": run_started_at, **usage}
+    # 开启掉队分支截止时重置本次运行的计数
+    extra = {"stragglers": {"run_started_at": run_started_at}} if straggler_cutoff_enabled(configurable) else {}
+    if not configurable.research_memory:
+        emit_progress("generate_query", started_at, loop=0, queries=result.query, **prompt_cache)
+        return {"generated_query":result.query, "budget": budget, **extra}
+
+    recalled = recall_for_queries(
+        get_research_memory(),
+        result.query,
+        max_age_seconds=configurable.research_memory_ttl_hours * 3600,
+        min_score=configurable.research_memory_min_score,
+        min_chunks=configurable.research_memory_min_chunks,
+    )
+    texts, sources = recalled["texts"], recalled["sources"]
+    if configurable.offload_state_payloads:
+        texts = offload_texts(texts, configurable.offload_min_bytes)
+        sources = offload_sources(sources, configurable.offload_min_bytes)
+    emit_progress(
+        "generate_query",
+        started_at,
+        loop=0,
+        queries=recalled["queries"],
+        recalled_queries=recalled["covered"],
+        **prompt_cache,
+    )
+    return {
+        "generated_query": recalled["queries"],
+        "search_query": recalled["covered"],
+        "web_research_result": texts,
+        "sources_gathered": sources,
+        "budget": budget,
+        **extra,
+    }
 
 def continue_to_web_research(state: OverallState):
+    # 所有查询都已被研究记忆覆盖时，直接进入反思
+    if not state["generated_query"]:
+        logger.info("🧠研究记忆|所有查询均已覆盖，跳过web_research")
+        return "reflection"
+
     for idx, query in enumerate(state["generated_query"]):
         logger.info(f"🔧continue_to_web_research|📄任务 {idx}: generated_query='{query}'")
 
+    loop_started_at = time.time()
     send_tasks=[
-            Send("web_research", {"search_query": search_query, "id": int(idx)})
+            Send("web_research", {
+                "search_query": search_query,
+                "id": int(idx),
+                "research_loop_count": 0,
+                "research_topic": get_latest_question(state["messages"]),
+                "budget": state.get("budget", {}),
+                "loop_branches": len(state["generated_query"]),
+                "loop_started_at": loop_started_at,
+                "run_id": state.get("run_id"),
+            })
             for idx, search_query in enumerate(state["generated_query"])
     ]
     return send_tasks
 
 
-def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+def run_web_research_branch(state: WebSearchState, config: RunnableConfig) -> tuple:
+    """Run one web_research branch; return the state update and its progress fields.
 
+    Called in-process by the web_research node, or by a worker process of
+    the distributed worker pool (see agent.worker_pool).
+    """
     configurable = Configuration.from_runnable_config(config)
     id=state["id"]
-    formatted_prompt = web_searcher_instructions_hybrid_deepseek.format(
+    llm=get_deepseek_llm("deepseek-chat", temperature=0, max_retries=2)
+    # 静态指令在前、查询在后，多轮工具调用只在末尾追加消息
+    messages = build_prompt(
+        web_searcher_planning_prefix_deepseek if configurable.web_research_planning else web_searcher_prefix_hybrid_deepseek,
+        web_searcher_suffix_hybrid_deepseek,
         current_date=get_current_date(),
         research_topic=state["search_query"],
     )
-    llm=ChatDeepSeek(model="deepseek-chat",
-                   temperature=0,
-                   max_retries=2,
-                   api_key=os.getenv("DEEP_SEEK_KEY"),
-                   base_url=deepseek_baseurl  
-                   )
-    messages=[HumanMessage(content=formatted_prompt)]
     web_research_result = []
 
     tools = {"web_search": web_search, "get_clinical_results": get_clinical_results}
+    budget = RunBudget(configurable, state.get("budget"))
+    usage = {"tokens": 0, "cost": 0.0}
+    prompt_cache = {"cached_tokens": 0, "uncached_tokens": 0}
+    prefetcher = (
+        get_prefetcher(get_run_key(config, state))
+        if configurable.speculative_prefetch
+        else None
+    )
 
-    max_loops=2
+    max_loops=configurable.web_research_max_rounds
     loop_count=0
     while loop_count<max_loops:
             loop_count+=1
+            # 被截止并取消的掉队分支不再发起新的调用
+            if branch_cancelled():
+                logger.info(f"任务{id}|⏱️掉队分支已取消，停止后续工具轮次")
+                break
+            # 预算紧张时只做一轮工具调用
+            if loop_count > 1 and budget.degraded:
+                logger.info(f"任务{id}|💰预算不足({budget.describe()})，跳过后续工具轮次")
+                break
 
-            response=llm.bind_tools([web_search, get_clinical_results]).invoke(messages)
-            response = response.model_dump_json(indent=4, exclude_none=True)
-            response = json.loads(response)
-            logger.info(f"任务{id}|get_tools前|llm返回:{extract_answer(response['content'])}")
-            extract_tools=get_tools(response)
+            # 第一轮先尝试确定性路由，命中时省掉一次选工具的LLM调用
+            routed = (
+                route_branch(state["search_query"], id)
+                if loop_count == 1 and configurable.deterministic_tool_routing
+                else None
+            )
+            if routed:
+                extract_tools = routed
+            else:
+                response=llm.bind_tools([web_search, get_clinical_results]).invoke(messages)
+                usage = sum_usage(usage, usage_from_message(response, "deepseek-chat"))
+                for key, value in prompt_cache_stats.record("web_research", response).items():
+                    prompt_cache[key] += value
+                # 直接转成JSON兼容的dict，不再序列化成字符串再解析回来
+                response = response.model_dump(mode="json", exclude_none=True)
+                logger.info(f"任务{id}|get_tools前|llm返回:{extract_answer(response['content'])}")
+                extract_tools=get_tools(response)
             logger.info(f"任务{id}|get_tools提取|llm返回工具:{tools}") 
             if extract_tools:
                 for tool in extract_tools:
+                    if branch_cancelled():
+                        break
                     if isinstance(tool, str):
                         try:
                             tool = json.loads(tool)  
@@ -181,12 +376,36 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
                     except Exception as e:
                         messages += [HumanMessage(content=f"{tool}工具调用格式错误:{e}")]
                         break
+                    if tool_name != "web_search":
+                        # 临床工具的实体参数归一化，同一实体的不同写法共用缓存和在途请求
+                        tool_args = canonicalize_tool_args(tool_name, tool_args)
                     logger.info(f"任务{id}|调用工具{tool_name},参数{tool_args}")
                     logger.info(f"***************")
-                    tool_result = tools[tool_name].invoke(tool_args)
+                    tool_result = None
+                    if prefetcher is not None and tool_name == "web_search":
+                        tool_query = tool_args.get("query", "") if isinstance(tool_args, dict) else str(tool_args)
+                        tool_result = prefetcher.take(tool_query, state.get("research_loop_count", 0))
+                    if tool_result is None:
+                        if tool_name == "web_search" and isinstance(tool_args, dict):
+                            # 研究主题和重排设置用于对搜索命中重排，不暴露给模型
+                            tool_result = web_search.invoke(
+                                {
+                                    **tool_args,
+                                    "research_topic": state.get("research_topic", ""),
+                                    "rerank": rerank_settings(configurable),
+                                }
+                            )
+                        else:
+                            tool_result = tools[tool_name].invoke(tool_args)
                 
                     web_research_result.append(tool_result)
                     messages += [HumanMessage(content=f"tool_name:{tool_name},tool_args:{tool_args}\ntool_result:{web_research_result}")]
+                    # 工具消息历史增长过快时不必等到节点结束才失败
+                    check_node_memory(messages, web_research_result)
+                # 规划模式下工具调用已一次性给出，执行完即结束分支，省掉只返回"没有更多工具"的那次LLM调用
+                if configurable.web_research_planning:
+                    logger.info(f"任务{id}|🗺️规划模式|{len(extract_tools)}个工具调用已执行，结束分支")
+                    break
             else:
                 break
     
@@ -199,11 +418,71 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
         if "modified_text" in r:
             all_texts.append(r["modified_text"])
 
-    return {
+    # 按本分支的查询做抽取式压缩，保留标题和来源行
+    if configurable.compress_branch_results:
+        raw_chars = sum(len(text) for text in all_texts)
+        all_texts = run_cpu_task(
+            compress_results,
+            all_texts,
+            state["search_query"],
+            configurable.compress_target_chars,
+            size=raw_chars,
+        )
+        compressed_chars = sum(len(text) for text in all_texts)
+        logger.info(
+            f"任务{id}|🗜️结果压缩:{raw_chars}→{compressed_chars}字符"
+            f"({raw_chars / max(compressed_chars, 1):.1f}x)"
+        )
+
+    progress = {"source_count": len(all_sources), "labels": top_labels(all_sources), **prompt_cache}
+
+    # 大字段卸载到blob存储，checkpoint里只保留引用
+    if configurable.offload_state_payloads:
+        all_texts = offload_texts(all_texts, configurable.offload_min_bytes)
+        all_sources = offload_sources(all_sources, configurable.offload_min_bytes)
+
+    update = {
          "sources_gathered": all_sources,  
          "search_query": [state["search_query"]],
          "web_research_result": all_texts,
+         "budget": usage,
     }
+    return update, progress
+
+
+def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+    started_at = time.perf_counter()
+    configurable = Configuration.from_runnable_config(config)
+    # 分布式模式：分支在工作进程池中执行，这里只投递并等待结果
+    if configurable.distributed_web_research:
+        run_branch = functools.partial(dispatch_branch, state, config, configurable.web_research_queue_timeout)
+    else:
+        run_branch = functools.partial(run_web_research_branch, state, config)
+
+    # 掉队分支截止：本轮其他分支已完成或超时后不再等待，结果并入后续节点（见 agent.stragglers）
+    if straggler_cutoff_enabled(configurable):
+        outcome = run_with_cutoff(run_branch, get_run_key(config, state), state, configurable)
+        if outcome is None:
+            update = {
+                "search_query": [state["search_query"]],
+                "web_research_result": [],
+                "sources_gathered": [],
+                "stragglers": {"cut": 1},
+            }
+            progress = {"source_count": 0, "labels": [], "straggler": True}
+        else:
+            update, progress = outcome
+    else:
+        update, progress = run_branch()
+
+    emit_progress(
+        "web_research",
+        started_at,
+        loop=state.get("research_loop_count", 0),
+        query=state["search_query"],
+        **progress,
+    )
+    return update
 
 
 #反思当前研究的内容是否充分，并生成下一轮查询。
@@ -218,37 +497,127 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
       "follow_up_queries": ["pediatric TB treatment 2025", "TB vaccine trials"]
    }
 '''
+def _speculative_search(query: str, research_topic: str = "", rerank: Optional[dict] = None) -> dict:
+    # 与 web_research 里的真实调用参数一致，命中的预取结果才与实时搜索相同
+    return web_search.invoke({"query": query, "research_topic": research_topic, "rerank": rerank})
+
+
+def predict_follow_up_queries(research_topic: str, ran_queries: list, number_queries: int) -> tuple:
+    """Predict likely follow-up queries with a short, summary-free prompt; also return its budget charge."""
+    formatted_prompt = build_prompt(
+        speculative_query_prefix_deepseek,
+        speculative_query_suffix_deepseek,
+        current_date=get_current_date(),
+        research_topic=research_topic,
+        number_queries=number_queries,
+        ran_queries="\n".join(f"- {q}" for q in ran_queries),
+    )
+    llm=get_deepseek_llm("deepseek-chat", temperature=0, max_retries=0)
+    result, responses = invoke_structured(llm, formatted_prompt, SearchQueryList, "speculative_prefetch")
+    usage, _ = charge_responses("speculative_prefetch", responses, "deepseek-chat")
+    return result.query[:number_queries], usage
+
+
+def start_speculative_prefetch(
+    state: OverallState, config: RunnableConfig, configurable: Configuration
+) -> Optional[Future]:
+    """Prefetch predicted follow-up searches in the background while reflection runs.
+
+    The returned future resolves to the budget charge of the prediction call once the
+    searches are queued, so reflection can add it to the run budget.
+    """
+    prefetcher = get_prefetcher(
+        get_run_key(config, state),
+        functools.partial(
+            _speculative_search,
+            research_topic=get_latest_question(state["messages"]),
+            rerank=rerank_settings(configurable),
+        ),
+        configurable.speculative_match_threshold,
+    )
+    loop = state["research_loop_count"]
+    wasted = prefetcher.discard_unused(loop)
+    if wasted:
+        logger.info(f"🔮推测预取|上一轮有{wasted}个预取未被使用，已丢弃")
+
+    max_research_loops = (
+        state.get("max_research_loops")
+        if state.get("max_research_loops") is not None
+        else configurable.max_research_loops
+    )
+    # 最后一轮之后不会再派发 follow-up，无需预取
+    if state["research_loop_count"] >= max_research_loops:
+        return None
+
+    research_topic = get_research_topic(state["messages"], "speculative_prefetch", config)
+    ran_queries = list(state["search_query"])
+
+    def predict_and_prefetch():
+        try:
+            queries, usage = predict_follow_up_queries(
+                research_topic, ran_queries, configurable.speculative_prefetch_count
+            )
+        except Exception as e:
+            logger.info(f"🔮推测预取|预测follow-up查询失败:{e}")
+            return {}
+        prefetcher.prefetch(queries, loop)
+        return usage
+
+    return prefetcher.submit(predict_and_prefetch)
+
+
 def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+    started_at = time.perf_counter()
     configurable = Configuration.from_runnable_config(config)
+    # 上一轮被截止的掉队分支已完成的，结果并入本轮反思
+    state, late = fold_late_branches(state, get_run_key(config, state))
     state["research_loop_count"] = state.get("research_loop_count", 0) + 1
 
-    current_date = get_current_date()
-    formatted_prompt = reflection_instructions_deepseek.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"],"reflection"),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
+    # 预算紧张时压缩上下文并改用更便宜的模型，也不再花钱做推测预取
+    budget = RunBudget(configurable, state.get("budget"))
+    model = configurable.budget_reflection_model if budget.degraded else "deepseek-chat"
+    if budget.degraded:
+        logger.info(f"💰预算不足({budget.describe()})，reflection降级为{model}并压缩上下文")
+    prediction = None
+    if configurable.speculative_prefetch and not budget.degraded:
+        prediction = start_speculative_prefetch(state, config, configurable)
+
+    formatted_prompt = build_prompt(
+        reflection_prefix_deepseek,
+        reflection_suffix_deepseek,
+        research_topic=get_research_topic(state["messages"], "reflection", config),
+        summaries="\n\n---\n\n".join(budget.pack_summaries(hydrate_texts(state["web_research_result"]))),
     )
      
-    llm=ChatDeepSeek(
-            model="deepseek-chat",
-            temperature=1,
-            max_retries=2,
-            api_key=os.getenv("DEEP_SEEK_KEY"),
-            base_url=deepseek_baseurl
-    )
-    result=llm.with_structured_output(Reflection).invoke(formatted_prompt)
+    llm=get_deepseek_llm(model, temperature=1, max_retries=2)
+    result, responses = invoke_structured(llm, formatted_prompt, Reflection, "reflection")
+    usage, prompt_cache = charge_responses("reflection", responses, model)
+    # 预测调用与反思并行，这里等它结束以便把开销计入预算
+    if prediction is not None:
+        usage = sum_usage(usage, prediction.result())
     logger.info(f"""🤔is_sufficient={result.is_sufficient},
                  knowledge_gap={result.knowledge_gap},
                  follow_up_queries={result.follow_up_queries},
-                 research_loop_count={state["research_loop_count"]},
-                 number_of_ran_queries={len(state["search_query"]),state["search_query"]}
+                 research_loop_count={state['research_loop_count']},
+                 number_of_ran_queries={len(state['search_query']),state['search_query']}
                 """)
+    emit_progress(
+        "reflection",
+        started_at,
+        loop=state["research_loop_count"],
+        is_sufficient=result.is_sufficient,
+        follow_up_count=len(result.follow_up_queries),
+        source_count=count_sources(state["sources_gathered"]),
+        **prompt_cache,
+    )
     return {
         "is_sufficient": result.is_sufficient,
         "knowledge_gap": result.knowledge_gap,
         "follow_up_queries": result.follow_up_queries,
         "research_loop_count": state["research_loop_count"],
         "number_of_ran_queries": len(state["search_query"]),
+        "budget": sum_usage(usage, late["budget"]) if late else usage,
+        **{key: value for key, value in late.items() if key != "budget"},
     }
 
 
@@ -260,72 +629,235 @@ def evaluate_research(state: ReflectionState,config: RunnableConfig,) -> Overall
         else configurable.max_research_loops
     )
 
-    logger.info(f"🔁research_loop_count={state["research_loop_count"]}")
+    budget = RunBudget(configurable, state.get("budget"))
+
+    logger.info(f"🔁research_loop_count={state['research_loop_count']}")
     if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:   
         return "finalize_answer"
+    elif budget.should_finalize():
+        logger.info(f"💰预算即将耗尽({budget.describe()})，提前进入finalize_answer")
+        return "finalize_answer"
     else:
-        logger.info(f"🔁发现{len(state["follow_up_queries"])}个新的follow-up查询。")
-        logger.info(f"🔁当前累计已运行查询数：{state["number_of_ran_queries"]}")
-        for idx,q in enumerate(state["follow_up_queries"]):
-            logger.info(f"🔁Follow-up #{idx}:'{q}'(id={state["number_of_ran_queries"]+idx})")
+        follow_up_queries = state["follow_up_queries"][: budget.follow_up_limit(len(state["follow_up_queries"]))]
+        logger.info(f"🔁发现{len(state['follow_up_queries'])}个新的follow-up查询，本轮派发{len(follow_up_queries)}个。")
+        logger.info(f"🔁当前累计已运行查询数：{state['number_of_ran_queries']}")
+        for idx,q in enumerate(follow_up_queries):
+            logger.info(f"🔁Follow-up #{idx}:'{q}'(id={state['number_of_ran_queries']+idx})")
 
+        loop_started_at = time.time()
         return [
             Send(
                 "web_research",
                 {
                     "search_query": follow_up_query,
                     "id": state["number_of_ran_queries"] + int(idx),
+                    "research_loop_count": state["research_loop_count"],
+                    "research_topic": get_latest_question(state["messages"]),
+                    "budget": state.get("budget", {}),
+                    "loop_branches": len(follow_up_queries),
+                    "loop_started_at": loop_started_at,
+                    "run_id": state.get("run_id"),
                 },
             )
-            for idx, follow_up_query in enumerate(state["follow_up_queries"])
+            for idx, follow_up_query in enumerate(follow_up_queries)
         ]
 
 '''
 合并所有研究结果，生成带引用的最终总结报告。
 '''
 def finalize_answer(state: OverallState, config: RunnableConfig):
+    started_at = time.perf_counter()
     configurable = Configuration.from_runnable_config(config)
+    # 仍在执行的掉队分支不再等待，已完成的结果并入最终回答
+    state, late = fold_late_branches(state, get_run_key(config, state), final=True)
+    release_loop_cutoffs(get_run_key(config, state))
+    web_research_result = hydrate_texts(state["web_research_result"])
+    sources_gathered = hydrate_sources(state["sources_gathered"])
+
+    budget = RunBudget(configurable, state.get("budget"))
+    research_topic = get_research_topic(state["messages"], "finalize_answer", config)
+    summaries = budget.pack_summaries(web_research_result)
+
+    # 摘要过大时先分组并行起草，再由answer模型合并
+    draft_usage = {"tokens": 0, "cost": 0.0}
+    if configurable.synthesis_token_threshold:
+        summaries, draft_usage = reduce_summaries(summaries, research_topic, configurable)
 
     # Format the prompt
     current_date = get_current_date()
-    formatted_prompt = answer_instructions_deepseek.format(
+    formatted_prompt = build_prompt(
+        answer_prefix_deepseek,
+        answer_suffix_deepseek,
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"],"finalize_answer"),
-        summaries="\n---\n\n".join(state["web_research_result"]),
+        research_topic=research_topic,
+        summaries="\n---\n\n".join(summaries),
     )
         
-    llm=ChatDeepSeek(
-        model="deepseek-chat",
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("DEEP_SEEK_KEY"),
-        base_url=deepseek_baseurl
-    )
+    llm=get_deepseek_llm("deepseek-chat", temperature=0, max_retries=2)
     result=llm.invoke(formatted_prompt)
-    unique_sources = []
-    for source in state["sources_gathered"]:
-        if source["short_url"] in result.content:
-            result.content=result.content.replace(
-                source["short_url"], source["value"]
-            )
-            unique_sources.append(source)
+    usage = sum_usage(draft_usage, usage_from_message(result, "deepseek-chat"))
+    prompt_cache = prompt_cache_stats.record("finalize_answer", result)
+    # 来源很多、回答很长时短链接替换放到进程池执行
+    result.content, unique_sources = run_cpu_task(
+        link_sources,
+        result.content,
+        sources_gathered,
+        size=payload_size(result.content, sources_gathered),
+    )
 
+    if configurable.research_memory:
+        memory = get_research_memory()
+        remember_research(
+            memory,
+            get_research_topic(state["messages"], "research_memory", config),
+            [text for text in web_research_result if not text.startswith("### 研究记忆")],
+            sources_gathered,
+        )
+        memory.purge_expired(configurable.research_memory_ttl_hours * 3600)
+
+    # 预算降级的回答质量不完整，不写入答案缓存
+    if configurable.answer_cache and not budget.degraded:
+        get_answer_cache().store_answer(
+            run_answer_cache_key(state, config, configurable),
+            result.content,
+            unique_sources,
+            configurable.answer_cache_max_stale_hours * 3600,
+        )
+
+    speculative_stats = release_prefetcher(get_run_key(config, state))
+    if speculative_stats:
+        logger.info(
+            f"🔮推测预取|prefetched={speculative_stats['prefetched']},hits={speculative_stats['hits']},"
+            f"misses={speculative_stats['misses']},wasted={speculative_stats['wasted']},"
+            f"hit_rate={speculative_stats['hit_rate']:.2%},wasted_rate={speculative_stats['wasted_rate']:.2%}"
+        )
+
+    emit_progress(
+        "finalize_answer",
+        started_at,
+        loop=state.get("research_loop_count", 0),
+        source_count=len(unique_sources),
+        labels=top_labels(unique_sources),
+        **prompt_cache,
+    )
+    repair = repair_stats.snapshot()
+    logger.info(
+        f"🩹结构化输出(进程累计)|calls={repair['calls']},clean={repair['clean']},repaired={repair['repaired']},"
+        f"escalated={repair['escalated']},retries_avoided={repair['retries_avoided']}"
+    )
+    offload = cpu_offload_stats()
+    logger.info(
+        f"🧮CPU卸载(进程累计)|inline={offload['inline']},offloaded={offload['offloaded']},"
+        f"fallbacks={offload['fallbacks']},avg_offload_ms={offload['avg_offload_ms']:.1f}"
+    )
+    routing = router_stats.snapshot()
+    logger.info(
+        f"🧭工具路由(进程累计)|routed={routing['routed']},fallback={routing['fallback']},"
+        f"clinical={routing['clinical']},hit_rate={routing['hit_rate']:.2%}"
+    )
+    entities = get_entity_index().stats()
+    logger.info(
+        f"🏷️实体归一化(进程累计)|lookups={entities['lookups']},rewrites={entities['rewrites']},"
+        f"rewrite_rate={entities['rewrite_rate']:.2%}"
+    )
+    for node, stats in prompt_cache_stats.snapshot().items():
+        logger.info(
+            f"🗄️前缀缓存(进程累计)|{node}:calls={stats['calls']},cached={stats['cached_tokens']},"
+            f"uncached={stats['uncached_tokens']},hit_rate={stats['hit_rate']:.2%}"
+        )
+    if straggler_cutoff_enabled(configurable):
+        stragglers = add_counts(state.get("stragglers"), late.get("stragglers"))
+        logger.info(
+            f"⏱️掉队分支(本次运行)|cut={stragglers.get('cut', 0)},folded={stragglers.get('folded', 0)},"
+            f"cancelled={stragglers.get('cancelled', 0)},dropped={stragglers.get('dropped', 0)},"
+            f"saved={stragglers.get('saved_seconds', 0.0):.1f}s"
+        )
+    if late:
+        usage = sum_usage(usage, late["budget"])
+    budget.tokens += usage["tokens"]
+    budget.cost += usage["cost"]
+    logger.info(f"💰运行预算使用情况:{budget.describe()}")
     logger.info("🚀==============================END=================================🚀")
     return {
         "messages": [AIMessage(content=result.content)],
         "sources_gathered": unique_sources,
+        "budget": usage,
+        **({"web_research_result": late["web_research_result"], "stragglers": late["stragglers"]} if late else {}),
     }
 
 
 
+def start_run(fn):
+    """Wrap the first graph node so each run gets its own id (see ``get_run_key``)."""
+
+    @functools.wraps(fn)
+    def wrapper(state, config):
+        # 同一线程上的多次运行、没有线程的 graph.invoke 都各自使用新的运行 id，运行级缓存互不串用
+        run_id = new_run_id(config)
+        update = fn({**state, "run_id": run_id}, config)
+        return {**(update or {}), "run_id": run_id}
+
+    return wrapper
+
+
+def release_on_failure(fn):
+    """Wrap a graph node so a failing node releases the run-local prefetcher and straggler state; the run ends there."""
+
+    @functools.wraps(fn)
+    def wrapper(state, config):
+        try:
+            return fn(state, config)
+        except BaseException:
+            release_prefetcher(get_run_key(config, state))
+            release_loop_cutoffs(get_run_key(config, state))
+            raise
+
+    return wrapper
+
+
 builder = StateGraph(OverallState, config_schema=Configuration)
-builder.add_node("generate_query", generate_query)
-builder.add_node("web_research", web_research)
-builder.add_node("reflection", reflection)
-builder.add_node("finalize_answer", finalize_answer)
-builder.add_edge(START, "generate_query")
+# 开启 profile_run 的运行按节点采样调用栈（见 agent.profiling）；
+# 开启 memory_tracking 或设置内存上限的运行按节点统计内存（见 agent.memory_guard）
+builder.add_node(
+    "answer_cache",
+    start_run(
+        profile_node(
+            "answer_cache",
+            track_memory(
+                "answer_cache",
+                check_answer_cache,
+                starts_run=True,
+                is_final=lambda update: update.get("answer_cache_hit"),
+            ),
+            is_final=lambda update: update.get("answer_cache_hit"),
+        )
+    ),
+)
+builder.add_node(
+    "generate_query",
+    release_on_failure(profile_node("generate_query", track_memory("generate_query", generate_query))),
+)
+builder.add_node(
+    "web_research", release_on_failure(profile_node("web_research", track_memory("web_research", web_research)))
+)
+builder.add_node(
+    "reflection",
+    release_on_failure(profile_node("reflection", track_memory("reflection", reflection, shrink=True))),
+)
+builder.add_node(
+    "finalize_answer",
+    release_on_failure(
+        profile_node(
+            "finalize_answer",
+            track_memory("finalize_answer", finalize_answer, is_final=lambda update: True),
+            is_final=lambda update: True,
+        )
+    ),
+)
+builder.add_edge(START, "answer_cache")
+builder.add_conditional_edges("answer_cache", route_answer_cache, ["generate_query", END])
 builder.add_conditional_edges(
-    "generate_query", continue_to_web_research, ["web_research"]
+    "generate_query", continue_to_web_research, ["web_research", "reflection"]
 )
 builder.add_edge("web_research", "reflection")
 builder.add_conditional_edges(
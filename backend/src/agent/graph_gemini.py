@@ -7,7 +7,6 @@ from langgraph.types import Send
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
 from langchain_core.runnables import RunnableConfig
-from google.genai import Client
 
 from agent.state import (
     OverallState,
@@ -16,19 +15,20 @@ from agent.state import (
     WebSearchState,
 )
 from agent.configuration import Configuration
-from agent.prompts import (
+from agent.prompts_gemini import (
     get_current_date,
     query_writer_instructions,
     web_searcher_instructions,
     reflection_instructions,
     answer_instructions,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
+from agent.clients import get_gemini_llm, get_gemini_semaphore, get_genai_client
+from agent.cpu_offload import arun_cpu_task, payload_size
 from agent.utils import (
-    get_citations,
     get_research_topic,
-    insert_citation_markers,
-    resolve_urls,
+    grounding_payload_size,
+    insert_citation_markers_googlesearch,
+    parse_grounding,
 )
 
 load_dotenv()
@@ -36,12 +36,8 @@ load_dotenv()
 if os.getenv("GEMINI_API_KEY") is None:
     raise ValueError("GEMINI_API_KEY is not set")
 
-# Used for Google Search API
-genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
-
-
 # Nodes
-def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
+async def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
     """LangGraph node that generates search queries based on the User's question.
 
     Uses Gemini 2.0 Flash to create an optimized search queries for web research based on
@@ -61,23 +57,19 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
         state["initial_search_query_count"] = configurable.number_of_initial_queries
 
     # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
+    llm = get_gemini_llm(configurable.query_generator_model, temperature=1.0, max_retries=2)
     structured_llm = llm.with_structured_output(SearchQueryList)
 
     # Format the prompt
     current_date = get_current_date()
     formatted_prompt = query_writer_instructions.format(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
+        research_topic=get_research_topic(state["messages"], "generate_query", config),
         number_queries=state["initial_search_query_count"],
     )
     # Generate the search queries
-    result = structured_llm.invoke(formatted_prompt)
+    async with get_gemini_semaphore():
+        result = await structured_llm.ainvoke(formatted_prompt)
     return {"search_query": result.query}
 
 
@@ -92,7 +84,7 @@ def continue_to_web_research(state: QueryGenerationState):
     ]
 
 
-def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+async def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """LangGraph node that performs web research using the native Google Search API tool.
 
     Executes a web search using the native Google Search API tool in combination with Gemini 2.0 Flash.
@@ -111,32 +103,35 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
         research_topic=state["search_query"],
     )
 
-    # Uses the google genai client as the langchain client doesn't return grounding metadata
-    response = genai_client.models.generate_content(
-        model=configurable.query_generator_model,
-        contents=formatted_prompt,
-        config={
-            "tools": [{"google_search": {}}],
-            "temperature": 0,
-        },
+    # Uses the google genai client as the langchain client doesn't return grounding metadata.
+    # The async client lets parallel Send branches overlap on the event loop.
+    async with get_gemini_semaphore():
+        response = await get_genai_client().aio.models.generate_content(
+            model=configurable.query_generator_model,
+            contents=formatted_prompt,
+            config={
+                "tools": [{"google_search": {}}],
+                "temperature": 0,
+            },
+        )
+
+    # 解析 grounding 元数据和引用插入都是纯CPU计算；回答很长、引用很多时放到进程池执行，
+    # 不阻塞并发运行共享的事件循环，两者按同一个阈值（CPU_OFFLOAD_MIN_CHARS）判断
+    text, citations = await arun_cpu_task(
+        parse_grounding, response, state["id"], size=grounding_payload_size(response)
     )
-    # resolve the urls to short urls for saving tokens and time
-    resolved_urls = resolve_urls(
-        response.candidates[0].grounding_metadata.grounding_chunks, state["id"]
+    cited_text = await arun_cpu_task(
+        insert_citation_markers_googlesearch, text, citations, size=payload_size(text, citations)
     )
-    # Gets the citations and adds them to the generated text
-    citations = get_citations(response, resolved_urls)
-    modified_text = insert_citation_markers(response.text, citations)
-    sources_gathered = [item for citation in citations for item in citation["segments"]]
 
     return {
-        "sources_gathered": sources_gathered,
+        "sources_gathered": [item for citation in citations for item in citation["segments"]],
         "search_query": [state["search_query"]],
-        "web_research_result": [modified_text],
+        "web_research_result": [cited_text],
     }
 
 
-def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+async def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     """LangGraph node that identifies knowledge gaps and generates potential follow-up queries.
 
     Analyzes the current summary to identify areas for further research and generates
@@ -159,17 +154,13 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     current_date = get_current_date()
     formatted_prompt = reflection_instructions.format(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
+        research_topic=get_research_topic(state["messages"], "reflection", config),
         summaries="\n\n---\n\n".join(state["web_research_result"]),
     )
     # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
+    llm = get_gemini_llm(reasoning_model, temperature=1.0, max_retries=2)
+    async with get_gemini_semaphore():
+        result = await llm.with_structured_output(Reflection).ainvoke(formatted_prompt)
 
     return {
         "is_sufficient": result.is_sufficient,
@@ -217,7 +208,7 @@ def evaluate_research(
         ]
 
 
-def finalize_answer(state: OverallState, config: RunnableConfig):
+async def finalize_answer(state: OverallState, config: RunnableConfig):
     """LangGraph node that finalizes the research summary.
 
     Prepares the final output by deduplicating and formatting sources, then
@@ -237,18 +228,14 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
     current_date = get_current_date()
     formatted_prompt = answer_instructions.format(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
+        research_topic=get_research_topic(state["messages"], "finalize_answer", config),
         summaries="\n---\n\n".join(state["web_research_result"]),
     )
 
     # init Reasoning Model, default to Gemini 2.5 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
-    result = llm.invoke(formatted_prompt)
+    llm = get_gemini_llm(reasoning_model, temperature=0, max_retries=2)
+    async with get_gemini_semaphore():
+        result = await llm.ainvoke(formatted_prompt)
 
     # Replace the short urls with the original urls and add all used urls to the sources_gathered
     unique_sources = []
@@ -0,0 +1,228 @@
+import json
+import re
+import threading
+import typing
+from typing import List, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   本地容错 JSON 修复与校验
+   generate_query、reflection 原来依赖 with_structured_output，模型输出格式不对就失败或重试；
+   而提示词里的示例本身就带 ```json 代码块、尾随逗号和 // 注释，模型经常照抄。
+   👇主要逻辑：
+      1.先直接让模型按提示词输出 JSON 文本；
+      2.本地修复：去掉 <think> 部分和代码块围栏，截取第一个完整的 {...}/[...]，
+        删除注释和尾随逗号，单引号改双引号，补全未加引号的键，Python 字面量（True/False/None）转 JSON；
+      3.按 pydantic 模型校验并只纠正已给出但类型不对的值（字符串→单元素列表、非字符串→JSON 文本），
+        缺失必填字段视为修复失败；
+      4.只有修复失败时才升级为 with_structured_output 再请求一次模型；
+      5.统计修复成功率与避免的重试次数。
+'''
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _extract_candidate(text: str) -> str:
+    if "</think>" in text:
+        text = text.split("</think>")[-1]
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return text.strip()
+    # 按括号配对截取第一个完整的 JSON 值（忽略字符串内部的括号）
+    depth, quote, escaped = 0, None, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return text[start:]
+
+
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f", '"': '\\"'}
+
+
+def _escape_string_char(char: str) -> str:
+    # 字符串里的双引号和原始控制字符（换行、制表符等）必须转义，否则严格 JSON 解析失败
+    if char in _CONTROL_ESCAPES:
+        return _CONTROL_ESCAPES[char]
+    if ord(char) < 0x20:
+        return f"\\u{ord(char):04x}"
+    return char
+
+
+def repair_json_text(text: str) -> str:
+    """Rewrite near-JSON model output into strict JSON text (without validating it)."""
+    source = _extract_candidate(text)
+    out: List[str] = []
+    i, n = 0, len(source)
+    while i < n:
+        char = source[i]
+        if char in "\"'":
+            # 字符串：统一输出为双引号，转义内部的双引号
+            quote, i, chars = char, i + 1, []
+            while i < n and source[i] != quote:
+                if source[i] == "\\" and i + 1 < n:
+                    if quote == "'" and source[i + 1] == "'":
+                        chars.append("'")
+                    else:
+                        chars.append(source[i : i + 2])
+                    i += 2
+                    continue
+                chars.append(_escape_string_char(source[i]))
+                i += 1
+            out.append('"' + "".join(chars) + '"')
+            i += 1
+        elif source.startswith("//", i) or char == "#":
+            while i < n and source[i] != "\n":
+                i += 1
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif char in "}]":
+            # 删除尾随逗号
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            out.append(char)
+            i += 1
+        elif char.isalpha() or char == "_":
+            j = i
+            while j < n and (source[j].isalnum() or source[j] in "_-"):
+                j += 1
+            word = source[i:j]
+            rest = source[j:].lstrip()
+            if rest.startswith(":"):
+                out.append(json.dumps(word))  # 未加引号的键
+            else:
+                out.append(_PY_LITERALS.get(word, word))
+            i = j
+        else:
+            out.append(char)
+            i += 1
+    # 输出被截断时补齐未闭合的括号
+    repaired = "".join(out).rstrip().rstrip(",")
+    closers = []
+    for char in re.sub(r'"(?:\\.|[^"\\])*"', "", repaired):
+        if char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    return repaired + "".join(reversed(closers))
+
+
+def _is_list_annotation(annotation) -> bool:
+    return typing.get_origin(annotation) in (list, List)
+
+
+def coerce_to_schema(data, schema: Type[BaseModel]) -> BaseModel:
+    """Validate ``data`` against ``schema`` after light type coercion.
+
+    Only values that are present but have the wrong type are coerced; a missing
+    required field raises ``ValueError`` so the call escalates.
+    """
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object for {schema.__name__}, got {type(data).__name__}")
+    data = dict(data)
+    for name, field in schema.model_fields.items():
+        if data.get(name) is None:
+            # 缺失的必填字段说明输出不对（键名写错或是别的结构），不补默认值
+            if field.is_required():
+                raise ValueError(f"{schema.__name__} output is missing required field {name!r}")
+            continue
+        value = data[name]
+        if _is_list_annotation(field.annotation) and isinstance(value, str):
+            data[name] = [value] if value.strip() else []
+        elif field.annotation is str and not isinstance(value, str):
+            data[name] = json.dumps(value, ensure_ascii=False)
+    return schema.model_validate(data)
+
+
+def parse_model_output(text: str, schema: Type[BaseModel]) -> Tuple[BaseModel, bool]:
+    """Parse model output into ``schema``; return ``(result, repaired)``.
+
+    ``repaired`` is True when the raw text was not valid strict JSON for the schema.
+    Raises ``ValueError`` when the output cannot be repaired.
+    """
+    try:
+        return schema.model_validate_json(text.strip()), False
+    except ValidationError:
+        pass
+    try:
+        return coerce_to_schema(json.loads(repair_json_text(text)), schema), True
+    except (json.JSONDecodeError, ValidationError, ValueError) as e:
+        raise ValueError(f"could not repair {schema.__name__} output: {e}") from e
+
+
+class RepairStats:
+    """Process-wide counters of local structured-output parsing per node."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "clean": 0, "repaired": 0, "escalated": 0}
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats[outcome] += 1
+
+    def snapshot(self) -> dict:
+        """Return the counters, the repair success rate and the LLM retries avoided."""
+        with self._lock:
+            stats = dict(self._stats)
+        needed = stats["repaired"] + stats["escalated"]
+        stats["repair_success_rate"] = stats["repaired"] / needed if needed else 1.0
+        stats["retries_avoided"] = stats["repaired"]
+        return stats
+
+
+repair_stats = RepairStats()
+
+
+def invoke_structured(llm, prompt, schema: Type[BaseModel], node: str) -> Tuple[BaseModel, list]:
+    """Invoke ``llm`` and parse its JSON answer into ``schema`` locally.
+
+    Falls back to ``with_structured_output`` only when local repair fails.
+    Returns the parsed result and every raw model response (for usage accounting).
+    """
+    response = llm.invoke(prompt)
+    try:
+        result, repaired = parse_model_output(str(response.content), schema)
+    except ValueError as e:
+        repair_stats.record("escalated")
+        logger.info(f"🩹{node}|本地JSON修复失败，改用structured output重试:{e}")
+        output = llm.with_structured_output(schema, include_raw=True).invoke(prompt)
+        if output["parsed"] is None:
+            raise output["parsing_error"] or ValueError("structured output could not be parsed")
+        return output["parsed"], [response, output["raw"]]
+    repair_stats.record("repaired" if repaired else "clean")
+    if repaired:
+        stats = repair_stats.snapshot()
+        logger.info(
+            f"🩹{node}|本地修复JSON成功,repair_success_rate={stats['repair_success_rate']:.2%},"
+            f"retries_avoided={stats['retries_avoided']}"
+        )
+    return result, [response]
@@ -0,0 +1,308 @@
+import contextvars
+import functools
+import itertools
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent.blobstore import hydrate_sources, hydrate_texts, is_blob_ref, offload_sources, offload_texts
+from agent.configuration import Configuration
+from agent.logger import get_logger
+from agent.progress import emit_progress
+from agent.ranking import compress_results
+from agent.state import merge_memory
+from agent.utils import get_latest_question
+
+logger = get_logger(__name__)
+
+'''
+   单次运行的内存统计与高水位上限
+   high 档位（5个查询×10轮）的运行会在 web_research_result、消息列表和 web_research 内部的工具消息历史里
+   积累大量 Tavily 原文，单个运行的内存尖峰会拖垮同一进程里的其他运行。
+   👇主要逻辑：
+      1.运行配置里打开 memory_tracking 或设置了上限时，每个节点由 track_memory 包装；都没打开时包装只多一次字典查找；
+      2.字段统计：节点开始前按字段递归估算状态大小（deep_size），记录整次运行的状态峰值和最大的几个字段；
+      3.采样：memory_tracking 打开时用 tracemalloc 统计节点执行期间已分配内存的增长峰值，
+        后台线程每隔 MEMORY_SAMPLE_INTERVAL_MS 采样一次；tracemalloc 是进程级的，并发运行之间会互相计入，
+        得到的是偏保守的上界，只用于统计，不参与上限判断；
+      4.软上限 memory_soft_limit_mb：reflection 开始前状态超过软上限时，把最大的字段卸载到 blob 存储，
+        仍然超过时按研究主题做抽取式压缩，最后截断，整体替换写回状态（见 state.add_or_replace）；
+      5.硬上限 memory_hard_limit_mb：只按本次运行自己的数据判断，邻近运行的分配不会让小运行失败；
+        节点开始前状态大小超过硬上限时抛出 MemoryLimitExceeded，运行以明确的错误结束；
+        web_research 每轮工具调用后用 check_node_memory 把节点内积累的消息和结果计入状态大小，不必等到节点结束；
+      6.峰值写入状态的 memory 字段（随运行结果一起保存在 thread 状态里），finalize_answer 结束时打印日志并推送进度事件。
+'''
+
+MEMORY_SAMPLE_INTERVAL_MS = 10
+TOP_FIELDS = 5
+MB = 1024 * 1024
+
+
+class MemoryLimitExceeded(RuntimeError):
+    """Raised when a run goes over its ``memory_hard_limit_mb``."""
+
+
+def deep_size(value, _seen: Optional[set] = None) -> int:
+    """Estimate the memory held by a plain str/list/dict/pydantic value in bytes."""
+    seen = set() if _seen is None else _seen
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(vars(item))
+    return size
+
+
+def field_sizes(state: dict) -> Dict[str, int]:
+    """Return the estimated size of every state field except the memory record, largest first."""
+    seen: set = set()
+    sizes = {key: deep_size(value, seen) for key, value in state.items() if key != "memory"}
+    return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
+
+
+class _NodeTracer:
+    """tracemalloc growth of running nodes, sampled by one background thread."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._active: Dict[int, List[int]] = {}
+        self._tokens = itertools.count(1)
+        self._owns_tracing = False
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        with self._lock:
+            if not self._active and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            token = next(self._tokens)
+            current = tracemalloc.get_traced_memory()[0]
+            self._active[token] = [current, current]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory-tracer", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return token
+
+    def growth(self, token: int) -> int:
+        """Sample once and return the peak growth of a running node in bytes."""
+        with self._lock:
+            marks = self._active.get(token)
+            if marks is None or not tracemalloc.is_tracing():
+                return 0
+            marks[1] = max(marks[1], tracemalloc.get_traced_memory()[0])
+            return max(0, marks[1] - marks[0])
+
+    def stop(self, token: int) -> int:
+        peak = self.growth(token)
+        with self._lock:
+            self._active.pop(token, None)
+            # 最后一个节点结束时关闭自己打开的 tracemalloc，避免长期拖慢分配
+            if not self._active and self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+        return peak
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if self._active and tracemalloc.is_tracing():
+                    current = tracemalloc.get_traced_memory()[0]
+                    for marks in self._active.values():
+                        marks[1] = max(marks[1], current)
+                    idle = False
+                else:
+                    # 在锁内清除唤醒标记：start 先登记节点再 set，不会在检查和等待之间丢失唤醒
+                    self._wake.clear()
+                    idle = True
+            if idle:
+                self._wake.wait()
+                continue
+            time.sleep(self.interval)
+
+
+_tracer = _NodeTracer(MEMORY_SAMPLE_INTERVAL_MS)
+# 当前节点开始时的状态大小和硬上限；用 ContextVar 而不是 threading.local，
+# 掉队截止把分支放到复制了上下文的后台线程里执行，仍能取到所属节点
+_node_limit: contextvars.ContextVar[Optional[Tuple[int, int]]] = contextvars.ContextVar(
+    "memory_node_limit", default=None
+)
+
+
+def memory_guard_enabled(config) -> bool:
+    """Return whether memory tracking or a memory limit is set for this run."""
+    configurable = (config or {}).get("configurable") or {}
+    return bool(
+        configurable.get("memory_tracking")
+        or configurable.get("memory_soft_limit_mb")
+        or configurable.get("memory_hard_limit_mb")
+    )
+
+
+def check_node_memory(*values) -> None:
+    """Raise :class:`MemoryLimitExceeded` when the run state plus the node's working ``values`` pass the hard limit."""
+    node = _node_limit.get()
+    if node is None:
+        return
+    state_bytes, hard_bytes = node
+    seen: set = set()
+    total = state_bytes + sum(deep_size(value, seen) for value in values)
+    if total > hard_bytes:
+        raise MemoryLimitExceeded(
+            f"run state and node data reached {total / MB:.2f} MB, over memory_hard_limit_mb={hard_bytes / MB:g}"
+        )
+
+
+def shrink_state(state: dict, research_topic: str, target_bytes: int, configurable: Configuration) -> dict:
+    """Shrink the largest result fields of ``state`` towards ``target_bytes``.
+
+    Returns replacement updates (``{"replace": [...]}``) for ``web_research_result``
+    and ``sources_gathered``; an empty dict when nothing could be shrunk.
+    """
+    texts = list(state.get("web_research_result") or [])
+    sources = list(state.get("sources_gathered") or [])
+    other_bytes = sum(
+        size for key, size in field_sizes(state).items() if key not in ("web_research_result", "sources_gathered")
+    )
+
+    def total() -> int:
+        return other_bytes + deep_size(texts) + deep_size(sources)
+
+    steps = []
+    # 1.卸载到 blob 存储，状态里只保留引用
+    try:
+        if any(not is_blob_ref(text) for text in texts):
+            texts = offload_texts(texts, 0)
+            steps.append("offload_texts")
+        if not (len(sources) == 1 and "blob_ref" in sources[0]) and sources:
+            sources = offload_sources(hydrate_sources(sources), 0)
+            steps.append("offload_sources")
+    except Exception as e:
+        logger.info(f"🧠内存软上限|blob卸载失败，改为压缩:{e}")
+
+    # 2.仍然超过时按研究主题做抽取式压缩，再整体放回 blob
+    if total() > target_bytes and texts:
+        texts = compress_results(hydrate_texts(texts), research_topic, configurable.compress_target_chars)
+        steps.append("compress")
+        try:
+            texts = offload_texts(texts, 0)
+        except Exception:
+            pass
+
+    # 3.最后按比例截断最长的文本
+    if total() > target_bytes and texts:
+        texts = hydrate_texts(texts)
+        budget = max(1, target_bytes - other_bytes - deep_size(sources))
+        ratio = budget / max(deep_size(texts), 1)
+        texts = [text[: max(200, int(len(text) * ratio))] for text in texts]
+        steps.append("truncate")
+
+    if not steps:
+        return {}
+    logger.info(f"🧠内存软上限|{'→'.join(steps)},状态约{total() / MB:.2f}MB")
+    return {
+        "web_research_result": {"replace": texts},
+        "sources_gathered": {"replace": sources},
+    }
+
+
+def track_memory(
+    name: str,
+    fn: Callable,
+    shrink: bool = False,
+    starts_run: bool = False,
+    is_final: Optional[Callable[[dict], bool]] = None,
+) -> Callable:
+    """Wrap a sync ``fn(state, config)`` graph node with per-run memory accounting and limits.
+
+    ``shrink`` applies the soft limit to the state before the node runs,
+    ``starts_run`` marks the first node of a run (resets the recorded peaks) and
+    ``is_final`` tells from the node's update whether the run ends after it.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(state, config):
+        if not memory_guard_enabled(config):
+            return fn(state, config)
+        started_at = time.perf_counter()
+        configurable = Configuration.from_runnable_config(config)
+        soft_bytes = int(configurable.memory_soft_limit_mb * MB)
+        hard_bytes = int(configurable.memory_hard_limit_mb * MB)
+
+        sizes = field_sizes(state)
+        state_bytes = sum(sizes.values())
+        if hard_bytes and state_bytes > hard_bytes:
+            raise MemoryLimitExceeded(
+                f"{name}: run state is {state_bytes / MB:.2f} MB, over memory_hard_limit_mb={configurable.memory_hard_limit_mb:g}"
+            )
+        replacements = {}
+        if shrink and soft_bytes and state_bytes > soft_bytes:
+            topic = get_latest_question(state.get("messages") or [])
+            replacements = shrink_state(state, topic, soft_bytes, configurable)
+            if replacements:
+                state = {
+                    **state,
+                    "web_research_result": replacements["web_research_result"]["replace"],
+                    "sources_gathered": replacements["sources_gathered"]["replace"],
+                }
+
+        token = _tracer.start() if configurable.memory_tracking else None
+        limit = _node_limit.set((state_bytes, hard_bytes) if hard_bytes else None)
+        try:
+            update = fn(state, config)
+        finally:
+            _node_limit.reset(limit)
+            node_peak = _tracer.stop(token) if token is not None else 0
+
+        record = {
+            "state_peak_bytes": state_bytes,
+            "largest_fields": dict(list(sizes.items())[:TOP_FIELDS]),
+            "node_peak_bytes": {name: node_peak} if token is not None else {},
+        }
+        if replacements:
+            record["soft_limit_actions"] = 1
+        if starts_run:
+            record["run_started_at"] = time.time()
+        update = dict(update or {})
+        for key, replacement in replacements.items():
+            # 节点自己追加的结果（如并入的掉队分支）接在替换后的列表后面
+            update[key] = {"replace": replacement["replace"] + list(update.get(key) or [])}
+        update["memory"] = record
+        if is_final is not None and is_final(update):
+            report_run_memory(merge_memory(None if starts_run else state.get("memory"), record), started_at)
+        return update
+
+    return wrapper
+
+
+def report_run_memory(memory: dict, started_at: float) -> None:
+    """Log the memory peaks of a finished run and send them as a ``memory`` progress event."""
+    nodes = memory.get("node_peak_bytes") or {}
+    fields = memory.get("largest_fields") or {}
+    node_text = ",".join(f"{node}={peak / MB:.2f}MB" for node, peak in nodes.items()) or "-"
+    field_text = ",".join(f"{key}={size / MB:.2f}MB" for key, size in fields.items())
+    logger.info(
+        f"🧠运行内存|状态峰值={memory.get('state_peak_bytes', 0) / MB:.2f}MB,节点增长峰值:{node_text},"
+        f"软上限处理={memory.get('soft_limit_actions', 0)}次,最大字段:{field_text}"
+    )
+    emit_progress(
+        "memory",
+        started_at,
+        state_peak_mb=round(memory.get("state_peak_bytes", 0) / MB, 3),
+        node_peak_mb={node: round(peak / MB, 3) for node, peak in nodes.items()},
+        soft_limit_actions=memory.get("soft_limit_actions", 0),
+    )
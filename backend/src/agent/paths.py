@@ -0,0 +1,29 @@
+import os
+from pathlib import Path
+
+'''
+   本地数据目录
+   研究记忆、答案缓存、blob 存储、分支队列和性能剖析文件在没有配置外部存储时都写到本地数据目录。
+   👇主要逻辑：
+      1.环境变量 AGENT_DATA_DIR 指定数据目录；
+      2.未指定时，从源码目录运行（src/agent 上两级有 pyproject.toml）使用 backend/data；
+        以安装包方式运行时使用当前工作目录下的 data/，不会写到 site-packages 旁边；
+      3.每次取路径时读取环境变量，.env 在导入之后加载也能生效。
+'''
+
+_SOURCE_ROOT = Path(__file__).resolve().parents[2]
+
+
+def get_data_dir() -> Path:
+    """Return the local data directory (``AGENT_DATA_DIR``, the source tree's ``data/`` or ``./data``)."""
+    configured = os.getenv("AGENT_DATA_DIR")
+    if configured:
+        return Path(configured)
+    if (_SOURCE_ROOT / "pyproject.toml").exists():
+        return _SOURCE_ROOT / "data"
+    return Path.cwd() / "data"
+
+
+def data_path(*parts: str) -> Path:
+    """Return a path inside the local data directory."""
+    return get_data_dir().joinpath(*parts)
@@ -0,0 +1,289 @@
+import contextvars
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from agent.logger import get_logger
+from agent.paths import data_path
+from agent.utils import get_run_key, get_thread_key
+
+logger = get_logger(__name__)
+
+'''
+   按需的单次运行性能剖析（采样 + 火焰图文件）
+   线上某次运行很慢时，无法知道时间花在 graph.py 的哪个节点、哪个工具调用里。
+   👇主要逻辑：
+      1.运行配置里打开 profile_run（未在配置里设置时读环境变量 PROFILE_RUN）后，每个节点执行期间把当前线程
+        登记到这次运行的剖析器；关闭时节点包装只多一次字典查找，不启动任何线程；
+        节点派生的工作线程（掉队分支截止的分支线程、分层综合的起草线程池）经 profile_worker 包装后也登记到该节点；
+        推测预取、答案缓存后台刷新等跨节点的后台线程不登记，它们的耗时不计入任何节点；
+      2.全局采样线程每隔 PROFILE_INTERVAL_MS（默认5ms）读取已登记线程的调用栈（sys._current_frames），
+        按 "node:节点名;文件:函数;..." 聚合成折叠栈计数，工具调用在节点线程内执行，同样会被采到；
+      3.每个节点结束后把累计结果写到 PROFILE_DIR/<thread_id>/<run_id>.collapsed 和 .speedscope.json
+        （默认数据目录下的 profiles/，见 agent.paths），运行结束（finalize_answer 或答案缓存命中）后释放剖析器；
+        并行分支的节点会同时保存同一次运行的文件，保存按剖析器串行，并先写临时文件再原子替换；
+      4.app.py 的 /profiles 路由按 thread_id、run_id 返回文件，.speedscope.json 可直接拖进 https://www.speedscope.app 查看。
+'''
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+MAX_ACTIVE_PROFILES = 64
+_SAFE_ID_RE = re.compile(r"^[A-Za-z0-9_.:-]+$")
+
+
+def get_profile_dir() -> Path:
+    """Return the directory holding profile artifacts (``PROFILE_DIR``)."""
+    return Path(os.getenv("PROFILE_DIR") or data_path("profiles"))
+
+
+def profile_paths(thread_id: str, run_id: str) -> Dict[str, Path]:
+    """Return the collapsed-stack and speedscope file paths of a run."""
+    for value in (thread_id, run_id):
+        if not _SAFE_ID_RE.match(value) or value in (".", ".."):
+            raise ValueError(f"invalid profile id: {value!r}")
+    base = get_profile_dir() / thread_id
+    return {
+        "collapsed": base / f"{run_id}.collapsed",
+        "speedscope": base / f"{run_id}.speedscope.json",
+    }
+
+
+def _frame_name(code) -> str:
+    return f"{Path(code.co_filename).name}:{code.co_name}:{code.co_firstlineno}"
+
+
+class RunProfiler:
+    """Collapsed-stack samples of the nodes of one run.
+
+    Args:
+        thread_id: LangGraph thread id of the run.
+        run_id: Run id (see agent.utils.new_run_id).
+        interval_ms: Sampling interval, used as the weight of each sample.
+    """
+
+    def __init__(self, thread_id: str, run_id: str, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.interval_ms = interval_ms
+        self.started_at = time.time()
+        self.stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def add_sample(self, node: str, frame) -> None:
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        names.append(f"node:{node}")
+        stack = ";".join(reversed(names))
+        with self._lock:
+            self.stacks[stack] += 1
+
+    def collapsed(self) -> str:
+        """Return the samples in collapsed-stack format (``frame;frame;... count`` per line)."""
+        with self._lock:
+            items = sorted(self.stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def speedscope(self) -> dict:
+        """Return the samples as a speedscope sampled profile."""
+        with self._lock:
+            items = sorted(self.stacks.items())
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in items:
+            sample = []
+            for name in stack.split(";"):
+                if name not in index:
+                    index[name] = len(frames)
+                    file, _, rest = name.partition(":")
+                    frames.append({"name": rest or name, "file": file if rest else None})
+                sample.append(index[name])
+            samples.append(sample)
+            weights.append(count * self.interval_ms)
+        total = sum(weights)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.thread_id}/{self.run_id}",
+            "exporter": "agent.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"run {self.run_id}",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": total,
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+    def save(self) -> Path:
+        """Write the collapsed and speedscope files; return the speedscope path."""
+        paths = profile_paths(self.thread_id, self.run_id)
+        with self._save_lock:
+            paths["collapsed"].parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(paths["collapsed"], self.collapsed())
+            _write_atomic(paths["speedscope"], json.dumps(self.speedscope()))
+        return paths["speedscope"]
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # 同目录临时文件 + 原子替换，/profiles 路由不会读到写了一半的文件
+    tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class _Sampler:
+    """One background thread sampling every thread registered by a profiled node."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._targets: Dict[int, Tuple[RunProfiler, str]] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, profiler: RunProfiler, node: str) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            self._targets[ident] = (profiler, node)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="run-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return ident
+
+    def unregister(self, ident: int) -> None:
+        with self._lock:
+            self._targets.pop(ident, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                targets = dict(self._targets)
+                if not targets:
+                    # 在锁内清除唤醒标记，register 先登记再 set，不会丢失唤醒
+                    self._wake.clear()
+            if not targets:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for ident, (profiler, node) in targets.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    profiler.add_sample(node, frame)
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS)
+_profilers: "OrderedDict[Tuple[str, str], RunProfiler]" = OrderedDict()
+_profilers_lock = threading.Lock()
+# 当前节点的 (剖析器, 节点名, 节点线程)，供 profile_worker 把工作线程登记到同一节点
+_active_node: contextvars.ContextVar[Optional[Tuple[RunProfiler, str, int]]] = contextvars.ContextVar(
+    "active_profiled_node", default=None
+)
+
+
+def profiling_enabled(config) -> bool:
+    """Return whether ``profile_run`` is set for this run.
+
+    An explicit configurable ``profile_run`` wins; ``PROFILE_RUN`` is only the default.
+    """
+    configurable = (config or {}).get("configurable") or {}
+    value = configurable.get("profile_run")
+    if value is None:
+        value = os.environ.get("PROFILE_RUN")
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def get_run_profiler(config, state=None) -> RunProfiler:
+    """Return the profiler of the current run, creating it on first use."""
+    key = (get_thread_key(config), get_run_key(config, state))
+    with _profilers_lock:
+        profiler = _profilers.get(key)
+        if profiler is None:
+            profiler = _profilers[key] = RunProfiler(*key)
+            # 异常中断的运行不会释放剖析器，只保留最近的若干个
+            while len(_profilers) > MAX_ACTIVE_PROFILES:
+                _profilers.popitem(last=False)
+        return profiler
+
+
+def release_run_profiler(config, state=None) -> Optional[RunProfiler]:
+    """Forget the profiler of a finished run and return it."""
+    with _profilers_lock:
+        return _profilers.pop((get_thread_key(config), get_run_key(config, state)), None)
+
+
+def profile_worker(fn: Callable) -> Callable:
+    """Wrap ``fn`` so worker threads running it are sampled as part of the calling profiled node.
+
+    Call it in the node thread; outside a profiled node ``fn`` is returned unchanged.
+    """
+    active = _active_node.get()
+    if active is None:
+        return fn
+    profiler, node, node_ident = active
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if threading.get_ident() == node_ident:
+            return fn(*args, **kwargs)
+        ident = _sampler.register(profiler, node)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _sampler.unregister(ident)
+
+    return wrapper
+
+
+def profile_node(name: str, fn: Callable, is_final: Optional[Callable[[dict], bool]] = None) -> Callable:
+    """Wrap a sync ``fn(state, config)`` graph node so runs with ``profile_run`` are sampled.
+
+    ``is_final`` tells from the node's update whether the run ends after it.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(state, config):
+        if not profiling_enabled(config):
+            return fn(state, config)
+        profiler = get_run_profiler(config, state)
+        ident = _sampler.register(profiler, name)
+        token = _active_node.set((profiler, name, ident))
+        try:
+            update = fn(state, config)
+        finally:
+            _active_node.reset(token)
+            _sampler.unregister(ident)
+            try:
+                path = profiler.save()
+            except OSError as e:
+                logger.info(f"🔥性能剖析|保存失败:{e}")
+                path = None
+        if is_final is not None and is_final(update):
+            release_run_profiler(config, state)
+            if path is not None:
+                logger.info(f"🔥性能剖析|已保存:{path}")
+        return update
+
+    return wrapper
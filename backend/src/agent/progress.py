@@ -0,0 +1,55 @@
+import time
+from typing import List, Optional
+
+from langgraph.config import get_stream_writer
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   轻量级进度事件
+   前端时间线只需要查询列表、来源数量和几个标签，
+   不需要随 updates 流推送完整的 web_research_result 和 sources_gathered。
+   每个节点结束时通过 LangGraph 的 custom 流发送一个很小的进度事件：
+      {"type": "progress", "node", "loop", "elapsed_ms", ...计数与标签}
+'''
+
+
+def top_labels(sources: List[dict], limit: int = 3) -> List[str]:
+    """Return up to ``limit`` distinct source labels, in order of appearance."""
+    labels = []
+    for source in sources:
+        # 卸载到blob存储的来源条目自带 labels
+        for label in source.get("labels") or [source.get("label")]:
+            if label and label not in labels:
+                labels.append(label)
+                if len(labels) >= limit:
+                    return labels
+    return labels
+
+
+def count_sources(sources: List[dict]) -> int:
+    """Count sources, including the ones behind blob reference entries."""
+    return sum(source.get("count", 1) if "blob_ref" in source else 1 for source in sources)
+
+
+def emit_progress(node: str, started_at: float, loop: Optional[int] = None, **data) -> None:
+    """Send a compact progress event for ``node`` on the custom stream.
+
+    Does nothing when the run was not started with the ``custom`` stream mode
+    or when called outside a graph run.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer(
+        {
+            "type": "progress",
+            "node": node,
+            "loop": loop,
+            "elapsed_ms": int((time.perf_counter() - started_at) * 1000),
+            **data,
+        }
+    )
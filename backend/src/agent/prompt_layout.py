@@ -0,0 +1,68 @@
+import threading
+from collections import defaultdict
+from typing import List
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   前缀缓存友好的提示词组装与缓存命中统计
+   DeepSeek（以及 Gemini）对与之前请求相同的提示词前缀做服务端缓存，命中部分按折扣计费且首 token 更快，
+   但原来的提示词把 {current_date}、{research_topic} 插在静态指令中间，每次请求的前缀都不同。
+   👇主要逻辑：
+      1.每个节点的静态指令作为第一条 system 消息，不含任何占位符，逐字节稳定；
+      2.日期、主题、摘要等可变内容放在最后一条 human 消息里；
+      3.web_research 的多轮工具调用在同一消息列表后追加，前面的消息保持不变，可继续命中缓存；
+      4.从 usage_metadata 读取命中/未命中的提示词 token 数，按节点累计。
+'''
+
+
+def build_prompt(prefix: str, suffix_template: str, **values) -> List[BaseMessage]:
+    """Return ``[system(prefix), human(suffix)]`` with only the suffix formatted."""
+    return [SystemMessage(content=prefix), HumanMessage(content=suffix_template.format(**values))]
+
+
+def cached_prompt_tokens(message) -> int:
+    """Return the number of prompt tokens served from the provider's prefix cache."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    cache_read = (usage.get("input_token_details") or {}).get("cache_read")
+    if cache_read is not None:
+        return cache_read
+    # 旧版 langchain_deepseek 只把命中数放在原始 token_usage 里
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("prompt_cache_hit_tokens") or 0
+
+
+class PromptCacheStats:
+    """Process-wide per-node counters of cached and uncached prompt tokens."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes = defaultdict(lambda: {"calls": 0, "cached_tokens": 0, "uncached_tokens": 0})
+
+    def record(self, node: str, message) -> dict:
+        """Add the prompt usage of one response to ``node``; return this call's counts."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        cached = cached_prompt_tokens(message)
+        uncached = max(0, usage.get("input_tokens", 0) - cached)
+        with self._lock:
+            stats = self._nodes[node]
+            stats["calls"] += 1
+            stats["cached_tokens"] += cached
+            stats["uncached_tokens"] += uncached
+        return {"cached_tokens": cached, "uncached_tokens": uncached}
+
+    def snapshot(self) -> dict:
+        """Return the counters of every node with its cache hit rate."""
+        with self._lock:
+            result = {}
+            for node, stats in self._nodes.items():
+                total = stats["cached_tokens"] + stats["uncached_tokens"]
+                result[node] = {**stats, "hit_rate": stats["cached_tokens"] / total if total else 0.0}
+            return result
+
+
+prompt_cache_stats = PromptCacheStats()
@@ -5,15 +5,20 @@ from datetime import datetime
 def get_current_date():
     return datetime.now().strftime("%B %d, %Y")
 
-query_writer_instructions_deepseek="""你的目标是生成复杂且多样化的网络搜索查询。这些查询将用于一个高级的自动化网页研究工具，该工具能够分析复杂的结果、跟踪链接并综合信息。
+# DeepSeek 的提示词拆成两部分以命中服务端前缀缓存（context caching）：
+#   *_prefix：静态指令，不含任何占位符，逐字节稳定，作为 system 消息放在最前面；
+#   *_suffix：日期、研究主题、摘要等每次都会变化的内容，作为最后一条 human 消息。
+# 组装方式见 agent/prompt_layout.py。
+
+query_writer_prefix_deepseek="""你的目标是生成复杂且多样化的网络搜索查询。这些查询将用于一个高级的自动化网页研究工具，该工具能够分析复杂的结果、跟踪链接并综合信息。
    
    指令：
    -优先只生成一个搜索查询；只有当原始问题包含多个方面或元素、一个查询不足以涵盖时，才生成额外的查询。
    -每个查询应聚焦于原始问题的一个特定方面。
-   -不要产生超过{number_queries}个查询。
+   -不要产生超过末尾给出的查询数量上限。
    -查询应具有多样化；如果主题较广，可以生成多个查询。
    -不要生成多个相似的查询，一个就够了。
-   -查询应确保获取最新的信息。当前日期为{current_date}。
+   -查询应确保获取最新的信息，当前日期见末尾。
    
    格式：
    -将您的回复格式化为具有所有两个确切键的JSON对象：
@@ -24,24 +29,38 @@ query_writer_instructions_deepseek="""你的目标是生成复杂且多样化的
 
    主题：去年苹果股票和iphone购买数量哪个增长更快
    ```json
-  {{
+  {
     "rationale": "为准确回答此对比增长问题，需要苹果股票表现和iPhone销售数据的具体指标。这些查询精确指向所需财务信息：公司收入趋势、产品具体销量数据和同期股价变动，以便直接对比。",
     "query": ["苹果2024财年总收入增长", "iPhone 2024财年销量增长", "苹果股票2024财年涨幅"],
-  }}
-  ```
+  }
+  ```"""
+
+query_writer_suffix_deepseek="""当前日期：{current_date}
+查询数量上限：{number_queries}
 
-  上下文：{research_topic}"""
+上下文：{research_topic}"""
 
 
-web_searcher_instructions_hybrid_deepseek="""
-执行针对性的网页搜索，若主题涉及临床试验或患者/试验相关详细信息，也可调用本地工具获取临床试验数据。将{current_date}设为当前所用日期。
+web_searcher_prefix_hybrid_deepseek="""
+执行针对性的网页搜索，若主题涉及临床试验或患者/试验相关详细信息，也可调用本地工具获取临床试验数据。
 
 指令：
--查询必须确保获取到最新消息。当前日期是{current_date}.
+-查询必须确保获取到最新消息，当前日期见末尾。
 -执行多次、不同方向的搜索以收集全面信息。
 -整理关键发现时，必须严格记录每条信息对应的来源。
 -输出内容应基于搜索结果撰写成结构良好的总结或报告。
 -只包含搜索结果中发现的信息，不得杜撰任何内容。
+"""
+
+# 分支规划模式：模型一次性给出全部工具调用，工具执行完分支即结束（见 web_research_planning）
+web_searcher_planning_prefix_deepseek=web_searcher_prefix_hybrid_deepseek+"""
+规划模式：
+-在这一次回复里一次性给出研究该主题所需的全部工具调用，可以同时调用多个工具，也可以用不同参数多次调用同一工具。
+-这些工具执行完后不会再有调用工具的机会，请覆盖主题的各个方面。
+-如果不需要任何工具，不要调用工具，直接回复"无需检索"。
+"""
+
+web_searcher_suffix_hybrid_deepseek="""当前日期：{current_date}
 
 研究主题：
 {research_topic}
@@ -64,8 +83,8 @@ Research Topic:
 
 
 ### 去掉    或需要更深入探讨的领域
-reflection_instructions_deepseek="""
-    你是一个专家研究助理，负责分析有关{research_topic}的摘要。
+reflection_prefix_deepseek="""
+    你是一个专家研究助理，负责分析末尾给出的研究主题的相关摘要。
 
     指令:
       -如果提供的摘要已足以回答用户的问题,则不要生成后续查询。
@@ -83,25 +102,28 @@ reflection_instructions_deepseek="""
       
     Example:
 ```json
-{{
+{
     "is_sufficient": true, // or false
     "knowledge_gap": "The summary lacks information about performance metrics and benchmarks", // "" if is_sufficient is true
     "follow_up_queries": ["What are typical performance benchmarks and metrics used to evaluate [specific technology]?"] // [] if is_sufficient is true
-}}
+}
 ```
 
-    请仔细反思所给的摘要以识别知识空白并生成后续查询。然后按照上述 JSON 格式输出：
+    请仔细反思所给的摘要以识别知识空白并生成后续查询。然后按照上述 JSON 格式输出。
+"""
+
+reflection_suffix_deepseek="""研究主题：{research_topic}
 
-    Summaries:
-    {summaries}
+Summaries:
+{summaries}
 """
 
 
-answer_instructions_deepseek="""
+answer_prefix_deepseek="""
     基于提供的摘要内容，为用户的问题生成高质量回答。
     
     指令：
-      -当前日期是{current_date}.
+      -当前日期见末尾。
       -你是一个多步骤研究流程中的最后一步，但不要在回答中提及这一点。
       -你可以访问前面步骤中收集的所有信息。
       -你可以访问用户提出的问题。
@@ -123,12 +145,62 @@ answer_instructions_deepseek="""
         * **在回答中包含本地结构化数据时，必须将其格式化为 Markdown 表格**，以便在前端正确渲染
       -网页搜索结果可以根据需要进行总结，但本地工具生成的数据必须保持详细和完整
       -不要编造引用
+"""
 
-    用户上下文：
-      {research_topic}
-      
-    摘要：
-      {summaries}
+answer_suffix_deepseek="""当前日期：{current_date}
+
+用户上下文：
+  {research_topic}
+  
+摘要：
+  {summaries}
+"""
+
+
+
+
+speculative_query_prefix_deepseek="""
+    你是一个研究助理，需要预测下一轮研究可能需要的后续搜索查询。
+
+    指令：
+      -根据研究主题和已执行的查询，推测哪些方面最可能还未被覆盖。
+      -生成的自洽（self-contained）后续搜索查询不超过末尾给出的数量上限。
+      -不要重复已执行的查询。
+
+    格式：
+      -将回复格式化为具有以下两个键的JSON对象：
+         -"rationale":简要说明预测理由
+         -"query":搜索查询的列表
+"""
+
+speculative_query_suffix_deepseek="""当前日期：{current_date}
+查询数量上限：{number_queries}
+
+研究主题：
+  {research_topic}
+
+已执行的查询：
+  {ran_queries}
 """
 
 
+synthesis_section_prefix_deepseek="""
+    你是一个研究助理，负责把一组研究摘要整理成最终报告中的一个部分草稿，之后会与其他部分合并成完整报告。
+
+    指令：
+      -只使用提供的摘要内容，不得杜撰任何信息。
+      -围绕用户的问题提炼关键发现，去掉重复和无关内容。
+      -必须原样保留每条信息的来源链接，使用 [来源标题](链接) 格式，不要改写或省略链接。
+      -本地结构化数据（如临床试验表格）必须完整保留，不要删除行、列、试验ID、药物名称、阶段或状态，并保持 Markdown 表格格式。
+      -网页搜索结果可以压缩总结，篇幅控制在末尾给出的字数上限以内。
+      -不要写引言和结论，直接输出该部分的要点。
+"""
+
+synthesis_section_suffix_deepseek="""字数上限：{max_chars}
+
+用户上下文：
+  {research_topic}
+
+摘要：
+  {summaries}
+"""
@@ -0,0 +1,159 @@
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   本地抽取式压缩（BM25）
+   web_research 返回的是 Tavily 原始 markdown，每条命中都带整页 content，
+   这些文本会原样进入 reflection、finalize_answer 的提示词以及每个 checkpoint。
+   👇主要逻辑：
+      1.按 web_search 的输出格式解析出标题行、正文、“来源：”行；
+      2.正文切分成句子，用 BM25 对分支的 search_query 打分（纯本地，无网络）；
+        分词（text_terms）和 BM25 打分（哈希特征稀疏矩阵）也供 agent.rerank 和查询相似度使用；
+      3.在目标字数内按得分挑选句子，再按原顺序拼回，每条命中的标题和来源行（引用锚点）始终保留；
+      4.本地临床试验表格等结构化数据不压缩。
+'''
+
+_CJK_RUN_RE = re.compile(r"[一-鿿]+")
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？!?])|(?<=\.)\s+")
+_HIT_TITLE_RE = re.compile(r"^\*\*\d+\.")
+_SOURCE_LINE = "来源："
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+N_FEATURES = 1 << 18
+
+
+def text_terms(text: str) -> List[str]:
+    """Tokenize text into latin words and CJK character bigrams (per contiguous CJK run)."""
+    text = text.lower()
+    terms = _WORD_RE.findall(text)
+    for run in _CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a paragraph into sentences on CJK and latin sentence punctuation."""
+    return [s.strip() for s in _SENTENCE_END_RE.split(text) if s and s.strip()]
+
+
+def term_feature(term: str) -> int:
+    """Return the hashed feature index of a term."""
+    return zlib.crc32(term.encode("utf-8")) % N_FEATURES
+
+
+def term_matrix(texts: List[str]) -> sparse.csr_matrix:
+    """Return the sparse (texts × hashed terms) term-count matrix."""
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        counts = {}
+        for term in text_terms(text):
+            feature = term_feature(term)
+            counts[feature] = counts.get(feature, 0) + 1
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+        shape=(len(texts), N_FEATURES),
+    )
+
+
+def bm25_idf(counts: sparse.csr_matrix) -> np.ndarray:
+    """Return the BM25 IDF of every hashed term over the rows of a term-count matrix."""
+    document_frequency = np.bincount(counts.indices, minlength=N_FEATURES)
+    n = counts.shape[0]
+    return np.log1p((n - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+
+def bm25_weights(counts: sparse.csr_matrix, idf: Optional[np.ndarray] = None) -> sparse.csr_matrix:
+    """Return the BM25 term weights (saturated term frequency × IDF) of a term-count matrix.
+
+    ``idf`` defaults to the statistics of the rows themselves.
+    """
+    weights = counts.copy()
+    idf = bm25_idf(counts) if idf is None else idf
+    doc_lengths = np.asarray(counts.sum(axis=1)).ravel()
+    avg_length = doc_lengths.mean() if len(doc_lengths) and doc_lengths.mean() else 1.0
+    row_lengths = np.repeat(doc_lengths, np.diff(counts.indptr))
+    tf = weights.data
+    weights.data = (
+        tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * row_lengths / avg_length))
+    ) * idf[weights.indices]
+    return weights
+
+
+def bm25_scores(query: str, documents: List[str]) -> List[float]:
+    """Score ``documents`` against ``query`` with BM25, using the documents themselves as the corpus."""
+    features = sorted({term_feature(term) for term in text_terms(query)})
+    if not features or not documents:
+        return [0.0] * len(documents)
+    weights = bm25_weights(term_matrix(documents))
+    return np.asarray(weights[:, features].sum(axis=1)).ravel().tolist()
+
+
+def compress_result(text: str, query: str, target_chars: int) -> str:
+    """Compress one ``web_search`` result text to about ``target_chars`` by extractive sentence selection.
+
+    Header lines, hit titles and ``来源：`` citation lines are always kept; texts
+    containing markdown tables (local structured data) are returned unchanged.
+    """
+    if len(text) <= target_chars or "\n|" in text:
+        return text
+
+    # 结构行（始终保留）与正文句子按原顺序排成一列，句子记录所属段落
+    items = []
+    for paragraph_id, line in enumerate(text.splitlines()):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith(("#", "查询：", _SOURCE_LINE)) or _HIT_TITLE_RE.match(stripped):
+            items.append((True, stripped, paragraph_id))
+        else:
+            items.extend((False, sentence, paragraph_id) for sentence in split_sentences(stripped))
+
+    kept_chars = sum(len(content) for keep, content, _ in items if keep)
+    candidates = [i for i, (keep, _, _) in enumerate(items) if not keep]
+    scores = bm25_scores(query, [items[i][1] for i in candidates])
+
+    selected = set()
+    budget = max(0, target_chars - kept_chars)
+    # 得分相同时优先保留靠前的句子
+    for score, i in sorted(zip(scores, candidates), key=lambda pair: (-pair[0], pair[1])):
+        if score <= 0 and selected:
+            break
+        length = len(items[i][1])
+        if length > budget:
+            continue
+        selected.add(i)
+        budget -= length
+
+    blocks, paragraph, current_id = [], [], None
+    for i, (keep, content, paragraph_id) in enumerate(items):
+        if paragraph and (keep or paragraph_id != current_id):
+            blocks.append(" ".join(paragraph))
+            paragraph = []
+        if keep:
+            blocks.append(content)
+        elif i in selected:
+            paragraph.append(content)
+            current_id = paragraph_id
+    if paragraph:
+        blocks.append(" ".join(paragraph))
+    return "\n\n".join(blocks) + "\n\n"
+
+
+def compress_results(texts: List[str], query: str, target_chars: int) -> List[str]:
+    """Compress each of ``texts`` with :func:`compress_result` (one call, for process offload)."""
+    return [compress_result(text, query, target_chars) for text in texts]
@@ -0,0 +1,143 @@
+import os
+from functools import lru_cache
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+from scipy import sparse
+
+from agent.logger import get_logger
+from agent.ranking import N_FEATURES, bm25_idf, bm25_weights, term_feature, term_matrix, text_terms
+
+logger = get_logger(__name__)
+
+'''
+   搜索命中的本地重排（稀疏矩阵 + 预计算 IDF）
+   web_search 以前按 Tavily 返回的顺序格式化所有结果，没有相关性过滤。
+   👇主要逻辑：
+      1.命中的标题+正文按哈希特征（latin 单词、CJK 二元组）构成稀疏词频矩阵，做 BM25 饱和后乘以 IDF
+        （与抽取式压缩共用 agent.ranking 的分词和 BM25 实现）；
+      2.IDF 优先使用 RERANK_IDF_PATH 指向的预计算文件（build_idf 生成），否则用本批命中现算；
+      3.与 查询 +（降权的）研究主题 的打分一次稀疏矩阵乘法得到，按最高分归一化；
+      4.丢弃相对得分低于阈值的命中、同一域名下词频余弦相似度过高的近似重复页面，每个分支保留 top-k；
+        只在命中层面排序和过滤，命中内部的段落（包括抽取式压缩保留的句子）保持原文顺序。
+   默认关闭；运行配置 rerank_top_k 大于 0 时开启，rerank_min_score、rerank_duplicate_threshold 控制过滤，
+   预计算 IDF 文件由环境变量 RERANK_IDF_PATH 指定。
+'''
+
+def build_idf(documents: List[str], path: Optional[str] = None) -> np.ndarray:
+    """Compute BM25 IDF statistics over ``documents``; save them to ``path`` (``.npz``) if given.
+
+    Point ``RERANK_IDF_PATH`` at the saved file to rerank with corpus-wide statistics.
+    """
+    idf = bm25_idf(term_matrix(documents))
+    if path:
+        np.savez_compressed(path, idf=idf, documents=len(documents))
+    return idf
+
+
+@lru_cache(maxsize=1)
+def load_idf() -> Optional[np.ndarray]:
+    """Return the precomputed IDF array from ``RERANK_IDF_PATH``, or None."""
+    path = os.getenv("RERANK_IDF_PATH")
+    if not path:
+        return None
+    with np.load(path) as data:
+        idf = data["idf"]
+    logger.info(f"已加载预计算IDF:{path}")
+    return idf
+
+
+def _domain(url: str) -> str:
+    netloc = urlparse(url or "").netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+class HitReranker:
+    """Score search hits against the query and research topic and keep the best ones.
+
+    Args:
+        top_k: Maximum number of hits kept (0 keeps every hit in its original order).
+        min_score: Minimum score relative to the best hit (0-1) for a hit to be kept.
+        duplicate_threshold: Cosine similarity above which a hit from an already kept domain is dropped.
+        topic_weight: Weight of the research topic terms relative to the query terms.
+        idf: Precomputed IDF array; computed from the hits themselves when None.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 5,
+        min_score: float = 0.2,
+        duplicate_threshold: float = 0.85,
+        topic_weight: float = 0.3,
+        idf: Optional[np.ndarray] = None,
+    ):
+        self.top_k = top_k
+        self.min_score = min_score
+        self.duplicate_threshold = duplicate_threshold
+        self.topic_weight = topic_weight
+        self.idf = idf
+
+    def _query_vector(self, query: str, research_topic: str) -> np.ndarray:
+        vector = np.zeros(N_FEATURES, dtype=np.float32)
+        if research_topic and self.topic_weight:
+            vector[[term_feature(t) for t in set(text_terms(research_topic))]] = self.topic_weight
+        query_features = [term_feature(t) for t in set(text_terms(query))]
+        vector[query_features] = 1.0
+        return vector
+
+    def rerank(self, hits: List[dict], query: str, research_topic: str = "") -> List[dict]:
+        """Return the kept hits, best first."""
+        if not self.top_k or len(hits) <= 1:
+            return hits
+        texts = [f"{hit.get('title', '')} {hit.get('content', '')}" for hit in hits]
+        counts = term_matrix(texts)
+        weights = bm25_weights(counts, self.idf)
+        scores = weights @ self._query_vector(query, research_topic)
+        best = scores.max()
+        if best <= 0:
+            # 与查询没有任何词重叠时不做过滤，保持原顺序
+            return hits[: self.top_k]
+        relative = scores / best
+
+        # 近似重复用原始词频的余弦相似度判断，不受 IDF 中罕见词的影响
+        norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+        normalized = sparse.diags(1 / np.where(norms > 0, norms, 1)) @ counts
+        similarity = (normalized @ normalized.T).toarray()
+        domains = [_domain(hit.get("url", "")) for hit in hits]
+
+        kept = []
+        for i in np.argsort(-relative, kind="stable"):
+            if kept and relative[i] < self.min_score:
+                break
+            if any(
+                domains[i] and domains[i] == domains[j] and similarity[i, j] >= self.duplicate_threshold
+                for j in kept
+            ):
+                continue
+            kept.append(i)
+            if len(kept) >= self.top_k:
+                break
+        return [hits[i] for i in kept]
+
+
+def rerank_settings(configurable) -> Optional[dict]:
+    """Return the reranker settings of a run, or None when ``rerank_top_k`` is 0 (reranking off)."""
+    if not configurable.rerank_top_k:
+        return None
+    return {
+        "top_k": configurable.rerank_top_k,
+        "min_score": configurable.rerank_min_score,
+        "duplicate_threshold": configurable.rerank_duplicate_threshold,
+    }
+
+
+@lru_cache(maxsize=8)
+def get_hit_reranker(top_k: int, min_score: float = 0.2, duplicate_threshold: float = 0.85) -> HitReranker:
+    """Return the shared reranker for these settings, with the precomputed IDF when configured."""
+    return HitReranker(
+        top_k=top_k,
+        min_score=min_score,
+        duplicate_threshold=duplicate_threshold,
+        idf=load_idf(),
+    )
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from agent.logger import get_logger
+from agent.paths import data_path
+from agent.speculative import query_tokens
+
+logger = get_logger(__name__)
+
+'''
+   跨运行的研究记忆（research memory）
+   每次运行都从零开始，昨天50次关于"PD-1 inhibitors"的研究对今天没有帮助。
+   👇主要逻辑：
+      1.finalize_answer 时把本次运行的 web_research_result 切块，连同对应的
+        sources_gathered、哈希向量（hashing vectors，无需模型）和时间戳写入本地SQLite；
+      2.向量用随机超平面LSH分桶，每张哈希表一列并建索引，检索时只取同桶候选，
+        同桶候选全部分批用numpy精确计算余弦相似度（不按时间截断），只保留前 k 个再读取正文，可扩展到百万级切块；
+      3.generate_query 派发搜索前检索足够新鲜（TTL内）的匹配切块，
+        已被充分覆盖的查询直接跳过，复用记忆中的切块。
+'''
+
+_URL_RE = re.compile(r"https?://[^\s)\]>|]+")
+_QUERY_RE = re.compile(r"^查询：(.+)$", re.MULTILINE)
+
+
+class HashingEmbedder:
+    """Embed text into a fixed-size L2-normalized vector via signed feature hashing."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        """Return the hashing vector of ``text``."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in query_tokens(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class ResearchMemory:
+    """Persistent store of research chunks with an LSH approximate-nearest-neighbour index.
+
+    Args:
+        path: SQLite database file (default: ``research_memory.sqlite3`` in the data directory).
+        dim: Dimension of the hashing vectors.
+        num_tables: Number of LSH hash tables (more tables raise recall).
+        num_bits: Hyperplanes per table (more bits make buckets smaller).
+        scan_batch: Number of bucket candidates scored per batch; every candidate is scored.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        dim: int = 256,
+        num_tables: int = 16,
+        num_bits: int = 8,
+        scan_batch: int = 2000,
+    ):
+        self.path = Path(path) if path else data_path("research_memory.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.embedder = HashingEmbedder(dim)
+        self.num_tables = num_tables
+        self.scan_batch = scan_batch
+        # 固定随机种子，保证进程重启后分桶一致
+        rng = np.random.default_rng(20251118)
+        self._planes = rng.standard_normal((num_tables, num_bits, dim)).astype(np.float32)
+        self._bit_weights = 1 << np.arange(num_bits)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        bucket_columns = ", ".join(f"b{i} INTEGER" for i in range(self.num_tables))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    digest TEXT UNIQUE,
+                    created_at REAL,
+                    query TEXT,
+                    text TEXT,
+                    sources TEXT,
+                    vector BLOB,
+                    {bucket_columns}
+                )"""
+            )
+            for i in range(self.num_tables):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_b{i} ON chunks (b{i})")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON chunks (created_at)")
+
+    def _buckets(self, vector: np.ndarray) -> List[int]:
+        bits = (self._planes @ vector) > 0
+        return [int(b) for b in bits @ self._bit_weights]
+
+    def _chunk_vector(self, query: str, text: str) -> np.ndarray:
+        # 查询本身权重更高：切块正文很长，单独用正文向量与短查询的相似度会被稀释
+        vector = 0.7 * self.embedder.embed(query) + 0.3 * self.embedder.embed(text)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, chunks: List[dict]) -> int:
+        """Persist chunks of the form ``{"query", "text", "sources"}``; return the number added."""
+        now = time.time()
+        rows = []
+        for chunk in chunks:
+            text = chunk["text"]
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            vector = self._chunk_vector(chunk.get("query", ""), text)
+            rows.append(
+                (
+                    digest,
+                    now,
+                    chunk.get("query", ""),
+                    text,
+                    json.dumps(chunk.get("sources", []), ensure_ascii=False),
+                    vector.tobytes(),
+                    *self._buckets(vector),
+                )
+            )
+        columns = ", ".join(f"b{i}" for i in range(self.num_tables))
+        placeholders = ", ".join("?" * (6 + self.num_tables))
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO chunks (digest, created_at, query, text, sources, vector, {columns}) "
+                f"VALUES ({placeholders})",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def search(self, query: str, k: int = 5, max_age_seconds: Optional[float] = None) -> List[dict]:
+        """Return up to ``k`` fresh chunks most similar to ``query``, each with a ``score``."""
+        vector = self.embedder.embed(query)
+        buckets = self._buckets(vector)
+        where = " OR ".join(f"b{i} = ?" for i in range(self.num_tables))
+        params: list = list(buckets)
+        sql = f"SELECT id, vector FROM chunks WHERE ({where})"
+        if max_age_seconds is not None:
+            sql += " AND created_at >= ?"
+            params.append(time.time() - max_age_seconds)
+
+        # 同桶候选全部打分，分批读取向量，只保留当前最好的 k 个，内存与候选数无关
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(self.scan_batch)
+                if not rows:
+                    break
+                matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+                ids = np.concatenate([best_ids, np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))])
+                scores = np.concatenate([best_scores, matrix @ vector])
+                keep = np.argsort(-scores, kind="stable")[:k]
+                best_ids, best_scores = ids[keep], scores[keep]
+            if not len(best_ids):
+                return []
+            placeholders = ", ".join("?" * len(best_ids))
+            details = {
+                row[0]: row[1:]
+                for row in self._conn.execute(
+                    f"SELECT id, query, text, sources, created_at FROM chunks WHERE id IN ({placeholders})",
+                    [int(i) for i in best_ids],
+                )
+            }
+        return [
+            {
+                "query": details[int(i)][0],
+                "text": details[int(i)][1],
+                "sources": json.loads(details[int(i)][2]),
+                "created_at": details[int(i)][3],
+                "score": float(score),
+            }
+            for i, score in zip(best_ids, best_scores)
+            if int(i) in details
+        ]
+
+    def purge_expired(self, max_age_seconds: float) -> int:
+        """Delete chunks older than ``max_age_seconds``; return the number deleted."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM chunks WHERE created_at < ?", (time.time() - max_age_seconds,)
+            )
+            return cursor.rowcount
+
+
+@lru_cache(maxsize=None)
+def get_research_memory(path: Optional[str] = None) -> ResearchMemory:
+    """Return the shared research memory for ``path`` (default: ``RESEARCH_MEMORY_PATH`` or the data directory)."""
+    return ResearchMemory(path or os.getenv("RESEARCH_MEMORY_PATH"))
+
+
+def split_chunks(text: str, sources: List[dict], query: str = "", max_chars: int = 1500) -> List[dict]:
+    """Split a research result into paragraph chunks and attach the sources each chunk cites."""
+    chunks, buffer = [], ""
+    for paragraph in text.split("\n\n"):
+        if buffer and len(buffer) + len(paragraph) > max_chars:
+            chunks.append(buffer)
+            buffer = ""
+        buffer = f"{buffer}\n\n{paragraph}" if buffer else paragraph
+    if buffer.strip():
+        chunks.append(buffer)
+
+    by_url = {source["value"]: source for source in sources if source.get("value")}
+    return [
+        {
+            "query": query,
+            "text": chunk,
+            "sources": [by_url[url] for url in dict.fromkeys(_URL_RE.findall(chunk)) if url in by_url],
+        }
+        for chunk in chunks
+    ]
+
+
+def remember_research(
+    memory: ResearchMemory, research_topic: str, results: List[str], sources: List[dict]
+) -> int:
+    """Persist a finished run's research results; return the number of new chunks."""
+    chunks = []
+    for text in results:
+        # web_search 的结果头部记录了实际查询，优先用它作为切块的查询
+        match = _QUERY_RE.search(text)
+        query = match.group(1).strip() if match else research_topic
+        chunks.extend(split_chunks(text, sources, query=query))
+    added = memory.add(chunks)
+    logger.info(f"🧠研究记忆|写入{added}个新切块（共{len(chunks)}个）")
+    return added
+
+
+def recall_for_queries(
+    memory: ResearchMemory,
+    queries: List[str],
+    max_age_seconds: float,
+    min_score: float,
+    min_chunks: int,
+) -> dict:
+    """Split queries into ones already well covered by fresh memory and ones still to search.
+
+    Returns:
+        Dict with ``queries`` (still to search), ``covered`` (skipped queries),
+        ``texts`` and ``sources`` recalled for the covered queries.
+    """
+    remaining, covered, texts, sources = [], [], [], []
+    seen_texts = set()
+    for query in queries:
+        hits = [
+            hit
+            for hit in memory.search(query, k=max(min_chunks, 5), max_age_seconds=max_age_seconds)
+            if hit["score"] >= min_score
+        ]
+        if len(hits) < min_chunks:
+            remaining.append(query)
+            continue
+        covered.append(query)
+        for hit in hits:
+            if hit["text"] in seen_texts:
+                continue
+            seen_texts.add(hit["text"])
+            recalled_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["created_at"]))
+            texts.append(f"### 研究记忆（{recalled_at}，查询：{query}）\n\n{hit['text']}")
+            sources.extend(hit["sources"])
+        logger.info(f"🧠研究记忆|查询'{query}'已被{len(hits)}个新鲜切块覆盖，跳过搜索")
+    return {"queries": remaining, "covered": covered, "texts": texts, "sources": sources}
@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   相同在途请求的单飞（single-flight）合并
+   多个 fan-out 分支或多个并发运行同时发起同一个 web_search 查询 / 同一组临床筛选条件时，
+   每个调用都会单独请求 Tavily 或内部临床接口。
+   👇主要逻辑：
+      1.按键登记在途调用：第一个调用者（leader）真正发起上游请求，其余调用者等待同一个结果；
+      2.上游返回或抛出异常后，结果/异常分发给所有等待者，随即注销，不做缓存（缓存由 TTLCache 负责）；
+      3.等待者用 concurrent.futures.Future 等待，最多等调用方自己的请求超时时间，超时后不再等 leader，
+        直接自己发起请求（计入 timeouts），leader 卡住不会拖住所有等待者；
+        web_search 和临床工具都在同步节点里调用，只提供同步接口。
+'''
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls into one upstream call.
+
+    Args:
+        name: Name used in logs and stats.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._stats = {"calls": 0, "upstream": 0, "coalesced": 0, "timeouts": 0}
+
+    def do(
+        self, key: Hashable, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs
+    ) -> Any:
+        """Run ``fn(*args, **kwargs)`` unless a call with ``key`` is in flight; then share its result.
+
+        A waiter gives up on the in-flight call after ``timeout`` seconds (the caller's own
+        request timeout) and calls ``fn`` directly instead.
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self._stats["upstream"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            logger.info(f"🛫{self.name}|合并在途请求:{key}")
+            try:
+                return future.result(timeout)
+            except FutureTimeoutError:
+                # leader 自己抛出的超时异常照常传给等待者
+                if future.done():
+                    raise
+            with self._lock:
+                self._stats["timeouts"] += 1
+            logger.info(f"🛫{self.name}|等待在途请求超过{timeout}s，改为直接请求:{key}")
+            return fn(*args, **kwargs)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> dict:
+        """Return call counters and the share of calls served by another caller's request."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["coalesced_rate"] = stats["coalesced"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
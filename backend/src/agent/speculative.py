@@ -0,0 +1,171 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent.logger import get_logger
+from agent.ranking import text_terms
+
+logger = get_logger(__name__)
+
+'''
+   推测式预取（speculative prefetch）
+   reflection 节点调用模型期间，搜索能力处于空闲状态。
+   👇主要逻辑：
+      1.reflection 开始时，用小模型/启发式预测可能的 follow-up 查询；
+      2.并行地把这些查询的 web_search 结果预取到本次运行的缓存中；
+      3.evaluate_research 派发真正的 follow-up 后，web_research 调用 web_search 时
+        先查缓存，相似度足够即直接使用（命中），否则正常搜索；
+      4.预取按轮次登记，只有同一轮派发的 follow-up 能使用；未被使用的预取在下一轮 reflection
+        或 finalize_answer 时丢弃，计为浪费，之后才完成预测的上一轮预取直接忽略。
+'''
+
+def query_tokens(query: str) -> set:
+    """Tokenize a search query into a set of latin words and CJK character bigrams (see ``text_terms``)."""
+    return set(text_terms(query))
+
+
+def query_similarity(a: str, b: str) -> float:
+    """Return the Jaccard similarity between the token sets of two queries."""
+    tokens_a, tokens_b = query_tokens(a), query_tokens(b)
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+class SpeculativePrefetcher:
+    """Run-local cache of speculatively prefetched ``web_search`` results.
+
+    Args:
+        search_fn: Callable executing one search for a query string.
+        match_threshold: Minimum query similarity for a prefetch to be reused.
+        max_workers: Number of concurrent prefetch searches.
+    """
+
+    def __init__(
+        self,
+        search_fn: Callable[[str], dict],
+        match_threshold: float = 0.6,
+        max_workers: int = 4,
+    ):
+        self._search_fn = search_fn
+        self._match_threshold = match_threshold
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="speculative"
+        )
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[int, str], Future] = {}
+        self._loop = 0
+        self.stats = {"prefetched": 0, "hits": 0, "misses": 0, "wasted": 0}
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Run an arbitrary callable (e.g. the query predictor) on the prefetch pool."""
+        return self._executor.submit(fn, *args)
+
+    def prefetch(self, queries: List[str], loop: int = 0) -> None:
+        """Start background searches for the follow-ups predicted for research loop ``loop``.
+
+        Predictions for a loop already discarded by ``discard_unused`` are ignored.
+        """
+        with self._lock:
+            if loop < self._loop:
+                logger.info(f"🔮推测预取|第{loop}轮的预测已过期，忽略:{queries}")
+                return
+            for query in queries:
+                if not query or (loop, query) in self._entries:
+                    continue
+                self._entries[(loop, query)] = self._executor.submit(self._search_fn, query)
+                self.stats["prefetched"] += 1
+        logger.info(f"🔮推测预取|已提交{len(queries)}个预测查询:{queries}")
+
+    def take(self, query: str, loop: int = 0) -> Optional[dict]:
+        """Pop and return the prefetched result of loop ``loop`` best matching ``query``, if any.
+
+        Blocks until that prefetch finishes if it is still in flight. Returns
+        ``None`` on a miss or when the prefetch itself failed.
+        """
+        with self._lock:
+            best_query, best_score = None, 0.0
+            for entry_loop, candidate in self._entries:
+                if entry_loop != loop:
+                    continue
+                score = query_similarity(query, candidate)
+                if score > best_score:
+                    best_query, best_score = candidate, score
+            if best_query is None or best_score < self._match_threshold:
+                self.stats["misses"] += 1
+                return None
+            future = self._entries.pop((loop, best_query))
+
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.info(f"🔮推测预取|预取查询'{best_query}'失败，回退实时搜索:{e}")
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+        logger.info(
+            f"🔮推测预取|命中:'{query}'≈'{best_query}'(similarity={best_score:.2f})"
+        )
+        return result
+
+    def discard_unused(self, loop: Optional[int] = None) -> int:
+        """Drop all prefetches that were not consumed and count them as wasted.
+
+        With ``loop``, later predictions for earlier loops are ignored by ``prefetch``.
+        """
+        with self._lock:
+            unused = list(self._entries.values())
+            self._entries.clear()
+            if loop is not None:
+                self._loop = max(self._loop, loop)
+            self.stats["wasted"] += len(unused)
+        for future in unused:
+            future.cancel()
+        return len(unused)
+
+    def report(self) -> dict:
+        """Return a snapshot of the prefetch metrics including the hit rate."""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["wasted_rate"] = (
+            stats["wasted"] / stats["prefetched"] if stats["prefetched"] else 0.0
+        )
+        return stats
+
+    def close(self) -> None:
+        """Discard pending work and shut the prefetch pool down."""
+        self.discard_unused()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_registry: Dict[str, SpeculativePrefetcher] = {}
+_registry_lock = threading.Lock()
+
+
+def get_prefetcher(
+    run_key: str,
+    search_fn: Optional[Callable[[str], dict]] = None,
+    match_threshold: float = 0.6,
+) -> Optional[SpeculativePrefetcher]:
+    """Return the prefetcher of a run, creating it when ``search_fn`` is given."""
+    with _registry_lock:
+        prefetcher = _registry.get(run_key)
+        if prefetcher is None and search_fn is not None:
+            prefetcher = SpeculativePrefetcher(search_fn, match_threshold)
+            _registry[run_key] = prefetcher
+        return prefetcher
+
+
+def release_prefetcher(run_key: str) -> Optional[dict]:
+    """Close the prefetcher of a finished run and return its final metrics."""
+    with _registry_lock:
+        prefetcher = _registry.pop(run_key, None)
+    if prefetcher is None:
+        return None
+    prefetcher.close()
+    return prefetcher.report()
@@ -10,24 +10,83 @@ from typing_extensions import Annotated
 import operator
 
 
+def add_budget(left: dict | None, right: dict | None) -> dict:
+    # 带 run_started_at 的更新表示新一次运行开始，重置累计用量；否则累加 token/费用
+    if not right:
+        return left or {}
+    if "run_started_at" in right or not left:
+        return dict(right)
+    return {
+        **left,
+        "tokens": left.get("tokens", 0) + right.get("tokens", 0),
+        "cost": left.get("cost", 0.0) + right.get("cost", 0.0),
+    }
+
+
+def add_or_replace(left: list | None, right) -> list:
+    # {"replace": [...]} 表示内存软上限压缩后整体替换（见 agent.memory_guard）；否则按列表拼接
+    if isinstance(right, dict) and "replace" in right:
+        return list(right["replace"])
+    return (left or []) + (right or [])
+
+
+def merge_memory(left: dict | None, right: dict | None) -> dict:
+    # 带 run_started_at 的记录表示新一次运行开始；否则保留状态大小和各节点内存增长的峰值
+    if not right:
+        return left or {}
+    if "run_started_at" in right or not left:
+        return dict(right)
+    merged = dict(left)
+    if right.get("state_peak_bytes", 0) >= left.get("state_peak_bytes", 0):
+        merged["state_peak_bytes"] = right.get("state_peak_bytes", 0)
+        merged["largest_fields"] = right.get("largest_fields", {})
+    nodes = dict(left.get("node_peak_bytes") or {})
+    for node, peak in (right.get("node_peak_bytes") or {}).items():
+        nodes[node] = max(nodes.get(node, 0), peak)
+    merged["node_peak_bytes"] = nodes
+    merged["soft_limit_actions"] = left.get("soft_limit_actions", 0) + right.get("soft_limit_actions", 0)
+    return merged
+
+
+def add_counts(left: dict | None, right: dict | None) -> dict:
+    # 带 run_started_at 的更新表示新一次运行开始，重置计数；否则按键累加
+    if not right:
+        return left or {}
+    if "run_started_at" in right or not left:
+        return dict(right)
+    merged = dict(left)
+    for key, value in right.items():
+        merged[key] = merged.get(key, 0) + value
+    return merged
+
+
 class OverallState(TypedDict):
     messages: Annotated[list, add_messages]
     generated_query:list[str]
     search_query: Annotated[list, operator.add]
-    web_research_result: Annotated[list, operator.add]
-    sources_gathered: Annotated[list, operator.add]
+    web_research_result: Annotated[list, add_or_replace]
+    sources_gathered: Annotated[list, add_or_replace]
     initial_search_query_count: int
     max_research_loops: int
     research_loop_count: int
     reasoning_model: str
+    budget: Annotated[dict, add_budget]
+    answer_cache_hit: bool
+    memory: Annotated[dict, merge_memory]
+    stragglers: Annotated[dict, add_counts]
+    run_id: str
 
 
 class ReflectionState(TypedDict):
+    messages: Annotated[list, add_messages]
     is_sufficient: bool
     knowledge_gap: str
     follow_up_queries: Annotated[list, operator.add]
     research_loop_count: int
     number_of_ran_queries: int
+    max_research_loops: int
+    budget: Annotated[dict, add_budget]
+    run_id: str
 
 
 class Query(TypedDict):
@@ -42,6 +101,12 @@ class QueryGenerationState(TypedDict):
 class WebSearchState(TypedDict):
     search_query: str
     id: str
+    research_loop_count: int
+    research_topic: str
+    budget: Annotated[dict, add_budget]
+    loop_branches: int
+    loop_started_at: float
+    run_id: str
 
 
 @dataclass(kw_only=True)
@@ -0,0 +1,257 @@
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent.logger import get_logger
+from agent.profiling import profile_worker
+
+logger = get_logger(__name__)
+
+'''
+   掉队分支截止：reflection 不必等最慢的 web_research 分支
+   web_research → reflection 的汇合边要等本轮所有分支结束，一次慢的 Tavily 或临床接口调用会拖住整轮。
+   👇主要逻辑：
+      1.派发分支时在 Send 里带上本轮分支数 loop_branches、本轮开始时间 loop_started_at 和运行 id，
+        每轮的截止状态按（运行 id, 轮次）登记，并发运行（包括没有线程的 graph.invoke）互不影响；
+      2.开启截止策略后，web_research 节点把分支放到后台线程执行，节点线程等待以下任一条件：
+        - 分支完成：正常返回结果，并计入本轮已完成数；
+        - 本轮已完成数达到 straggler_quorum 个或 straggler_fraction 比例后，又过了 straggler_grace_seconds；
+        - 距本轮开始超过 straggler_timeout_seconds；
+      3.被截止的分支（掉队分支）立即返回空结果，汇合边不再等它；后台线程继续执行：
+        - fold：结果在下一次 reflection 或 finalize_answer 开始时并入 web_research_result / sources_gathered；
+        - cancel：通知分支在下一轮工具调用前停止，结果丢弃（已消耗的 token 仍计入预算）；
+        finalize_answer 时仍未完成的分支直接丢弃，计为 dropped；
+      4.每次运行的截止、并入、取消、丢弃次数和节省的等待时间（分支实际完成时间减去截止时间，
+        未完成的按 finalize 时刻计）写入状态的 stragglers 字段，finalize_answer 打印日志。
+   分布式模式（distributed_web_research）下 cancel 无法通知到工作进程，只丢弃结果。
+'''
+
+MAX_ACTIVE_LOOPS = 256
+
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    "straggler_cancel_event", default=None
+)
+
+
+def branch_cancelled() -> bool:
+    """Return whether the calling web_research branch was cut off with the ``cancel`` action."""
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def straggler_cutoff_enabled(configurable) -> bool:
+    """Return whether any straggler cutoff condition is configured."""
+    return bool(
+        configurable.straggler_quorum
+        or configurable.straggler_fraction
+        or configurable.straggler_timeout_seconds
+    )
+
+
+class LoopCutoff:
+    """Completion tracking and cutoff deadline of the web_research branches of one loop.
+
+    Args:
+        total: Number of branches dispatched in the loop.
+        started_at: Wall-clock time the loop was dispatched.
+        quorum: Finished branches that start the grace period (0 = off).
+        fraction: Fraction of finished branches that starts the grace period (0 = off).
+        timeout: Seconds after ``started_at`` when remaining branches are cut (0 = off).
+        grace: Seconds the remaining branches get once the quorum is reached.
+    """
+
+    def __init__(self, total: int, started_at: float, quorum: int, fraction: float, timeout: float, grace: float):
+        self.total = max(1, total)
+        self.started_at = started_at
+        self.timeout = timeout
+        self.grace = grace
+        required = []
+        if quorum:
+            required.append(min(quorum, self.total))
+        if fraction:
+            required.append(max(1, math.ceil(fraction * self.total)))
+        self.required = min(required) if required else None
+        self.done = 0
+        self.quorum_at: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def mark_done(self) -> None:
+        with self._cond:
+            self.done += 1
+            if self.required and self.done >= self.required and self.quorum_at is None:
+                self.quorum_at = time.time()
+            self._cond.notify_all()
+
+    def notify(self, _future=None) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, future: Future) -> Optional[str]:
+        """Block until ``future`` finishes (return None) or the branch is cut (return the reason)."""
+        future.add_done_callback(self.notify)
+        with self._cond:
+            while not future.done():
+                now = time.time()
+                deadlines = []
+                if self.timeout:
+                    deadline = self.started_at + self.timeout
+                    if now >= deadline:
+                        return "timeout"
+                    deadlines.append(deadline)
+                # 本轮只有一个分支时不存在"其他分支已完成"，只看超时
+                if self.quorum_at is not None and self.total > 1:
+                    deadline = self.quorum_at + self.grace
+                    if now >= deadline:
+                        return "quorum"
+                    deadlines.append(deadline)
+                self._cond.wait(min(deadlines) - now if deadlines else None)
+        return None
+
+
+class LateBranch:
+    """A web_research branch that was cut off and keeps running in the background."""
+
+    def __init__(self, query: str, future: Future, action: str, cut_at: float):
+        self.query = query
+        self.future = future
+        self.action = action
+        self.cut_at = cut_at
+        self.finished_at: Optional[float] = None
+        future.add_done_callback(self._finish)
+
+    def _finish(self, _future) -> None:
+        self.finished_at = time.time()
+
+
+_lock = threading.Lock()
+_loops: "OrderedDict[Tuple[str, int], LoopCutoff]" = OrderedDict()
+_late: Dict[str, List[LateBranch]] = {}
+
+
+def get_loop_cutoff(run_key: str, loop: int, total: int, started_at: float, configurable) -> LoopCutoff:
+    """Return the cutoff tracker of a run's research loop, creating it for the loop's first branch."""
+    key = (run_key, loop)
+    with _lock:
+        cutoff = _loops.get(key)
+        if cutoff is None:
+            cutoff = _loops[key] = LoopCutoff(
+                total,
+                started_at,
+                configurable.straggler_quorum,
+                configurable.straggler_fraction,
+                configurable.straggler_timeout_seconds,
+                configurable.straggler_grace_seconds,
+            )
+            # 异常中断的运行不会释放，只保留最近的若干轮
+            while len(_loops) > MAX_ACTIVE_LOOPS:
+                (evicted, _), _ = _loops.popitem(last=False)
+                if not any(key[0] == evicted for key in _loops):
+                    _late.pop(evicted, None)
+        return cutoff
+
+
+def run_with_cutoff(fn: Callable[[], tuple], run_key: str, state: dict, configurable) -> Optional[tuple]:
+    """Run a web_research branch under its loop's cutoff policy.
+
+    Returns the ``(update, progress)`` of ``fn``, or None when the branch was cut off.
+    """
+    loop = state.get("research_loop_count", 0)
+    cutoff = get_loop_cutoff(
+        run_key, loop, state.get("loop_branches") or 1, state.get("loop_started_at") or time.time(), configurable
+    )
+    cancel = threading.Event()
+    future: Future = Future()
+
+    def target():
+        _cancel_event.set(cancel)
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    # 复制上下文，分支线程里仍能取到本次运行的 config 和流式写入器
+    context = contextvars.copy_context()
+    threading.Thread(
+        target=context.run, args=(profile_worker(target),), name="web-research-branch", daemon=True
+    ).start()
+    reason = cutoff.wait(future)
+    if reason is None:
+        cutoff.mark_done()
+        return future.result()
+
+    action = configurable.straggler_action
+    if action == "cancel":
+        cancel.set()
+    with _lock:
+        _late.setdefault(run_key, []).append(LateBranch(state["search_query"], future, action, time.time()))
+    logger.info(
+        f"任务{state.get('id')}|⏱️掉队分支截止({reason})|loop={loop},已完成{cutoff.done}/{cutoff.total},"
+        f"处理方式={action},query={state['search_query']}"
+    )
+    return None
+
+
+def collect_late_branches(run_key: str, final: bool = False) -> dict:
+    """Take the finished late branches of a run and return the state update folding them in.
+
+    With ``final`` (finalize_answer), branches still running are dropped.
+    """
+    with _lock:
+        late = _late.pop(run_key, [])
+        if not final:
+            pending = [branch for branch in late if not branch.future.done()]
+            if pending:
+                _late[run_key] = pending
+            late = [branch for branch in late if branch.future.done()]
+    if not late:
+        return {}
+
+    now = time.time()
+    texts, sources = [], []
+    usage = {"tokens": 0, "cost": 0.0}
+    stats = {"folded": 0, "cancelled": 0, "dropped": 0, "saved_seconds": 0.0}
+    for branch in late:
+        stats["saved_seconds"] += (branch.finished_at or now) - branch.cut_at
+        if not branch.future.done() or branch.future.exception() is not None:
+            stats["dropped"] += 1
+            continue
+        update, _ = branch.future.result()
+        branch_usage = update.get("budget") or {}
+        usage["tokens"] += branch_usage.get("tokens", 0)
+        usage["cost"] += branch_usage.get("cost", 0.0)
+        if branch.action == "cancel":
+            stats["cancelled"] += 1
+            continue
+        stats["folded"] += 1
+        texts.extend(update.get("web_research_result") or [])
+        sources.extend(update.get("sources_gathered") or [])
+    logger.info(
+        f"⏱️掉队分支|并入{stats['folded']}个,取消{stats['cancelled']}个,丢弃{stats['dropped']}个,"
+        f"节省等待{stats['saved_seconds']:.1f}s"
+    )
+    return {"web_research_result": texts, "sources_gathered": sources, "budget": usage, "stragglers": stats}
+
+
+def fold_late_branches(state: dict, run_key: str, final: bool = False) -> Tuple[dict, dict]:
+    """Return ``state`` with finished late branches appended, and the update that persists them."""
+    update = collect_late_branches(run_key, final)
+    if not update:
+        return state, {}
+    state = {
+        **state,
+        "web_research_result": list(state.get("web_research_result") or []) + update["web_research_result"],
+        "sources_gathered": list(state.get("sources_gathered") or []) + update["sources_gathered"],
+    }
+    return state, update
+
+
+def release_loop_cutoffs(run_key: str) -> None:
+    """Forget the loop trackers and the unfolded late branches of a finished or failed run."""
+    with _lock:
+        for key in [key for key in _loops if key[0] == run_key]:
+            del _loops[key]
+        _late.pop(run_key, None)
@@ -0,0 +1,107 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from agent.budget import sum_usage, usage_from_message
+from agent.clients import get_deepseek_llm
+from agent.context import estimate_tokens
+from agent.logger import get_logger
+from agent.prompt_layout import build_prompt, prompt_cache_stats
+from agent.profiling import profile_worker
+from agent.prompts import synthesis_section_prefix_deepseek, synthesis_section_suffix_deepseek
+
+logger = get_logger(__name__)
+
+'''
+   finalize_answer 的分层（map-reduce）综合
+   高强度运行的 web_research_result 可能有几十段，一次性塞进 answer 提示词又慢又容易超出上下文。
+   👇主要逻辑：
+      1.按子问题（摘要里的“查询：”行）分组，再按 token 大小装箱，每组不超过 synthesis_group_tokens；
+      2.每组并行交给快速模型写成报告的一个部分草稿，保留 [标题](链接) 引用和本地表格；
+      3.草稿合计仍超过阈值时再做一轮，直到能放进一次 answer 调用；
+      4.最终由 answer 模型基于这些草稿合并成完整报告，提示词大小有上界。
+'''
+
+_QUERY_RE = re.compile(r"^查询：(.+)$", re.MULTILINE)
+MAX_LEVELS = 3
+
+
+def summary_key(summary: str) -> str:
+    """Return the sub-question a summary belongs to: its query line, or its heading."""
+    match = _QUERY_RE.search(summary)
+    if match:
+        return match.group(1).strip()
+    return summary.split("\n", 1)[0].strip()
+
+
+def group_summaries(summaries: List[str], max_tokens: int) -> List[List[str]]:
+    """Group summaries by sub-question, then pack the groups into bins of about ``max_tokens``.
+
+    Summaries of one sub-question stay together unless they alone exceed the bin size.
+    """
+    by_key = {}
+    for summary in summaries:
+        by_key.setdefault(summary_key(summary), []).append(summary)
+
+    bins, current, used = [], [], 0
+    for group in by_key.values():
+        for summary in group:
+            cost = estimate_tokens(summary)
+            if current and used + cost > max_tokens:
+                bins.append(current)
+                current, used = [], 0
+            current.append(summary)
+            used += cost
+    if current:
+        bins.append(current)
+    return bins
+
+
+def draft_section(summaries: List[str], research_topic: str, model: str, max_chars: int) -> Tuple[str, dict]:
+    """Draft one report section from a group of summaries; return ``(draft, usage)``."""
+    prompt = build_prompt(
+        synthesis_section_prefix_deepseek,
+        synthesis_section_suffix_deepseek,
+        max_chars=max_chars,
+        research_topic=research_topic,
+        summaries="\n---\n\n".join(summaries),
+    )
+    llm = get_deepseek_llm(model, temperature=0, max_retries=2)
+    result = llm.invoke(prompt)
+    prompt_cache_stats.record("synthesis_draft", result)
+    return result.content, usage_from_message(result, model)
+
+
+def reduce_summaries(summaries: List[str], research_topic: str, configurable) -> Tuple[List[str], dict]:
+    """Draft sections in parallel until the summaries fit under ``synthesis_token_threshold``.
+
+    Returns the section drafts to pass to the answer model and the model usage spent.
+    """
+    threshold = configurable.synthesis_token_threshold
+    usage = {"tokens": 0, "cost": 0.0}
+    for level in range(1, MAX_LEVELS + 1):
+        total = sum(estimate_tokens(s) for s in summaries)
+        if total <= threshold or len(summaries) <= 1:
+            break
+        groups = group_summaries(summaries, configurable.synthesis_group_tokens)
+        if len(groups) >= len(summaries) and level > 1:
+            # 再分组也无法减少段数，继续归并没有意义
+            break
+        max_chars = max(500, threshold // len(groups))
+        logger.info(
+            f"🧩分层综合|第{level}轮:{len(summaries)}段摘要(约{total} tokens)分为{len(groups)}组并行起草"
+        )
+        with ThreadPoolExecutor(max_workers=configurable.synthesis_max_workers) as executor:
+            results = list(
+                executor.map(
+                    profile_worker(
+                        lambda group: draft_section(
+                            group, research_topic, configurable.synthesis_draft_model, max_chars
+                        )
+                    ),
+                    groups,
+                )
+            )
+        summaries = [draft for draft, _ in results]
+        usage = sum_usage(usage, *(u for _, u in results))
+    return summaries, usage
@@ -0,0 +1,90 @@
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from agent.entities import get_entity_index
+from agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+   确定性工具路由：跳过 web_research 第一轮的选工具 LLM 调用
+   每个 web_research 分支第一轮都要等一次 DeepSeek 往返，只为决定调用 web_search 还是 get_clinical_results
+   以及参数，而多数查询仅凭文本就能确定。
+   👇主要逻辑：
+      1.规则 + 实体匹配（agent.entities 的前缀树）判断查询意图：
+        - 没有临床线索 → web_search(query=原查询)；
+        - 有临床线索（临床试验、分期、入组、NCT 编号等）且识别出药物/靶点/企业/疾病实体
+          → web_search(query=原查询) + get_clinical_results(keywords=实体规范名)；
+      2.拿不准时返回 None，回到原来的 LLM 选工具轮次：查询为空或过长、有临床线索但识别不出实体；
+      3.路由出的工具调用和 LLM 返回的工具调用格式相同（{"name", "args"}），后续执行与结果拼接不变，
+        第二轮仍由 LLM 决定继续调用工具还是输出总结；
+      4.统计路由命中与回退次数，finalize_answer 打印命中率。
+'''
+
+ROUTER_MAX_QUERY_CHARS = 300
+
+_CLINICAL_CUES = re.compile(
+    r"临床试验|临床研究|临床数据|试验分期|入组|招募|登记号|[ⅠⅡⅢⅣ1-4一二三四]期临床|[ⅠⅡⅢⅣ]期|"
+    r"\bclinical (?:trial|study|studies|data)s?\b|\bphase\s*(?:i{1,3}v?|[1-4])(?:/(?:i{1,3}|[1-4]))?\b|"
+    r"\bnct\d{8}\b|\brecruiting\b|\benrollment\b",
+    re.IGNORECASE,
+)
+
+
+class RouterStats:
+    """Process-wide counters of deterministic tool routing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"routed": 0, "fallback": 0, "clinical": 0}
+
+    def record(self, outcome: str, clinical: bool = False) -> None:
+        with self._lock:
+            self._stats[outcome] += 1
+            self._stats["clinical"] += int(clinical)
+
+    def snapshot(self) -> dict:
+        """Return the counters and the routing hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["routed"] + stats["fallback"]
+        stats["hit_rate"] = stats["routed"] / total if total else 0.0
+        return stats
+
+
+router_stats = RouterStats()
+
+
+def route_tool_calls(query: str) -> Tuple[Optional[List[dict]], str]:
+    """Map a branch's search query to tool calls without the LLM.
+
+    Returns ``(tool_calls, reason)``; ``tool_calls`` is None when the router is
+    not confident and the LLM should choose the tools.
+    """
+    query = " ".join(str(query or "").split())
+    if not query:
+        return None, "empty query"
+    if len(query) > ROUTER_MAX_QUERY_CHARS:
+        return None, "query too long"
+
+    calls = [{"name": "web_search", "args": {"query": query}}]
+    if not _CLINICAL_CUES.search(query):
+        return calls, "web"
+
+    entities = list(dict.fromkeys(canonical for _, canonical, _, _ in get_entity_index().find(query)))
+    if not entities:
+        return None, "clinical cue without known entities"
+    calls.append({"name": "get_clinical_results", "args": {"keywords": " ".join(entities)}})
+    return calls, "clinical"
+
+
+def route_branch(query: str, task_id: str) -> Optional[List[dict]]:
+    """Route a web_research branch and record the outcome; return None to fall back to the LLM."""
+    calls, reason = route_tool_calls(query)
+    router_stats.record("routed" if calls else "fallback", clinical=reason == "clinical")
+    if calls:
+        logger.info(f"任务{task_id}|🧭工具路由命中({reason}):{[call['name'] for call in calls]}")
+    else:
+        logger.info(f"任务{task_id}|🧭工具路由未命中({reason})，由LLM选择工具")
+    return calls
@@ -1,7 +1,8 @@
 import os
-from typing import List
+from typing import Annotated, List, Optional
 from pydantic import BaseModel, Field
 from langchain.tools import tool
+from langchain_core.tools import InjectedToolArg
 from dotenv import load_dotenv
 from google.genai import Client
 from langchain_core.runnables import RunnableConfig
@@ -14,8 +15,24 @@ from agent.state import (
     WebSearchState,
 )
 from agent.logger import get_logger
+from agent.cache import TTLCache
+from agent.clients import tavily_rate_limiter
+from agent.cpu_offload import payload_size, run_cpu_task
+from agent.rerank import get_hit_reranker
+from agent.singleflight import SingleFlight
+from functools import lru_cache
 logger=get_logger(__name__)
 
+# 进程级搜索缓存：同一进程内所有运行共享，相同查询在TTL内不重复请求Tavily
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "3600")),
+)
+
+# 同一查询的并发请求只发一次到Tavily；等待别人的在途请求最多 TAVILY_TIMEOUT_SECONDS 秒
+tavily_flight = SingleFlight("tavily")
+tavily_timeout_seconds = float(os.getenv("TAVILY_TIMEOUT_SECONDS", "60"))
+
 
 class SearchQueryList(BaseModel):
     query: List[str] = Field(
@@ -44,30 +61,85 @@ def escape_md(value):
     return str(value).replace("|", "\\|").replace("\n", " ")
 
 
-@tool("web_search",return_direct=False)
-def web_search(query:str):
-    """
-    Performs web search using Tavily and returns sources and results."""
+def normalize_query(query: str) -> str:
+    return " ".join(str(query).lower().split())
+
+
+@lru_cache(maxsize=1)
+def get_tavily_search() -> TavilySearch:
+    """Return the shared Tavily client."""
     tavily_api_key = os.getenv("TAVILY_API_KEY")
     if not tavily_api_key:
         raise ValueError("TAVILY_API_KEY environment variable is not set")
-    
-    tavily_search = TavilySearch(api_key=tavily_api_key)
-    search_results = tavily_search.invoke(query) 
-    
+    # TAVILY_BASE_URL 用于把搜索请求指向代理或压测用的假服务
+    base_url = os.getenv("TAVILY_BASE_URL")
+    if base_url:
+        return TavilySearch(tavily_api_key=tavily_api_key, api_base_url=base_url.rstrip("/"))
+    return TavilySearch(api_key=tavily_api_key)
+
+
+def _fetch_tavily(key: str, query: str):
+    if tavily_rate_limiter is not None:
+        tavily_rate_limiter.acquire()
+    search_results = get_tavily_search().invoke(query)
+    search_cache.set(key, search_results)
+    return search_results
+
+
+def tavily_search(query: str):
+    """Run a Tavily search through the shared client, cache, single-flight layer and rate limiter."""
+    key = normalize_query(query)
+    cached = search_cache.get(key)
+    if cached is not None:
+        logger.info(f"传入的query={query}命中搜索缓存")
+        return cached
+    return tavily_flight.do(key, _fetch_tavily, key, query, timeout=tavily_timeout_seconds)
+
+
+@tool("web_search",return_direct=False)
+def web_search(
+    query:str,
+    research_topic: Annotated[str, InjectedToolArg] = "",
+    rerank: Annotated[Optional[dict], InjectedToolArg] = None,
+):
+    """
+    Performs web search using Tavily and returns sources and results."""
+    search_results = tavily_search(query)
+    # TavilySearch 返回 {"query", "results": [...], ...}
+    if isinstance(search_results, dict) and isinstance(search_results.get("results"), list):
+        search_results = search_results["results"]
+    # 重排和格式化是纯CPU计算，结果很大时放到进程池执行
+    return run_cpu_task(
+        format_search_results,
+        query,
+        search_results,
+        research_topic,
+        rerank,
+        size=payload_size(search_results),
+    )
+
+
+def format_search_results(query: str, search_results, research_topic: str = "", rerank: Optional[dict] = None) -> dict:
+    """Format Tavily hits as the web_search tool result, reranking them first when ``rerank`` settings are given."""
     if isinstance(search_results, str):
        modified_text = f"### 网页搜索结果（来自工具 web_search）\n\n查询：{query}\n\n{search_results}"
        sources_gathered = []
     elif isinstance(search_results, list):
        sources_gathered = []
-       logger.info(f"传入的query={query}的搜索结果数量：{len(search_results["results"])}" )
-       modified_text = f"### 网页搜索结果（来自工具 web_search）\n\n查询：{query}\n\n" 
+       hits = [r for r in search_results if isinstance(r, dict)]
+       if rerank:
+           kept = get_hit_reranker(**rerank).rerank(hits, query, research_topic)
+           search_results = kept + [r for r in search_results if not isinstance(r, dict)]
+           logger.info(f"传入的query={query}的搜索结果数量：{len(hits)}，重排后保留{len(kept)}" )
+       else:
+           logger.info(f"传入的query={query}的搜索结果数量：{len(hits)}" )
+       parts = [f"### 网页搜索结果（来自工具 web_search）\n\n查询：{query}\n\n"]
        for i, result in enumerate(search_results, 1):
             if isinstance(result, dict):
                title = result.get('title', f'结果 {i}')
                content = result.get('content', str(result))
                url = result.get('url', '')
-               modified_text += f"**{i}. {title}**\n\n{content}\n\n来源：{url}\n\n"
+               parts.append(f"**{i}. {title}**\n\n{content}\n\n来源：{url}\n\n")
             
                sources_gathered.append({
                   'label': title,
@@ -75,7 +147,8 @@ def web_search(query:str):
                   'value': url
                 })
             else:
-                modified_text += f"**{i}.** {result}\n\n"
+                parts.append(f"**{i}.** {result}\n\n")
+       modified_text = "".join(parts)
     else:
        modified_text = f"### 网页搜索结果（来自工具 web_search）\n\n查询：{query}\n\n{str(search_results)}"
        sources_gathered = []   
@@ -86,6 +159,20 @@ def web_search(query:str):
     }
     
     
+CLINICAL_TABLE_HEADERS = ["登记号", "试验药", "适应症", "试验状态", "试验分期"]
+
+
+def render_clinical_table(rows: List[dict]) -> str:
+    """Render clinical trial rows as a markdown table."""
+    table_header = "| " + " | ".join(CLINICAL_TABLE_HEADERS) + " |\n"
+    table_sep = "| " + " | ".join(["---"] * len(CLINICAL_TABLE_HEADERS)) + " |\n"
+    table_rows = [
+        "| " + " | ".join(escape_md(row.get(key, "")) for key in CLINICAL_TABLE_HEADERS) + " |\n"
+        for row in rows
+    ]
+    return table_header + table_sep + "".join(table_rows)
+
+
 @tool("get_clinical_results",return_direct=False)
 def get_clinical_results(keywords:str):
     """
@@ -93,25 +180,10 @@ def get_clinical_results(keywords:str):
     return markdown table so final report can render it directly.
     """
     clinical_results=[     ]
-    
-    headers = ["登记号", "试验药", "适应症", "试验状态", "试验分期"]
-    table_header = "| " + " | ".join(headers) + " |\n"
-    table_sep = "| " + " | ".join(["---"] * len(headers)) + " |\n"
-
-    table_rows=""
-    for row in clinical_results:
-        table_rows += (
-            "| "
-            + " | ".join([
-                escape_md(row.get("登记号","")),
-                escape_md(row.get("试验药","")),
-                escape_md(row.get("适应症","")),
-                escape_md(row.get("试验状态","")),
-                escape_md(row.get("试验分期","")),
-            ])
-            + " |\n"
-        )
-    markdown_table=table_header + table_sep + table_rows
+    # 行数很多时表格渲染放到进程池执行
+    markdown_table = run_cpu_task(
+        render_clinical_table, clinical_results, size=payload_size(clinical_results)
+    )
    
 
     # html_table = "<table>\n<tr><th>登记号</th><th>试验药</th><th>适应症</th><th>试验状态</th><th>试验分期</th></tr>\n"
@@ -4,6 +4,57 @@ from pydantic import BaseModel, Field
 from langchain.tools import tool
 import requests
 import json
+
+from agent.cache import TTLCache
+from agent.entities import get_entity_index
+from agent.singleflight import SingleFlight
+
+# 相同筛选条件的并发请求只发一次到临床数据接口
+clinical_flight = SingleFlight("clinical_api")
+
+# 进程级临床接口缓存：参数归一化后，同一实体的不同写法命中同一条目
+clinical_cache = TTLCache(
+    maxsize=int(os.getenv("CLINICAL_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("CLINICAL_CACHE_TTL_SECONDS", "3600")),
+)
+
+# 接口参数名 → 实体类别
+CLINICAL_ENTITY_PARAMS = {"Target": "target", "Drug": "drug", "Enterprise": "company", "Disease": "disease"}
+
+# 临床数据接口地址；压测时指向本地假服务（见 benchmarks/fake_services.py）
+clinical_api_base_url = os.getenv("CLINICAL_API_BASE_URL", "http://172.16.66.26:5000").rstrip("/")
+# 单次临床接口请求的超时，也是等待相同在途请求的上限
+clinical_api_timeout_seconds = float(os.getenv("CLINICAL_API_TIMEOUT_SECONDS", "60"))
+
+
+def clinical_api_request(method: str, url: str, params: dict) -> requests.Response:
+    """Send a clinical API request, sharing it with identical requests already in flight.
+
+    Entity parameters are canonicalized first, so aliases of one entity share a request.
+    """
+    index = get_entity_index()
+    params = {
+        name: index.canonicalize(CLINICAL_ENTITY_PARAMS[name], value) if name in CLINICAL_ENTITY_PARAMS else value
+        for name, value in params.items()
+    }
+    key = (method, url, json.dumps(params, sort_keys=True, ensure_ascii=False))
+    cached = clinical_cache.get(key)
+    if cached is not None:
+        return cached
+    return clinical_flight.do(
+        key, _fetch_clinical, key, method, url, params, timeout=clinical_api_timeout_seconds
+    )
+
+
+def _fetch_clinical(key: tuple, method: str, url: str, params: dict) -> requests.Response:
+    if method == "POST":
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        resp = requests.post(url, json=params, headers=headers, timeout=clinical_api_timeout_seconds)
+    else:
+        resp = requests.get(url, params=params, timeout=clinical_api_timeout_seconds)
+    if resp.ok:
+        clinical_cache.set(key, resp)
+    return resp
 # ============ 全球临床试验查询 Tool（仅方法与入参，无实现） ============
 
 class GlobalClinicalTrialsQueryInput(BaseModel):
@@ -82,13 +133,9 @@ def search_global_clinical_trials(
     - 列表：[{临床登记号, 试验药通用名, 试验药靶点, 药品类型, 标准适应症, 申办者, 合作者, 首次公示日期, 试验分期, 试验状态, 结果评价, DOI号}]
     - 统计：总条目数、不同试验分期条目总数、不同试验状态条目总数
     """
-    headers = {
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-    }
-    url="http://172.16.66.26:5000/api/Clinical/GetTableListForAI"
+    url=f"{clinical_api_base_url}/api/Clinical/GetTableListForAI"
     params={"Target": target, "Drug": drug, "Enterprise": company, "Disease": disease,"pageSize":20}
-    resp=requests.post(url, json=params,headers=headers)
+    resp=clinical_api_request("POST", url, params)
     data=json.loads(resp.text)
 
     print(resp.json)
@@ -152,9 +199,9 @@ def search_clinical_trial_results(
 
         说明：仅定义方法与入参/出参结构，不含具体实现。
         """
-        url="http://172.16.66.26:5000/api/ClinicalOutcomes/GetTableListForAI"
+        url=f"{clinical_api_base_url}/api/ClinicalOutcomes/GetTableListForAI"
         params={"Target": target, "Drug": drug, "Enterprise": company, "Disease": disease,"pageSize":50}
-        resp=requests.get(url, params=params)
+        resp=clinical_api_request("GET", url, params)
         print(resp.json)
 
         raise NotImplementedError("search_clinical_trial_results: 仅定义方法与入参/出参，占位未实现")
@@ -205,9 +252,9 @@ def search_global_drug_rnd(
 
     说明：仅定义方法与入参/出参结构，不含具体实现。
     """
-    url="http://172.16.66.26:5000/api/GlobalNewDrug/GetTableListForAI"
+    url=f"{clinical_api_base_url}/api/GlobalNewDrug/GetTableListForAI"
     params={"Target": target, "Drug": drug, "Enterprise": company, "Disease": disease, "pageSize": 50}
-    resp=requests.get(url, params=params)
+    resp=clinical_api_request("GET", url, params)
 
     raise NotImplementedError("search_global_drug_rnd: 仅定义方法与入参/出参，占位未实现")
 
@@ -1,6 +1,9 @@
+import uuid
 from typing import Any, Dict, List
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from langchain_core.messages import AnyMessage, HumanMessage
 from agent.logger import get_logger
+from agent.configuration import Configuration
+from agent.context import conversation_context, estimate_tokens
 logger=get_logger(__name__)
 
 """
@@ -8,26 +11,73 @@ logger=get_logger(__name__)
    从消息列表中提取研究主题。
    输入一般是聊天记录（LangChain格式：HumanMessage、AIMessage）
    如果是多轮对话，就是把每条消息前加上"User:"或"Assistant："，拼接成完整上下文。
+   多轮上下文由 agent.context 按线程增量构建并缓存，早期的助手报告会被压缩。
 """
-def get_research_topic(messages: List[AnyMessage],flag:str) -> str:
+def get_research_topic(messages: List[AnyMessage],flag:str="",config=None) -> str:
     """
     Get the research topic from the messages.
     """
-    # check if request has a history and combine the messages into a single string
-    if len(messages) == 1: 
-        research_topic = messages[-1].content
-        logger.info(f"💬{flag}步骤中|len(messages)=1,research_topic={research_topic}")
-    else:
-        research_topic = ""
-        for message in messages:
-            if isinstance(message, HumanMessage):
-                research_topic += f"User: {message.content}\n"
-            elif isinstance(message, AIMessage):
-                research_topic += f"Assistant: {message.content}\n"
-        logger.info(f"💬{flag}步骤中|research_topic={research_topic}")
-    
+    if len(messages) == 1:
+        return messages[-1].content
+
+    token_budget = Configuration.from_runnable_config(config).context_token_budget
+    research_topic, computed = conversation_context.build(
+        messages, get_thread_key(config), token_budget
+    )
+    if computed:
+        logger.info(
+            f"💬{flag}步骤中|len(messages)={len(messages)},"
+            f"research_topic约{estimate_tokens(research_topic)}tokens:{research_topic[:200]}"
+        )
     return research_topic
 
+
+def get_latest_question(messages: List[AnyMessage], max_chars: int = 500) -> str:
+    """
+    Get the latest user message, truncated, as a compact research topic for branch payloads.
+    """
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return str(message.content)[:max_chars]
+    return ""
+
+
+def get_thread_key(config) -> str:
+    """
+    Get the LangGraph thread id of the current run, or "local" without a thread.
+    """
+    config = config or {}
+    return str(config.get("configurable", {}).get("thread_id", "local"))
+
+def new_run_id(config) -> str:
+    """
+    Get the id of a run that is starting: the LangGraph API run id, or a fresh uuid.
+
+    Plain `graph.invoke` calls (batch refreshes, answer cache refreshes, load
+    tests) have no run id and often no thread, so each gets its own uuid.
+    """
+    config = config or {}
+    run_id = config.get("configurable", {}).get("run_id") or config.get("run_id")
+    return str(run_id) if run_id else uuid.uuid4().hex
+
+
+def get_run_key(config, state=None) -> str:
+    """
+    Get a key identifying the current run, used to scope run-local caches.
+
+    Prefers the run id stored in the state when the run started (see
+    `new_run_id`), then the LangGraph API run id, then the thread id, and
+    falls back to "local" for nodes called outside a graph run.
+    """
+    if state and state.get("run_id"):
+        return str(state["run_id"])
+    config = config or {}
+    configurable = config.get("configurable", {})
+    run_id = configurable.get("run_id") or config.get("run_id")
+    if run_id:
+        return str(run_id)
+    return str(configurable.get("thread_id", "local"))
+
 '''
    为Tavily搜索结果生成短链接ID，用于可视化或Markdown引用
    将Tavily搜索结果中的URL转为短链接
@@ -60,12 +110,63 @@ def resolve_urls(search_results: List[dict], id: int) -> Dict[str, str]:
             resolved_map[url] = f"{prefix}{id}-{idx}"
     return resolved_map
 
+'''
+   单次拼接插入引用标记
+   以前每条引用都用 text[:end] + marker + text[end:] 重建整个字符串，
+   复杂度为 O(引用数 × 文本长度)；Gemini grounding_metadata 给出的是 UTF-8 字节偏移，
+   却被当作字符下标使用，含中文的回答引用位置会错位。
+   👇主要逻辑：
+      1.引用按 (end_index, start_index) 只排序一次；
+      2.需要时把字节偏移逐段解码换算成字符下标（整体只扫描一遍文本，落在多字节字符中间的偏移顺延到字符边界）；
+      3.按顺序切片，最后一次 join 得到结果。
+'''
+def byte_to_char_offsets(text: str, byte_offsets: List[int]) -> Dict[int, int]:
+    """
+    Map sorted UTF-8 byte offsets into ``text`` to character indices in a single pass.
+    """
+    encoded = text.encode("utf-8")
+    mapping = {}
+    char_pos, byte_pos = 0, 0
+    for offset in byte_offsets:
+        target = min(max(offset, 0), len(encoded))
+        # 偏移落在多字节字符中间时顺延到下一个字符边界
+        while target < len(encoded) and (encoded[target] & 0xC0) == 0x80:
+            target += 1
+        if target > byte_pos:
+            char_pos += len(encoded[byte_pos:target].decode("utf-8"))
+            byte_pos = target
+        mapping[offset] = char_pos
+    return mapping
+
+
+def assemble_citations(text: str, citations_list: List[dict], byte_offsets: bool = False) -> str:
+    """
+    Insert each citation's markdown links after its ``end_index`` with one sort and one join.
+
+    Citations sharing an end position keep the order of their ``start_index``.
+    """
+    sorted_citations = sorted(citations_list, key=lambda c: (c["end_index"], c["start_index"]))
+    if byte_offsets:
+        offsets = byte_to_char_offsets(text, sorted(c["end_index"] for c in sorted_citations))
+    parts = []
+    previous = 0
+    for citation_info in sorted_citations:
+        end_idx = citation_info["end_index"]
+        end_idx = offsets[end_idx] if byte_offsets else min(max(end_idx, 0), len(text))
+        parts.append(text[previous:end_idx])
+        parts.extend(
+            f" [{segment['label']}]({segment['short_url']})" for segment in citation_info["segments"]
+        )
+        previous = end_idx
+    parts.append(text[previous:])
+    return "".join(parts)
+
 '''
    在文本中插入Markdown引用的链接
    在回答文本中插入Markdown引用标记（如[source](short_url)）。
    对于Tavily搜索结果，由于没有位置信息，将在文本末尾添加引用列表。
 '''
-def insert_citation_markers(text, citations_list):
+def insert_citation_markers(text, citations_list, byte_offsets=False):
     """
     Inserts citation markers into a text string based on start and end indices.
     For Tavily results (which lack position info), appends citations at the end.
@@ -75,6 +176,9 @@ def insert_citation_markers(text, citations_list):
         citations_list (list): A list of dictionaries, where each dictionary
                                contains 'start_index', 'end_index', and
                                'segments' with citation information.
+        byte_offsets (bool): Whether the indices are UTF-8 byte offsets
+                             (as in Gemini grounding metadata) rather than
+                             character indices.
 
     Returns:
         str: The text with citation markers inserted.
@@ -89,30 +193,8 @@ def insert_citation_markers(text, citations_list):
     )
     
     if has_position_info:
-        # Original logic for Google Search results with position info
-        # Sort citations by end_index in descending order.
-        # If end_index is the same, secondary sort by start_index descending.
-        # This ensures that insertions at the end of the string don't affect
-        # the indices of earlier parts of the string that still need to be processed.
-        sorted_citations = sorted(
-            citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
-        )
-
-        modified_text = text
-        for citation_info in sorted_citations:
-            # These indices refer to positions in the *original* text,
-            # but since we iterate from the end, they remain valid for insertion
-            # relative to the parts of the string already processed.
-            end_idx = citation_info["end_index"]
-            marker_to_insert = ""
-            for segment in citation_info["segments"]:
-                marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
-            # Insert the citation marker at the original end_idx position
-            modified_text = (
-                modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
-            )
-        
-        return modified_text
+        # Google Search results: assemble_citations sorts by ascending end_index and builds the text in one pass.
+        return assemble_citations(text, citations_list, byte_offsets=byte_offsets)
     else:
         # New logic for Tavily results without position info
         # Append citations at the end of the text
@@ -130,6 +212,20 @@ def insert_citation_markers(text, citations_list):
         
         return modified_text
 
+def link_sources(text: str, sources: List[dict]) -> tuple:
+    """
+    Replace the short URLs cited in ``text`` with their original URLs.
+
+    Returns the rewritten text and the sources that are actually cited.
+    """
+    used = []
+    for source in sources:
+        if source["short_url"] in text:
+            if source["short_url"] != source["value"]:
+                text = text.replace(source["short_url"], source["value"])
+            used.append(source)
+    return text, used
+
 '''
     从Tavily搜索结果中提取引用信息
     作用：从Tavily搜索结果中提取引用元数据，用于生成引用标记。
@@ -238,7 +334,7 @@ def resolve_urls_googlesearch(urls_to_resolve: List[Any], id: int) -> Dict[str,
     return resolved_map
 
 
-def insert_citation_markers_googlesearch(text, citations_list):
+def insert_citation_markers_googlesearch(text, citations_list, byte_offsets=True):
     """
     Inserts citation markers into a text string based on start and end indices.
 
@@ -248,33 +344,13 @@ def insert_citation_markers_googlesearch(text, citations_list):
                                contains 'start_index', 'end_index', and
                                'segment_string' (the marker to insert).
                                Indices are assumed to be for the original text.
+        byte_offsets (bool): Whether the indices are UTF-8 byte offsets, as
+                             reported by Gemini grounding metadata.
 
     Returns:
         str: The text with citation markers inserted.
     """
-    # Sort citations by end_index in descending order.
-    # If end_index is the same, secondary sort by start_index descending.
-    # This ensures that insertions at the end of the string don't affect
-    # the indices of earlier parts of the string that still need to be processed.
-    sorted_citations = sorted(
-        citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
-    )
-
-    modified_text = text
-    for citation_info in sorted_citations:
-        # These indices refer to positions in the *original* text,
-        # but since we iterate from the end, they remain valid for insertion
-        # relative to the parts of the string already processed.
-        end_idx = citation_info["end_index"]
-        marker_to_insert = ""
-        for segment in citation_info["segments"]:
-            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
-        # Insert the citation marker at the original end_idx position
-        modified_text = (
-            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
-        )
-
-    return modified_text
+    return assemble_citations(text, citations_list, byte_offsets=byte_offsets)
 
 
 def get_citations_googlesearch(response, resolved_urls_map):
@@ -295,10 +371,10 @@ def get_citations_googlesearch(response, resolved_urls_map):
     Returns:
         list: A list of dictionaries, where each dictionary represents a citation
               and has the following keys:
-              - "start_index" (int): The starting character index of the cited
+              - "start_index" (int): The starting UTF-8 byte offset of the cited
                                      segment in the original text. Defaults to 0
                                      if not specified.
-              - "end_index" (int): The character index immediately after the
+              - "end_index" (int): The UTF-8 byte offset immediately after the
                                    end of the cited segment (exclusive).
               - "segments" (list[str]): A list of individual markdown-formatted
                                         links for each grounding chunk.
@@ -366,3 +442,37 @@ def get_citations_googlesearch(response, resolved_urls_map):
                     pass
         citations.append(citation)
     return citations
+
+
+def parse_grounding(response, id: int) -> tuple:
+    """Extract the text and citations of a grounded Gemini response.
+
+    Args:
+        response: The google-genai response of a grounded ``generate_content`` call
+        id: Unique identifier of the search branch, used in the short URLs
+
+    Returns:
+        Tuple of the response text and its citations (plain dicts, cheap to pickle)
+    """
+    candidate = response.candidates[0] if response.candidates else None
+    grounding_metadata = getattr(candidate, "grounding_metadata", None)
+    if grounding_metadata is None or not grounding_metadata.grounding_chunks:
+        return response.text or "", []
+
+    # resolve the urls to short urls for saving tokens and time
+    resolved_urls = resolve_urls_googlesearch(grounding_metadata.grounding_chunks, id)
+    return response.text or "", get_citations_googlesearch(response, resolved_urls)
+
+
+def grounding_payload_size(response) -> int:
+    """Estimate the size of a grounded Gemini response in characters, like ``payload_size``."""
+    candidate = response.candidates[0] if response.candidates else None
+    grounding_metadata = getattr(candidate, "grounding_metadata", None)
+    size = len(response.text or "")
+    if grounding_metadata is not None:
+        for chunk in grounding_metadata.grounding_chunks or []:
+            web = getattr(chunk, "web", None)
+            size += len((web.uri or "") + (web.title or "")) if web is not None else 8
+        for support in grounding_metadata.grounding_supports or []:
+            size += 8 * (len(support.grounding_chunk_indices or []) + 2)
+    return size
@@ -0,0 +1,488 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from agent.logger import get_logger
+from agent.paths import data_path
+
+logger = get_logger(__name__)
+
+'''
+   web_research 分支的分布式工作进程池
+   所有 Send 出来的 web_research 分支都在 LangGraph 服务进程里执行，
+   一个高强度运行（5 个查询 × 10 轮）的分支会和其他运行抢同一个进程的线程池。
+   👇主要逻辑：
+      1.开启 distributed_web_research 后，web_research 节点不再本地执行分支，而是把
+        分支状态 + 配置序列化后投递到队列，阻塞等待结果，再原样返回给图的 reducer
+        （sources_gathered / web_research_result / budget 的合并方式不变）；
+      2.分支 id = sha256(运行键 + LangGraph 任务命名空间 + 分支序号 + 查询)，同一任务重试时 id 不变，
+        重复投递不会重复执行，已完成的结果直接复用；
+      3.工作进程领取任务时写入租约并定期续租；进程崩溃后租约过期，任务被重新入队，
+        超过最大尝试次数后标记失败，等待方收到错误；
+      4.队列后端由 WEB_RESEARCH_QUEUE_URL 指定：file:///path.sqlite3（默认数据目录下的 web_research_queue.sqlite3，
+        同一台机器上的多个进程共享）或 redis://...（跨机器）；跨机器部署时 BLOB_STORE_URL 也需要指向共享存储；
+      5.工作进程用 examples/web_research_workers.py 启动，可随时增减数量。
+   相关环境变量：WEB_RESEARCH_QUEUE_URL、WEB_RESEARCH_LEASE_SECONDS（默认60）、WEB_RESEARCH_MAX_ATTEMPTS（默认3）。
+'''
+
+
+
+def branch_job_id(state: dict, config) -> str:
+    """Return the idempotent id of a web_research branch.
+
+    The LangGraph task namespace is stable across retries of the same task,
+    so re-running a node re-attaches to the job it already submitted.
+    """
+    from agent.utils import get_run_key
+
+    configurable = (config or {}).get("configurable", {})
+    raw = json.dumps(
+        [
+            get_run_key(config, state),
+            configurable.get("checkpoint_ns", ""),
+            state.get("research_loop_count", 0),
+            state["id"],
+            state["search_query"],
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def default_worker_id() -> str:
+    """Return a worker id unique to this process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LocalBranchQueue:
+    """Branch queue in a SQLite file shared by the processes of one machine.
+
+    Args:
+        path: SQLite database file.
+        lease_seconds: How long a claimed job stays owned without a heartbeat.
+        max_attempts: Number of claims after which a job whose workers keep crashing fails.
+        result_ttl_seconds: How long finished jobs are kept for re-attaching retries.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        lease_seconds: float = 60,
+        max_attempts: int = 3,
+        result_ttl_seconds: float = 3600,
+    ):
+        self.path = Path(path) if path else data_path("web_research_queue.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl_seconds = result_ttl_seconds
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, payload TEXT, status TEXT, attempts INTEGER DEFAULT 0, "
+                "worker TEXT, lease_until REAL, result TEXT, error TEXT, created_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # 每个线程一个连接；多进程之间靠 SQLite 文件锁互斥
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    def submit(self, job_id: str, payload: dict) -> bool:
+        """Enqueue a job; return False when a job with this id already exists."""
+        conn = self._conn()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO jobs (id, payload, status, created_at) VALUES (?, ?, 'queued', ?)",
+            (job_id, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, dict, int]]:
+        """Claim the oldest queued job (or one whose lease expired); return ``(id, payload, attempt)``."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 租约过期且已达最大尝试次数的任务直接判定失败
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker lost: lease expired', finished_at = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ? WHERE id = ?",
+                (worker_id, now + self.lease_seconds, row[0]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0], json.loads(row[1]), row[2] + 1
+
+    def heartbeat(self, job_id: str, worker_id: str) -> None:
+        """Extend the lease of a job still owned by ``worker_id``."""
+        self._conn().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_seconds, job_id, worker_id),
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: dict) -> None:
+        """Store a job result; the first completion of a job wins."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, worker = ?, finished_at = ? WHERE id = ? AND status != 'done'",
+            (json.dumps(result, ensure_ascii=False), worker_id, now, job_id),
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (now - self.result_ttl_seconds,),
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        """Requeue a job whose handler raised, or fail it after ``max_attempts``."""
+        self._conn().execute(
+            "UPDATE jobs SET "
+            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = ?, worker = NULL, lease_until = NULL, "
+            "finished_at = CASE WHEN attempts >= ? THEN ? ELSE NULL END "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (self.max_attempts, error, self.max_attempts, time.time(), job_id, worker_id),
+        )
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Return ``{"status", "attempts", "result", "error"}`` of a job, or None."""
+        row = self._conn().execute(
+            "SELECT status, attempts, result, error FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "status": row[0],
+            "attempts": row[1],
+            "result": json.loads(row[2]) if row[2] else None,
+            "error": row[3],
+        }
+
+    def stats(self) -> dict:
+        """Return the number of jobs per status."""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class RedisBranchQueue:
+    """Branch queue in Redis shared by workers on any machine.
+
+    Jobs are hashes; ids move from the pending list to the processing list
+    when claimed and are requeued by any worker once their lease expires.
+
+    Args:
+        url: Redis connection URL.
+        prefix: Key prefix.
+        lease_seconds: How long a claimed job stays owned without a heartbeat.
+        max_attempts: Number of claims after which a job whose workers keep crashing fails.
+        result_ttl_seconds: How long finished jobs are kept for re-attaching retries.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        prefix: str = "web-research:",
+        lease_seconds: float = 60,
+        max_attempts: int = 3,
+        result_ttl_seconds: float = 3600,
+    ):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisBranchQueue requires redis: pip install redis") from e
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl_seconds = result_ttl_seconds
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._pending = prefix + "pending"
+        self._processing = prefix + "processing"
+        self._last_reap = 0.0
+
+    def _job(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def submit(self, job_id: str, payload: dict) -> bool:
+        """Enqueue a job; return False when a job with this id already exists."""
+        key = self._job(job_id)
+        if not self._client.hsetnx(key, "status", "queued"):
+            return False
+        pipe = self._client.pipeline()
+        pipe.hset(key, mapping={"payload": json.dumps(payload, ensure_ascii=False), "attempts": 0})
+        pipe.lpush(self._pending, job_id)
+        pipe.execute()
+        return True
+
+    def _reap(self) -> None:
+        # 租约过期的任务重新入队（或判定失败），任何工作进程都可以执行
+        now = time.time()
+        if now - self._last_reap < self.lease_seconds / 4:
+            return
+        self._last_reap = now
+        for job_id in self._client.lrange(self._processing, 0, -1):
+            job = self._client.hmget(self._job(job_id), "status", "lease_until", "attempts")
+            status, lease_until, attempts = job[0], float(job[1] or 0), int(job[2] or 0)
+            if status == "running" and lease_until >= now:
+                continue
+            if not self._client.lrem(self._processing, 1, job_id):
+                continue  # 其他进程已处理
+            if status != "running":
+                continue
+            if attempts >= self.max_attempts:
+                self._finish(job_id, {"status": "failed", "error": "worker lost: lease expired"})
+            else:
+                self._client.hset(self._job(job_id), "status", "queued")
+                self._client.rpush(self._pending, job_id)
+
+    def claim(self, worker_id: str, block_seconds: float = 1.0) -> Optional[Tuple[str, dict, int]]:
+        """Claim the oldest queued job; return ``(id, payload, attempt)``."""
+        self._reap()
+        job_id = self._client.blmove(self._pending, self._processing, block_seconds, "RIGHT", "LEFT")
+        if job_id is None:
+            return None
+        key = self._job(job_id)
+        pipe = self._client.pipeline()
+        pipe.hset(key, mapping={"status": "running", "worker": worker_id, "lease_until": time.time() + self.lease_seconds})
+        pipe.hincrby(key, "attempts", 1)
+        pipe.hget(key, "payload")
+        _, attempt, payload = pipe.execute()
+        return job_id, json.loads(payload), attempt
+
+    def heartbeat(self, job_id: str, worker_id: str) -> None:
+        """Extend the lease of a job still owned by ``worker_id``."""
+        key = self._job(job_id)
+        if self._client.hget(key, "worker") == worker_id:
+            self._client.hset(key, "lease_until", time.time() + self.lease_seconds)
+
+    def _finish(self, job_id: str, fields: dict) -> None:
+        key = self._job(job_id)
+        pipe = self._client.pipeline()
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, max(1, int(self.result_ttl_seconds)))
+        pipe.lrem(self._processing, 1, job_id)
+        pipe.execute()
+
+    def complete(self, job_id: str, worker_id: str, result: dict) -> None:
+        """Store a job result; the first completion of a job wins."""
+        if self._client.hget(self._job(job_id), "status") == "done":
+            return
+        self._finish(job_id, {"status": "done", "worker": worker_id, "result": json.dumps(result, ensure_ascii=False)})
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        """Requeue a job whose handler raised, or fail it after ``max_attempts``."""
+        key = self._job(job_id)
+        if self._client.hget(key, "worker") != worker_id:
+            return
+        if int(self._client.hget(key, "attempts") or 0) >= self.max_attempts:
+            self._finish(job_id, {"status": "failed", "error": error})
+            return
+        pipe = self._client.pipeline()
+        pipe.hset(key, mapping={"status": "queued", "error": error, "worker": ""})
+        pipe.lrem(self._processing, 1, job_id)
+        pipe.rpush(self._pending, job_id)
+        pipe.execute()
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Return ``{"status", "attempts", "result", "error"}`` of a job, or None."""
+        job = self._client.hgetall(self._job(job_id))
+        if not job:
+            return None
+        return {
+            "status": job["status"],
+            "attempts": int(job.get("attempts", 0)),
+            "result": json.loads(job["result"]) if job.get("result") else None,
+            "error": job.get("error"),
+        }
+
+    def stats(self) -> dict:
+        """Return the number of pending and processing jobs."""
+        return {
+            "queued": self._client.llen(self._pending),
+            "running": self._client.llen(self._processing),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_branch_queue():
+    """Return the shared branch queue configured by ``WEB_RESEARCH_QUEUE_URL``."""
+    url = os.getenv("WEB_RESEARCH_QUEUE_URL")
+    options = {
+        "lease_seconds": float(os.getenv("WEB_RESEARCH_LEASE_SECONDS", "60")),
+        "max_attempts": int(os.getenv("WEB_RESEARCH_MAX_ATTEMPTS", "3")),
+    }
+    if not url:
+        return LocalBranchQueue(**options)
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBranchQueue(url, **options)
+    if url.startswith("file://"):
+        return LocalBranchQueue(url[len("file://") :], **options)
+    raise ValueError(f"Unsupported WEB_RESEARCH_QUEUE_URL scheme: {url}")
+
+
+def wait_for_result(queue, job_id: str, timeout: float) -> dict:
+    """Block until a job finishes and return its result; raise when it failed or timed out."""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while True:
+        job = queue.status(job_id)
+        if job is None:
+            raise RuntimeError(f"web_research job {job_id} disappeared from the queue")
+        if job["status"] == "done":
+            return job["result"]
+        if job["status"] == "failed":
+            raise RuntimeError(f"web_research job failed after {job['attempts']} attempts: {job['error']}")
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"web_research job {job_id} not finished after {timeout}s (status={job['status']})")
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def dispatch_branch(state: dict, config, timeout: float) -> Tuple[dict, dict]:
+    """Run a web_research branch on the worker pool; return ``(update, progress)``.
+
+    The branch runs with the caller's configuration, minus the run-local
+    speculative prefetcher, which only exists in the graph process.
+    """
+    from agent.configuration import Configuration
+    from agent.utils import get_run_key
+
+    queue = get_branch_queue()
+    job_id = branch_job_id(state, config)
+    configurable = Configuration.from_runnable_config(config).model_dump()
+    configurable.update(speculative_prefetch=False, distributed_web_research=False)
+    configurable["run_id"] = get_run_key(config, state)
+    payload = {"state": dict(state), "config": {"configurable": configurable}}
+    if queue.submit(job_id, payload):
+        logger.info(f"任务{state['id']}|🏭分支已投递到工作进程池:{job_id[:12]}")
+    else:
+        logger.info(f"任务{state['id']}|🏭分支已在队列中，复用:{job_id[:12]}")
+    result = wait_for_result(queue, job_id, timeout)
+    return result["update"], result["progress"]
+
+
+def run_branch_job(payload: dict) -> dict:
+    """Run one queued web_research branch in a worker process."""
+    from agent.graph import run_web_research_branch
+
+    update, progress = run_web_research_branch(payload["state"], payload["config"])
+    return {"update": update, "progress": progress}
+
+
+def run_worker(
+    queue=None,
+    handler: Callable[[dict], dict] = run_branch_job,
+    worker_id: Optional[str] = None,
+    stop_event=None,
+    poll_seconds: float = 0.2,
+) -> int:
+    """Claim and run jobs until ``stop_event`` is set; return the number of jobs run.
+
+    A heartbeat thread renews the lease while ``handler`` runs. If the
+    process dies, the lease expires and another worker picks the job up.
+    """
+    queue = queue or get_branch_queue()
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    logger.info(f"🏭工作进程{worker_id}|已启动")
+    while stop_event is None or not stop_event.is_set():
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_seconds)
+            continue
+        job_id, payload, attempt = job
+        if attempt > 1:
+            logger.info(f"🏭工作进程{worker_id}|重试分支{job_id[:12]}(第{attempt}次)")
+
+        done = threading.Event()
+
+        def keep_lease():
+            while not done.wait(queue.lease_seconds / 3):
+                queue.heartbeat(job_id, worker_id)
+
+        heartbeat = threading.Thread(target=keep_lease, daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(payload)
+        except Exception as e:
+            logger.info(f"🏭工作进程{worker_id}|分支{job_id[:12]}失败:{e!r}")
+            queue.fail(job_id, worker_id, repr(e))
+        else:
+            queue.complete(job_id, worker_id, result)
+        finally:
+            done.set()
+            heartbeat.join()
+        processed += 1
+    return processed
+
+
+def _worker_main(handler: Callable[[dict], dict], stop_event) -> None:
+    # 子进程里重新读取环境变量，创建自己的队列连接
+    try:
+        run_worker(handler=handler, stop_event=stop_event)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(
+    count: int,
+    handler: Callable[[dict], dict] = run_branch_job,
+    stop_event=None,
+) -> List[multiprocessing.Process]:
+    """Start ``count`` worker processes consuming the queue from ``WEB_RESEARCH_QUEUE_URL``."""
+    processes = []
+    for i in range(count):
+        process = multiprocessing.Process(
+            target=_worker_main, args=(handler, stop_event), name=f"web-research-worker-{i}", daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def restart_dead_workers(
+    processes: List[multiprocessing.Process],
+    handler: Callable[[dict], dict] = run_branch_job,
+    stop_event=None,
+) -> int:
+    """Replace crashed worker processes in place; return how many were restarted."""
+    restarted = 0
+    for i, process in enumerate(processes):
+        if process.is_alive():
+            continue
+        logger.info(f"🏭工作进程{process.name}已退出(exitcode={process.exitcode})，重新启动")
+        process = multiprocessing.Process(
+            target=_worker_main, args=(handler, stop_event), name=process.name, daemon=True
+        )
+        process.start()
+        processes[i] = process
+        restarted += 1
+    return restarted
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# agent/__init__ imports the graph, which requires a Gemini key at import time;
+# local stores write to a throwaway data directory instead of backend/data.
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("AGENT_DATA_DIR", tempfile.mkdtemp(prefix="agent-tests-"))
@@ -0,0 +1,28 @@
+import threading
+import zlib
+
+from agent.blobstore import LocalBlobStore
+
+
+def test_concurrent_puts_of_the_same_blob_all_succeed(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    data = zlib.compress(b"x" * 100_000)
+    errors = []
+    barrier = threading.Barrier(8)
+
+    def put():
+        barrier.wait()
+        try:
+            store.put("ab" + "0" * 62, data)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == []
+    assert store.get("ab" + "0" * 62) == data
+    assert [p.name for p in (tmp_path / "ab").iterdir()] == ["ab" + "0" * 62]
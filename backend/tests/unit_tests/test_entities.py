@@ -0,0 +1,56 @@
+import pytest
+
+from agent.entities import EntityIndex, canonicalize_tool_args, compact_key, normalize_entity
+
+
+@pytest.fixture
+def index():
+    return EntityIndex(
+        {
+            "target": {"PD-1": ["PD1", "PDCD1", "programmed death-1", "程序性死亡受体1"]},
+            "drug": {"nivolumab": ["Opdivo", "纳武利尤单抗"]},
+            "disease": {"multiple myeloma": ["MM"]},
+        }
+    )
+
+
+def test_normalization_unifies_width_case_and_dashes():
+    assert normalize_entity("ＰＤ－１") == "pd-1"
+    assert compact_key("PD-1") == compact_key("pd 1") == compact_key("PD1") == "pd1"
+
+
+def test_canonicalize_known_and_unknown_values(index):
+    assert index.canonicalize("target", "pdcd1") == "PD-1"
+    assert index.canonicalize("target", "Programmed Death 1") == "PD-1"
+    assert index.canonicalize("target", "LAG-3") == "LAG-3"
+    assert index.canonicalize("drug", "PD1") == "PD1"  # categories are separate
+
+
+def test_canonicalize_args_only_touches_entity_fields(index):
+    args = index.canonicalize_args({"target": "PD1", "drug": "Opdivo", "page": "PD1"})
+    assert args == {"target": "PD-1", "drug": "nivolumab", "page": "PD1"}
+
+
+def test_find_prefers_longest_match_and_word_boundaries(index):
+    matches = index.find("Opdivo vs 纳武利尤单抗 in PD1+ patients; MMR is unrelated")
+    assert [(category, name) for category, name, _, _ in matches] == [
+        ("drug", "nivolumab"),
+        ("drug", "nivolumab"),
+        ("target", "PD-1"),
+    ]
+
+
+def test_short_aliases_are_not_matched_in_free_text(index):
+    assert index.find("MM patients") == []
+    assert index.lookup("disease", "MM") == "multiple myeloma"
+
+
+def test_canonicalize_text_pads_ascii_names_inside_cjk(index):
+    assert index.canonicalize_text("纳武利尤单抗治疗") == "nivolumab 治疗"
+    assert index.stats()["rewrites"] == 1
+
+
+def test_tool_args_use_the_shared_synonym_file():
+    assert canonicalize_tool_args("get_clinical_results", {"target": "PDCD1"})["target"] == "PD-1"
+    assert canonicalize_tool_args("get_clinical_results", "Keytruda 临床试验") == "pembrolizumab 临床试验"
+    assert canonicalize_tool_args("web_search", "Keytruda") == "Keytruda"
@@ -0,0 +1,54 @@
+import pytest
+
+from agent.json_repair import coerce_to_schema, parse_model_output, repair_json_text
+from agent.tools_and_schemas import Reflection, SearchQueryList
+
+
+def test_clean_json_is_not_repaired():
+    result, repaired = parse_model_output('{"query": ["a", "b"], "rationale": "r"}', SearchQueryList)
+    assert result.query == ["a", "b"]
+    assert repaired is False
+
+
+def test_repairs_fences_comments_trailing_commas_and_quotes():
+    text = "<think>plan</think>```json\n{'rationale': 'it\\'s', query: ['a',], // note\n}\n```"
+    result, repaired = parse_model_output(text, SearchQueryList)
+    assert result.query == ["a"]
+    assert result.rationale == "it's"
+    assert repaired is True
+
+
+def test_python_literals_become_json():
+    text = '{"is_sufficient": False, "knowledge_gap": "g", "follow_up_queries": ["x"],}'
+    result, _ = parse_model_output(text, Reflection)
+    assert result.is_sufficient is False
+
+
+def test_raw_control_characters_inside_strings_are_escaped():
+    result, repaired = parse_model_output('{"rationale": "a\tb\nc\rd", "query": ["q"]}', SearchQueryList)
+    assert result.rationale == "a\tb\nc\rd"
+    assert repaired is True
+    assert "\\u0001" in repair_json_text('{"a": "x\x01y"}')
+
+
+def test_wrong_types_are_coerced_when_present():
+    result = coerce_to_schema({"query": "single query", "rationale": {"why": 1}}, SearchQueryList)
+    assert result.query == ["single query"]
+    assert result.rationale == '{"why": 1}'
+
+
+def test_missing_required_field_raises_instead_of_defaulting():
+    # 键名写错（queries）时不能校验成空查询列表，否则运行不会派发任何 web_research 分支
+    with pytest.raises(ValueError, match="query"):
+        parse_model_output('{"rationale": "r", "queries": ["a", "b"]}', SearchQueryList)
+
+
+def test_other_schema_output_is_rejected():
+    reflection = '{"is_sufficient": false, "knowledge_gap": "g", "follow_up_queries": ["x"]}'
+    with pytest.raises(ValueError):
+        parse_model_output(reflection, SearchQueryList)
+
+
+def test_unrepairable_output_raises():
+    with pytest.raises(ValueError):
+        parse_model_output("no json here", SearchQueryList)
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from agent.memory_guard import (
+    MB,
+    MemoryLimitExceeded,
+    check_node_memory,
+    deep_size,
+    field_sizes,
+    track_memory,
+)
+
+
+def test_deep_size_counts_nested_values_once():
+    text = "x" * 10_000
+    assert deep_size([text]) > 10_000
+    assert deep_size([text, text]) < 2 * deep_size([text])
+
+
+def test_field_sizes_are_sorted_and_skip_the_memory_record():
+    sizes = field_sizes({"small": "a", "large": "b" * 5000, "memory": {"state_peak_bytes": 1}})
+    assert list(sizes) == ["large", "small"]
+
+
+def test_check_node_memory_is_a_no_op_outside_a_limited_node():
+    check_node_memory("x" * 1_000_000)
+
+
+def test_hard_limit_is_checked_against_run_state():
+    wrapped = track_memory("reflection", lambda state, config: {})
+    with pytest.raises(MemoryLimitExceeded):
+        wrapped({"web_research_result": ["x" * 200_000]}, {"configurable": {"memory_hard_limit_mb": 0.1}})
+
+
+def test_hard_limit_includes_node_working_data():
+    def node(state, config):
+        check_node_memory(["x" * 200_000])
+        return {}
+
+    wrapped = track_memory("web_research", node)
+    with pytest.raises(MemoryLimitExceeded):
+        wrapped({"messages": []}, {"configurable": {"memory_hard_limit_mb": 0.1}})
+
+
+def test_process_allocations_do_not_trip_the_hard_limit():
+    # tracemalloc 增长只做统计：节点里临时分配（或邻近运行的分配）超过硬上限不会让本次运行失败
+    def node(state, config):
+        scratch = bytearray(int(0.5 * MB))
+        time.sleep(0.1)  # 让采样线程采到峰值
+        return {"search_query": [str(len(scratch))]}
+
+    wrapped = track_memory("web_research", node)
+    config = {"configurable": {"memory_tracking": True, "memory_hard_limit_mb": 0.1}}
+    update = wrapped({"messages": []}, config)
+    assert update["memory"]["node_peak_bytes"]["web_research"] >= 0.5 * MB
+
+
+def test_disabled_guard_passes_updates_through():
+    wrapped = track_memory("generate_query", lambda state, config: {"a": 1})
+    assert wrapped({}, {"configurable": {}}) == {"a": 1}
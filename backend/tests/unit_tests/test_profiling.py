@@ -0,0 +1,55 @@
+import threading
+import time
+
+from agent.profiling import RunProfiler, profile_node, profile_worker, profiling_enabled
+
+
+def test_configurable_profile_run_overrides_environment(monkeypatch):
+    monkeypatch.setenv("PROFILE_RUN", "1")
+    assert profiling_enabled({"configurable": {}})
+    assert not profiling_enabled({"configurable": {"profile_run": False}})
+    monkeypatch.setenv("PROFILE_RUN", "0")
+    assert profiling_enabled({"configurable": {"profile_run": True}})
+
+
+def test_concurrent_saves_write_complete_files(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    profiler = RunProfiler("thread", "run")
+    profiler.stacks["node:a;f.py:g:1"] = 3
+    errors = []
+
+    def save():
+        try:
+            for _ in range(20):
+                profiler.save()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert (tmp_path / "thread" / "run.collapsed").read_text() == "node:a;f.py:g:1 3\n"
+    assert sorted(p.name for p in (tmp_path / "thread").iterdir()) == ["run.collapsed", "run.speedscope.json"]
+
+
+def test_worker_threads_are_sampled_as_the_node(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+
+    def busy_worker():
+        time.sleep(0.2)
+
+    def node(state, config):
+        thread = threading.Thread(target=profile_worker(busy_worker))
+        thread.start()
+        thread.join()
+        return {}
+
+    config = {"configurable": {"profile_run": True, "thread_id": "t", "run_id": "worker"}}
+    profile_node("research", node, is_final=lambda update: True)({}, config)
+
+    collapsed = (tmp_path / "t" / "worker.collapsed").read_text()
+    assert any("busy_worker" in line and line.startswith("node:research;") for line in collapsed.splitlines())
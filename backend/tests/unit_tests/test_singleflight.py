@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from agent.singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    upstream = []
+
+    def fetch(key):
+        upstream.append(key)
+        started.set()
+        release.wait(5)
+        return f"result:{key}"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", fetch, "k")))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", fetch, "k"))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert upstream == ["k"]
+    assert results == ["result:k"] * 4
+    stats = flight.stats()
+    assert (stats["calls"], stats["upstream"], stats["coalesced"]) == (4, 1, 3)
+
+
+def test_calls_after_completion_are_not_cached():
+    flight = SingleFlight("test")
+    counter = iter(range(10))
+    assert flight.do("k", lambda: next(counter)) == 0
+    assert flight.do("k", lambda: next(counter)) == 1
+
+
+def test_errors_reach_every_waiter_and_clear_the_key():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ["upstream down", "upstream down"]
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("new call")))
+
+
+def test_waiters_call_directly_when_the_leader_hangs():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def fetch(caller):
+        if caller == "leader":
+            started.set()
+            release.wait(5)
+        return caller
+
+    leader = threading.Thread(target=lambda: flight.do("k", fetch, "leader", timeout=0.1))
+    leader.start()
+    assert started.wait(5)
+    assert flight.do("k", fetch, "waiter", timeout=0.1) == "waiter"
+    release.set()
+    leader.join(5)
+    assert flight.stats()["timeouts"] == 1
+
+
+def test_leader_timeout_errors_are_not_retried_by_waiters():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise TimeoutError("upstream timed out")
+
+    def lead():
+        with pytest.raises(TimeoutError):
+            flight.do("k", fetch, timeout=5)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    assert started.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with pytest.raises(TimeoutError):
+        flight.do("k", fetch, timeout=5)
+    leader.join(5)
+    assert calls == [1]
+    assert flight.stats()["timeouts"] == 0
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from agent.speculative import SpeculativePrefetcher, query_similarity
+
+
+@pytest.fixture
+def prefetcher():
+    searched = []
+
+    def search(query):
+        searched.append(query)
+        return {"query": query}
+
+    prefetcher = SpeculativePrefetcher(search, match_threshold=0.6)
+    prefetcher.searched = searched
+    yield prefetcher
+    prefetcher.close()
+
+
+def test_query_similarity_ignores_case_and_spacing():
+    assert query_similarity("PD-1 抑制剂", "pd-1抑制剂") == 1.0
+    assert query_similarity("PD-1 inhibitors", "weather today") == 0.0
+
+
+def test_take_returns_the_best_matching_prefetch_once(prefetcher):
+    prefetcher.prefetch(["PD-1 inhibitors 2025 safety", "KRAS G12C trials"])
+    assert prefetcher.take("pd-1 inhibitors 2025 safety") == {"query": "PD-1 inhibitors 2025 safety"}
+    assert prefetcher.take("pd-1 inhibitors 2025 safety") is None  # consumed
+    assert prefetcher.take("weather today") is None
+    stats = prefetcher.report()
+    assert (stats["hits"], stats["misses"], stats["prefetched"]) == (1, 2, 2)
+
+
+def test_duplicate_predictions_are_searched_once(prefetcher):
+    prefetcher.prefetch(["q one", "q one", ""])
+    prefetcher.take("q one")
+    assert prefetcher.searched == ["q one"]
+
+
+def test_discard_unused_counts_waste(prefetcher):
+    prefetcher.prefetch(["a b c", "d e f"])
+    prefetcher.take("a b c")
+    assert prefetcher.discard_unused() == 1
+    assert prefetcher.take("d e f") is None
+    assert prefetcher.report()["wasted_rate"] == 0.5
+
+
+def test_failed_prefetch_falls_back_to_a_miss():
+    release = threading.Event()
+
+    def search(query):
+        release.wait(5)
+        raise RuntimeError("tavily down")
+
+    prefetcher = SpeculativePrefetcher(search)
+    prefetcher.prefetch(["a b c"])
+    release.set()
+    assert prefetcher.take("a b c") is None
+    assert prefetcher.report()["misses"] == 1
+    prefetcher.close()
+
+
+def test_prefetches_are_only_used_by_their_own_loop(prefetcher):
+    prefetcher.discard_unused(1)
+    prefetcher.prefetch(["a b c"], loop=1)
+    assert prefetcher.take("a b c", loop=2) is None
+    assert prefetcher.take("a b c", loop=1) == {"query": "a b c"}
+
+
+def test_predictions_registered_after_their_loop_was_discarded_are_ignored(prefetcher):
+    prefetcher.discard_unused(1)
+    prefetcher.discard_unused(2)
+    prefetcher.prefetch(["stale query"], loop=1)
+    assert prefetcher.take("stale query", loop=1) is None
+    assert prefetcher.searched == []
+    assert prefetcher.report()["prefetched"] == 0
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from agent import stragglers
+from agent.configuration import Configuration
+from agent.memory_guard import MemoryLimitExceeded, check_node_memory, track_memory
+from agent.stragglers import (
+    LoopCutoff,
+    branch_cancelled,
+    collect_late_branches,
+    get_loop_cutoff,
+    release_loop_cutoffs,
+    run_with_cutoff,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_registries():
+    yield
+    stragglers._loops.clear()
+    stragglers._late.clear()
+
+
+def _branch_state(query, branches=2, loop=0):
+    return {
+        "search_query": query,
+        "id": 0,
+        "research_loop_count": loop,
+        "loop_branches": branches,
+        "loop_started_at": time.time(),
+    }
+
+
+def _update(text):
+    return {"web_research_result": [text], "sources_gathered": [], "budget": {"tokens": 1, "cost": 0.0}}, {}
+
+
+def test_loop_cutoff_required_count():
+    assert LoopCutoff(5, time.time(), quorum=2, fraction=0, timeout=0, grace=0).required == 2
+    assert LoopCutoff(5, time.time(), quorum=0, fraction=0.5, timeout=0, grace=0).required == 3
+    assert LoopCutoff(5, time.time(), quorum=4, fraction=0.2, timeout=0, grace=0).required == 1
+    assert LoopCutoff(5, time.time(), quorum=0, fraction=0, timeout=1, grace=0).required is None
+
+
+def test_finished_branch_returns_its_result():
+    configurable = Configuration(straggler_timeout_seconds=5)
+    result = run_with_cutoff(lambda: _update("done"), "run-a", _branch_state("q", branches=1), configurable)
+    assert result[0]["web_research_result"] == ["done"]
+
+
+def test_timeout_cuts_the_branch_and_folds_it_later():
+    configurable = Configuration(straggler_timeout_seconds=0.05)
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return _update("late")
+
+    assert run_with_cutoff(slow, "run-a", _branch_state("slow"), configurable) is None
+    assert collect_late_branches("run-a") == {}  # still running
+    release.set()
+    deadline = time.time() + 5
+    while not stragglers._late["run-a"][0].future.done() and time.time() < deadline:
+        time.sleep(0.01)
+    update = collect_late_branches("run-a")
+    assert update["web_research_result"] == ["late"]
+    assert update["stragglers"]["folded"] == 1
+    assert update["budget"]["tokens"] == 1
+
+
+def test_cancel_action_signals_the_branch():
+    configurable = Configuration(straggler_timeout_seconds=0.05, straggler_action="cancel")
+    seen = threading.Event()
+
+    def slow():
+        while not branch_cancelled():
+            time.sleep(0.01)
+        seen.set()
+        return _update("discarded")
+
+    assert run_with_cutoff(slow, "run-a", _branch_state("slow"), configurable) is None
+    assert seen.wait(5)
+    time.sleep(0.05)
+    update = collect_late_branches("run-a", final=True)
+    assert update["stragglers"]["cancelled"] == 1
+    assert update["web_research_result"] == []
+
+
+def test_loop_trackers_are_scoped_per_run():
+    configurable = Configuration(straggler_quorum=1)
+    first = get_loop_cutoff("run-a", 0, 3, time.time(), configurable)
+    assert get_loop_cutoff("run-a", 0, 3, time.time(), configurable) is first
+    assert get_loop_cutoff("run-b", 0, 3, time.time(), configurable) is not first
+    release_loop_cutoffs("run-a")
+    assert ("run-a", 0) not in stragglers._loops
+    assert ("run-b", 0) in stragglers._loops
+
+
+def test_memory_limit_reaches_branch_threads_under_cutoff():
+    # 截止策略把分支放到后台线程执行，节点的内存硬上限仍要在分支线程里生效
+    def node(state, config):
+        configurable = Configuration.from_runnable_config(config)
+
+        def branch():
+            check_node_memory("x" * 200_000)
+            return _update("never")
+
+        return run_with_cutoff(branch, "run-a", _branch_state("q", branches=1), configurable)[0]
+
+    wrapped = track_memory("web_research", node)
+    config = {"configurable": {"memory_hard_limit_mb": 0.1, "straggler_timeout_seconds": 5}}
+    with pytest.raises(MemoryLimitExceeded):
+        wrapped({"messages": []}, config)
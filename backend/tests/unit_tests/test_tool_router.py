@@ -0,0 +1,28 @@
+from agent.tool_router import ROUTER_MAX_QUERY_CHARS, route_tool_calls
+
+
+def test_plain_queries_go_to_web_search():
+    calls, reason = route_tool_calls("  PD-1   inhibitor market 2025 ")
+    assert reason == "web"
+    assert calls == [{"name": "web_search", "args": {"query": "PD-1 inhibitor market 2025"}}]
+
+
+def test_clinical_queries_with_entities_add_the_clinical_tool():
+    calls, reason = route_tool_calls("Keytruda phase III clinical trial in NSCLC")
+    assert reason == "clinical"
+    assert [call["name"] for call in calls] == ["web_search", "get_clinical_results"]
+    assert calls[1]["args"]["keywords"] == "pembrolizumab non-small cell lung cancer"
+
+
+def test_chinese_clinical_cues_are_recognised():
+    calls, reason = route_tool_calls("信迪利单抗 III期临床 入组情况")
+    assert reason == "clinical"
+    assert calls[1]["args"]["keywords"] == "sintilimab"
+
+
+def test_uncertain_queries_fall_back_to_the_llm():
+    assert route_tool_calls("") == (None, "empty query")
+    assert route_tool_calls("x" * (ROUTER_MAX_QUERY_CHARS + 1)) == (None, "query too long")
+    calls, reason = route_tool_calls("clinical trial of an unknown compound XY-123")
+    assert calls is None
+    assert reason == "clinical cue without known entities"
@@ -0,0 +1,85 @@
+from agent.utils import (
+    assemble_citations,
+    byte_to_char_offsets,
+    get_run_key,
+    grounding_payload_size,
+    insert_citation_markers,
+    new_run_id,
+    parse_grounding,
+)
+
+
+def _citation(start, end, *labels):
+    return {
+        "start_index": start,
+        "end_index": end,
+        "segments": [{"label": label, "short_url": f"https://s/{label}"} for label in labels],
+    }
+
+
+def test_assemble_citations_inserts_after_end_index():
+    text = "Alpha. Beta."
+    result = assemble_citations(text, [_citation(7, 12, "b"), _citation(0, 6, "a")])
+    assert result == "Alpha. [a](https://s/a) Beta. [b](https://s/b)"
+
+
+def test_assemble_citations_shared_end_keeps_start_order():
+    result = assemble_citations("abc", [_citation(1, 3, "late"), _citation(0, 3, "early")])
+    assert result == "abc [early](https://s/early) [late](https://s/late)"
+
+
+def test_assemble_citations_clamps_out_of_range_offsets():
+    assert assemble_citations("abc", [_citation(0, 99, "x")]) == "abc [x](https://s/x)"
+
+
+def test_byte_offsets_are_converted_to_characters():
+    text = "肺癌治疗 ok"
+    # "肺癌" is 6 UTF-8 bytes, 2 characters; offset 7 falls inside "治" and moves to its end
+    assert byte_to_char_offsets(text, [6, 7]) == {6: 2, 7: 3}
+    result = assemble_citations(text, [_citation(0, 6, "a")], byte_offsets=True)
+    assert result == "肺癌 [a](https://s/a)治疗 ok"
+
+
+def test_citations_without_positions_are_listed_at_the_end():
+    citation = {"start_index": 0, "end_index": 0, "segments": [{"label": "T", "short_url": "https://s/1"}]}
+    assert insert_citation_markers("text", [citation]).endswith("## 参考来源\n\n1. [T](https://s/1)")
+
+
+def test_runs_without_thread_get_distinct_keys():
+    assert new_run_id({}) != new_run_id({})
+    assert new_run_id({"configurable": {"run_id": "api-run"}}) == "api-run"
+
+
+def test_run_key_prefers_the_state_run_id():
+    config = {"configurable": {"thread_id": "t1"}}
+    assert get_run_key(config, {"run_id": "r1"}) == "r1"
+    assert get_run_key(config) == "t1"
+    assert get_run_key(None) == "local"
+
+
+def test_parse_grounding_returns_plain_text_and_citations():
+    from google.genai import types
+
+    response = types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(parts=[types.Part(text="hello world")]),
+                grounding_metadata=types.GroundingMetadata(
+                    grounding_chunks=[types.GroundingChunk(web=types.GroundingChunkWeb(uri="https://x/1", title="site.com"))],
+                    grounding_supports=[
+                        types.GroundingSupport(segment=types.Segment(start_index=0, end_index=5), grounding_chunk_indices=[0])
+                    ],
+                ),
+            )
+        ]
+    )
+    text, citations = parse_grounding(response, 3)
+    assert text == "hello world"
+    assert citations == [
+        {
+            "start_index": 0,
+            "end_index": 5,
+            "segments": [{"label": "site", "short_url": "https://vertexaisearch.cloud.google.com/id/3-0", "value": "https://x/1"}],
+        }
+    ]
+    assert grounding_payload_size(response) > len(text)
@@ -0,0 +1,55 @@
+import pytest
+
+from agent.worker_pool import LocalBranchQueue, branch_job_id, wait_for_result
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return LocalBranchQueue(tmp_path / "queue.sqlite3", lease_seconds=60, max_attempts=2)
+
+
+def _state(query="q"):
+    return {"id": 0, "search_query": query, "research_loop_count": 0, "run_id": "run-a"}
+
+
+def test_job_id_is_stable_per_branch_and_run():
+    config = {"configurable": {"checkpoint_ns": "web_research:1"}}
+    assert branch_job_id(_state(), config) == branch_job_id(_state(), config)
+    assert branch_job_id(_state(), config) != branch_job_id(_state("other"), config)
+    assert branch_job_id(_state(), config) != branch_job_id({**_state(), "run_id": "run-b"}, config)
+
+
+def test_submit_is_idempotent_and_claim_completes(queue):
+    assert queue.submit("job", {"x": 1}) is True
+    assert queue.submit("job", {"x": 2}) is False
+    job_id, payload, attempt = queue.claim("w1")
+    assert (job_id, payload, attempt) == ("job", {"x": 1}, 1)
+    assert queue.claim("w2") is None
+    queue.complete("job", "w1", {"update": {}, "progress": {}})
+    assert wait_for_result(queue, "job", timeout=1) == {"update": {}, "progress": {}}
+
+
+def test_failed_jobs_are_retried_then_fail(queue):
+    queue.submit("job", {})
+    queue.claim("w1")
+    queue.fail("job", "w1", "boom")
+    assert queue.status("job")["status"] == "queued"
+    _, _, attempt = queue.claim("w1")
+    assert attempt == 2
+    queue.fail("job", "w1", "boom again")
+    with pytest.raises(RuntimeError, match="boom again"):
+        wait_for_result(queue, "job", timeout=1)
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = LocalBranchQueue(tmp_path / "queue.sqlite3", lease_seconds=-1, max_attempts=3)
+    queue.submit("job", {})
+    queue.claim("lost-worker")
+    job_id, _, attempt = queue.claim("w2")
+    assert (job_id, attempt) == ("job", 2)
+
+
+def test_wait_for_result_times_out(queue):
+    queue.submit("job", {})
+    with pytest.raises(TimeoutError):
+        wait_for_result(queue, "job", timeout=0.05)
@@ -28,32 +28,40 @@ export default function App() {
       : "http://localhost:8123",
     assistantId: "agent",
     messagesKey: "messages",
-    onUpdateEvent: (event: any) => {    //前端通过useStream自动接收这些事件，并调用onUpdateEvent,实时更新timeline动画
+    // 后端每个节点结束时通过 custom 流发送轻量进度事件（见 backend/src/agent/progress.py），
+    // 不再订阅 updates 流，避免推送完整的 web_research_result 和 sources_gathered
+    onCustomEvent: (event: any) => {
+      if (event?.type !== "progress") return;
       let processedEvent: ProcessedEvent | null = null;
-      if (event.generate_query) {
+      if (event.node === "generate_query") {
         processedEvent = {
           title: "Generating Search Queries",
-          data: event.generate_query?.generated_query?.join(", ") || "",
+          data: event.queries?.join(", ") || "",
         };
-      } else if (event.web_research) {
-        const sources = event.web_research.sources_gathered || [];
-        const numSources = sources.length;
-        const uniqueLabels = [
-          ...new Set(sources.map((s: any) => s.label).filter(Boolean)),
-        ];
-        const exampleLabels = uniqueLabels.slice(0, 3).join(", ");
+      } else if (event.node === "web_research") {
+        const exampleLabels = (event.labels || []).join(", ");
         processedEvent = {
           title: "Web Research",
-          data: `Gathered ${numSources} sources. Related to: ${
+          data: `Gathered ${event.source_count ?? 0} sources. Related to: ${
             exampleLabels || "N/A"
           }.`,
         };
-      } else if (event.reflection) {
+      } else if (event.node === "reflection") {
         processedEvent = {
           title: "Reflection",
-          data: "Analysing Web Research Results",
+          data: event.is_sufficient
+            ? "Research is sufficient"
+            : `Analysing Web Research Results, ${event.follow_up_count ?? 0} follow-up queries`,
         };
-      } else if (event.finalize_answer) {
+      } else if (event.node === "answer_cache" && event.hit) {
+        processedEvent = {
+          title: "Answer Cache",
+          data: event.stale
+            ? "Returning a cached report; refreshing it in the background."
+            : "Returning a cached report.",
+        };
+        hasFinalizeEventOccurredRef.current = true;
+      } else if (event.node === "finalize_answer") {
         processedEvent = {
           title: "Finalizing Answer",
           data: "Composing and presenting the final answer.",